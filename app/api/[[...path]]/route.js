@@ -1,7 +1,11 @@
 import { NextResponse } from 'next/server';
-import { MongoClient, Db } from 'mongodb';
+import { MongoClient, Db, GridFSBucket, ObjectId } from 'mongodb';
 import { v4 as uuidv4 } from 'uuid';
-import * as XLSX from 'xlsx';
+import zlib from 'zlib';
+import crypto from 'crypto';
+import { once } from 'events';
+import { AsyncLocalStorage } from 'async_hooks';
+import { Readable, pipeline } from 'stream';
 
 let client;
 let db;
@@ -10,10 +14,26 @@ let db;
 async function connectToDatabase() {
   if (!client) {
     try {
-      client = new MongoClient(process.env.MONGO_URL);
+      client = new MongoClient(process.env.MONGO_URL, { monitorCommands: true });
+      monitorMongoCommands(client);
       await client.connect();
       db = client.db(process.env.DB_NAME || 'ziklo_time_tracking');
       console.log('Connected to MongoDB successfully');
+      
+      // Index builds run in the background; failures are logged, not fatal
+      ensureIndexes();
+      
+      // Backfill read models that have never been built
+      ensureReadModels();
+      
+      // Resume export jobs left queued by a previous process
+      startExportWorkers();
+      
+      // Apply time entry view writes that failed and were queued for repair
+      startViewRepairs();
+      
+      // Flush buffered audit entries before the process exits
+      hookAuditShutdown();
     } catch (error) {
       console.error('MongoDB connection error:', error);
       throw error;
@@ -22,12 +42,539 @@ async function connectToDatabase() {
   return { client, db };
 }
 
+// Instrumentation: latency histograms per route, per Mongo collection and
+// command, and per named stage. The current request's timings are kept in
+// AsyncLocalStorage and returned in the Server-Timing header; everything is
+// exposed in Prometheus text format at GET /api/metrics.
+const LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+const requestContext = new AsyncLocalStorage();
+const histograms = new Map();
+
+function histogram(name, help) {
+  if (!histograms.has(name)) {
+    histograms.set(name, { name, help, series: new Map() });
+  }
+  return histograms.get(name);
+}
+
+function observe(name, help, labels, seconds) {
+  const { series } = histogram(name, help);
+  const key = JSON.stringify(labels);
+  if (!series.has(key)) {
+    series.set(key, { labels, buckets: LATENCY_BUCKETS.map(() => 0), sum: 0, count: 0 });
+  }
+  const entry = series.get(key);
+  LATENCY_BUCKETS.forEach((bound, i) => {
+    if (seconds <= bound) entry.buckets[i]++;
+  });
+  entry.sum += seconds;
+  entry.count++;
+}
+
+// Time a stream body from first pull to completion. It ends after the
+// response headers were sent, so it is only recorded in the histogram.
+async function* timeChunks(stage, chunks) {
+  const start = performance.now();
+  yield* chunks;
+  observe('ziklo_stage_duration_seconds', 'Duration of named request stages', { stage }, (performance.now() - start) / 1000);
+}
+
+// Time a named stage of the current request
+async function timeStage(stage, fn) {
+  const start = performance.now();
+  try {
+    return await fn();
+  } finally {
+    const ms = performance.now() - start;
+    requestContext.getStore()?.stages.push([stage, ms]);
+    observe('ziklo_stage_duration_seconds', 'Duration of named request stages', { stage }, ms / 1000);
+  }
+}
+
+// Mongo command monitoring. The request store is captured when the command
+// starts, since completion events are not emitted in the caller's context.
+const MONGO_IGNORED_COMMANDS = new Set(['hello', 'isMaster', 'ismaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'killCursors', 'buildInfo']);
+const pendingMongoCommands = new Map();
+
+function monitorMongoCommands(mongoClient) {
+  mongoClient.on('commandStarted', event => {
+    if (MONGO_IGNORED_COMMANDS.has(event.commandName)) return;
+    const target = event.commandName === 'getMore' ? event.command.collection : event.command[event.commandName];
+    pendingMongoCommands.set(event.requestId, {
+      collection: typeof target === 'string' ? target : '(database)',
+      store: requestContext.getStore()
+    });
+  });
+  
+  const finish = outcome => event => {
+    const pending = pendingMongoCommands.get(event.requestId);
+    if (!pending) return;
+    pendingMongoCommands.delete(event.requestId);
+    observe('ziklo_mongo_command_duration_seconds', 'Duration of MongoDB commands', {
+      collection: pending.collection,
+      operation: event.commandName,
+      outcome
+    }, event.duration / 1000);
+    if (pending.store) {
+      pending.store.mongoMs += event.duration;
+      pending.store.mongoCommands++;
+    }
+  };
+  mongoClient.on('commandSucceeded', finish('success'));
+  mongoClient.on('commandFailed', finish('error'));
+}
+
+// Route label with ids replaced, so the number of series stays bounded. A
+// matched route keeps its label whatever its status (a 404 for a missing
+// record included); only requests the dispatcher found no route for are
+// 'unmatched', since their paths are arbitrary.
+const ROUTE_ID_PATTERN = /^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+)$/i;
+
+function routeLabel(request, store) {
+  if (store.unmatched) return 'unmatched';
+  const segments = new URL(request.url).pathname.split('/').filter(Boolean).slice(1);
+  return '/' + segments.map(segment => ROUTE_ID_PATTERN.test(segment) ? ':id' : segment).join('/');
+}
+
+// 404 for a path no handler serves, marked so its metrics go under 'unmatched'
+function endpointNotFound() {
+  const store = requestContext.getStore();
+  if (store) store.unmatched = true;
+  return corsResponse(NextResponse.json({ success: false, message: 'Endpoint not found' }, { status: 404 }));
+}
+
+function instrumentHandler(method, handler) {
+  return async (request, context) => {
+    const store = { stages: [], mongoMs: 0, mongoCommands: 0, unmatched: false };
+    const start = performance.now();
+    const response = await requestContext.run(store, () => handler(request, context));
+    const totalMs = performance.now() - start;
+    
+    observe('ziklo_http_request_duration_seconds', 'Time to response headers per route', {
+      method,
+      route: routeLabel(request, store),
+      status: String(response.status)
+    }, totalMs / 1000);
+    
+    const timings = [
+      `total;dur=${totalMs.toFixed(1)}`,
+      `mongo;dur=${store.mongoMs.toFixed(1)};desc="${store.mongoCommands} commands"`,
+      ...store.stages.map(([stage, ms]) => `${stage};dur=${ms.toFixed(1)}`)
+    ];
+    response.headers.set('Server-Timing', timings.join(', '));
+    return response;
+  };
+}
+
+function prometheusLabels(labels) {
+  const pairs = Object.entries(labels).map(([key, value]) => `${key}="${String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"')}"`);
+  return pairs.length > 0 ? `{${pairs.join(',')}}` : '';
+}
+
+// Numeric fields of a stats report as gauges
+function gaugeLines(prefix, report) {
+  return Object.entries(report)
+    .filter(([, value]) => typeof value === 'number')
+    .map(([key, value]) => `${prefix}_${key} ${value}`);
+}
+
+async function metricsText() {
+  const lines = [];
+  for (const { name, help, series } of histograms.values()) {
+    lines.push(`# HELP ${name} ${help}`, `# TYPE ${name} histogram`);
+    for (const { labels, buckets, sum, count } of series.values()) {
+      LATENCY_BUCKETS.forEach((bound, i) => {
+        lines.push(`${name}_bucket${prometheusLabels({ ...labels, le: bound })} ${buckets[i]}`);
+      });
+      lines.push(`${name}_bucket${prometheusLabels({ ...labels, le: '+Inf' })} ${count}`);
+      lines.push(`${name}_sum${prometheusLabels(labels)} ${sum}`);
+      lines.push(`${name}_count${prometheusLabels(labels)} ${count}`);
+    }
+  }
+  
+  lines.push(
+    ...gaugeLines('ziklo_catalog_cache', catalogCacheReport()),
+    ...gaugeLines('ziklo_audit', auditReport()),
+    ...gaugeLines('ziklo_change_feed', changeFeedReport()),
+    ...gaugeLines('ziklo_admission', admissionReport())
+  );
+  
+  const jobs = await db.collection('export_jobs').aggregate([
+    { $group: { _id: '$status', count: { $sum: 1 } } }
+  ]).toArray();
+  jobs.forEach(({ _id, count }) => lines.push(`ziklo_export_jobs${prometheusLabels({ status: _id })} ${count}`));
+  
+  const memory = process.memoryUsage();
+  lines.push(
+    `process_resident_memory_bytes ${memory.rss}`,
+    `nodejs_heap_used_bytes ${memory.heapUsed}`
+  );
+  return lines.join('\n') + '\n';
+}
+
+// Indexes for the custom `id` field and every hot query shape in this file
+const INDEX_SPECS = {
+  users: [
+    { key: { id: 1 }, unique: true },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  app_users: [
+    { key: { id: 1 }, unique: true },
+    { key: { documento: 1 } },
+    { key: { correo: 1 } },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  projects: [
+    { key: { id: 1 }, unique: true },
+    { key: { status: 1 } },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  cost_centers: [
+    { key: { id: 1 }, unique: true },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  engineers: [
+    { key: { id: 1 }, unique: true },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  concepts: [
+    { key: { id: 1 }, unique: true },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  time_entries: [
+    { key: { id: 1 }, unique: true },
+    { key: { engineer_id: 1, date: 1 } },
+    { key: { project_id: 1, date: 1 } },
+    { key: { date: 1 } },
+    { key: { created_at: 1, id: 1 } },
+    { key: { project_id: 1, created_at: 1, id: 1 } },
+    { key: { project_id: 1, post_export_adjustment: 1, date: 1 } }
+  ],
+  export_closures: [
+    { key: { id: 1 }, unique: true },
+    { key: { status: 1, date_start: 1, date_end: 1 } },
+    { key: { created_at: 1, id: 1 } }
+  ],
+  export_closure_scope: [
+    { key: { id: 1 }, unique: true },
+    { key: { closure_id: 1, project_id: 1 } }
+  ],
+  export_closure_exceptions: [
+    { key: { id: 1 }, unique: true },
+    { key: { closure_id: 1, date_start: 1, date_end: 1 } }
+  ],
+  export_jobs: [
+    { key: { id: 1 }, unique: true },
+    { key: { status: 1, created_at: 1 } }
+  ],
+  export_closure_revisions: [
+    { key: { id: 1 }, unique: true },
+    { key: { closure_id: 1, revision: 1 }, unique: true }
+  ],
+  time_entry_views: [
+    { key: { id: 1 }, unique: true },
+    { key: { date: 1, project_name: 1 } },
+    { key: { project_id: 1, date: 1 } },
+    { key: { cost_center_id: 1, date: 1 } },
+    { key: { engineer_id: 1, date: 1 } },
+    { key: { updated_at: 1 } }
+  ],
+  daily_hours: [
+    { key: { date: 1, project_id: 1, cost_center_id: 1, engineer_id: 1, concept_id: 1 }, unique: true }
+  ],
+  time_entry_view_repairs: [
+    { key: { id: 1 }, unique: true }
+  ],
+  time_entry_archives: [
+    { key: { id: 1 }, unique: true },
+    { key: { month: 1 }, unique: true }
+  ],
+  daily_hour_ledger: [
+    { key: { engineer_id: 1, date: 1 }, unique: true }
+  ],
+  idempotency_keys: [
+    { key: { key: 1 }, unique: true },
+    { key: { expires_at: 1 }, expireAfterSeconds: 0 }
+  ],
+  audit_log: [
+    { key: { id: 1 }, unique: true },
+    { key: { entity: 1, entity_id: 1, created_at: -1 } },
+    { key: { entity: 1, action: 1, created_at: 1 } }
+  ]
+};
+
+let indexesReady = null;
+
+function ensureIndexes() {
+  if (!indexesReady) {
+    indexesReady = Promise.all(Object.entries(INDEX_SPECS).map(async ([collection, specs]) => {
+      try {
+        await db.collection(collection).createIndexes(specs);
+      } catch (error) {
+        console.error(`Index creation error (${collection}):`, error);
+      }
+    }));
+  }
+  return indexesReady;
+}
+
+// Keyset pagination on (created_at, id) for the GET list endpoints
+const DEFAULT_PAGE_SIZE = parseInt(process.env.DEFAULT_PAGE_SIZE || '100', 10);
+const MAX_PAGE_SIZE = parseInt(process.env.MAX_PAGE_SIZE || '500', 10);
+
+function encodePageCursor(doc) {
+  return Buffer.from(JSON.stringify([doc.created_at, doc.id])).toString('base64url');
+}
+
+function decodePageCursor(cursor) {
+  try {
+    const [createdAt, id] = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    // Both values go into the filter as-is: only plain strings are accepted
+    // (null created_at for legacy documents), never operator objects
+    const validCreatedAt = typeof createdAt === 'string' || createdAt === null;
+    return typeof id === 'string' && validCreatedAt ? { created_at: createdAt, id } : null;
+  } catch (error) {
+    return null;
+  }
+}
+
+// Parse limit, cursor, order and fields= into a find() query. Fields listed in
+// hiddenFields are never returned, even when requested explicitly.
+function buildPageQuery(query, searchParams, { defaultOrder = 'asc', hiddenFields = [] } = {}) {
+  const order = (searchParams.get('order') || defaultOrder) === 'desc' ? -1 : 1;
+  const requestedLimit = parseInt(searchParams.get('limit'), 10);
+  const limit = Math.min(requestedLimit > 0 ? requestedLimit : DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE);
+  
+  const filters = [query];
+  const cursorParam = searchParams.get('cursor');
+  if (cursorParam) {
+    const cursor = decodePageCursor(cursorParam);
+    if (!cursor) {
+      const error = new Error('Cursor inválido');
+      error.status = 400;
+      throw error;
+    }
+    const op = order === 1 ? '$gt' : '$lt';
+    filters.push({
+      $or: [
+        { created_at: { [op]: cursor.created_at } },
+        { created_at: cursor.created_at, id: { [op]: cursor.id } }
+      ]
+    });
+  }
+  
+  const fields = (searchParams.get('fields') || '')
+    .split(',')
+    .map(field => field.trim())
+    .filter(field => field && !hiddenFields.includes(field));
+  
+  let projection;
+  if (fields.length) {
+    // id and created_at are always needed to build the next cursor
+    projection = { _id: 0 };
+    [...fields, 'id', 'created_at'].forEach(field => { projection[field] = 1; });
+  } else if (hiddenFields.length) {
+    projection = Object.fromEntries(hiddenFields.map(field => [field, 0]));
+  }
+  
+  return {
+    filter: filters.length > 1 ? { $and: filters } : query,
+    options: { projection, sort: { created_at: order, id: order }, limit: limit + 1 },
+    limit
+  };
+}
+
+async function findPage(collectionName, query, searchParams, options = {}) {
+  const { filter, options: findOptions, limit } = buildPageQuery(query, searchParams, options);
+  
+  let docs;
+  if (options.archives?.length) {
+    // Same page over the live collection and the archived months
+    const { projection, sort } = findOptions;
+    const page = [{ $match: filter }, { $sort: sort }, { $limit: findOptions.limit }];
+    docs = await db.collection(collectionName).aggregate([
+      ...page,
+      ...unionArchiveStages(options.archives, page),
+      { $sort: sort },
+      { $limit: findOptions.limit },
+      ...(projection ? [{ $project: projection }] : [])
+    ]).toArray();
+  } else {
+    docs = await db.collection(collectionName).find(filter, findOptions).toArray();
+  }
+  
+  const hasMore = docs.length > limit;
+  const data = hasMore ? docs.slice(0, limit) : docs;
+  
+  return {
+    data,
+    page: {
+      limit,
+      has_more: hasMore,
+      next_cursor: hasMore ? encodePageCursor(data[data.length - 1]) : null
+    }
+  };
+}
+
+// Cursor over every document of a list query, for the NDJSON mode: same
+// filters, cursor and projection as findPage, limited only by an explicit limit=
+function findCursor(collectionName, query, searchParams, options = {}) {
+  const { filter, options: findOptions, limit } = buildPageQuery(query, searchParams, options);
+  const { projection, sort } = findOptions;
+  const limitStages = searchParams.has('limit') ? [{ $limit: limit }] : [];
+  
+  if (options.archives?.length) {
+    const page = [{ $match: filter }, { $sort: sort }, ...limitStages];
+    return db.collection(collectionName).aggregate([
+      ...page,
+      ...unionArchiveStages(options.archives, page),
+      { $sort: sort },
+      ...limitStages,
+      ...(projection ? [{ $project: projection }] : [])
+    ], { allowDiskUse: true, batchSize: EXPORT_BATCH_SIZE });
+  }
+  return db.collection(collectionName).find(filter, {
+    projection,
+    sort,
+    ...(limitStages.length > 0 && { limit }),
+    batchSize: EXPORT_BATCH_SIZE
+  });
+}
+
+// Filters of the time entries listing: date range (either bound optional),
+// project, engineer, concept and post_export_status (normal | post_export)
+function buildTimeEntryQuery(searchParams) {
+  const query = {};
+  const startDate = searchParams.get('start_date');
+  const endDate = searchParams.get('end_date');
+  if (startDate || endDate) {
+    query.date = {};
+    if (startDate) query.date.$gte = startDate;
+    if (endDate) query.date.$lte = endDate;
+  }
+  
+  for (const field of ['project_id', 'engineer_id', 'concept_id', 'cost_center_id']) {
+    const value = searchParams.get(field);
+    if (value) query[field] = value;
+  }
+  
+  const postExportStatus = searchParams.get('post_export_status');
+  if (postExportStatus === 'post_export') {
+    query.post_export_adjustment = true;
+  } else if (postExportStatus === 'normal') {
+    query.post_export_adjustment = { $ne: true };
+  }
+  return query;
+}
+
+// Entry count and hours of every entry matching the filters, not just the page
+async function timeEntryTotals(query, archives = []) {
+  const stages = [{ $match: query }, { $project: { _id: 0, hours: 1 } }];
+  const [totals] = await db.collection('time_entries').aggregate([
+    ...stages,
+    ...unionArchiveStages(archives, stages),
+    { $group: { _id: null, entries: { $sum: 1 }, hours: { $sum: { $toDouble: '$hours' } } } }
+  ]).toArray();
+  
+  return {
+    entries: totals?.entries || 0,
+    hours: Math.round((totals?.hours || 0) * 100) / 100
+  };
+}
+
+// Canonical queries checked by the query plan diagnostic
+const PROBE_ID = '00000000-0000-0000-0000-000000000000';
+const PROBE_DATE = '2024-01-01';
+
+const CANONICAL_QUERIES = [
+  ...['users', 'app_users', 'projects', 'cost_centers', 'engineers', 'concepts', 'time_entries', 'export_closures'].map(collection => ({
+    name: `${collection} by id`,
+    collection,
+    filter: { id: PROBE_ID }
+  })),
+  {
+    name: 'time_entries by engineer and day',
+    collection: 'time_entries',
+    filter: { engineer_id: PROBE_ID, date: PROBE_DATE }
+  },
+  {
+    name: 'time_entries by project',
+    collection: 'time_entries',
+    filter: { project_id: PROBE_ID }
+  },
+  {
+    name: 'time_entries by date range',
+    collection: 'time_entries',
+    filter: { date: { $gte: PROBE_DATE, $lte: PROBE_DATE } }
+  },
+  {
+    name: 'export_closures covering a date',
+    collection: 'export_closures',
+    filter: { status: { $in: ['ACTIVO', 'PARCIALMENTE_REABIERTO'] }, date_start: { $lte: PROBE_DATE }, date_end: { $gte: PROBE_DATE } }
+  },
+  {
+    name: 'export_closures by creation date',
+    collection: 'export_closures',
+    filter: {},
+    sort: { created_at: -1 }
+  },
+  {
+    name: 'export_closure_scope by closure',
+    collection: 'export_closure_scope',
+    filter: { closure_id: PROBE_ID }
+  },
+  {
+    name: 'export_closure_exceptions by closure',
+    collection: 'export_closure_exceptions',
+    filter: { closure_id: PROBE_ID, date_start: { $lte: PROBE_DATE }, date_end: { $gte: PROBE_DATE } }
+  },
+  {
+    name: 'app_users by document or email',
+    collection: 'app_users',
+    filter: { $or: [{ documento: PROBE_ID }, { correo: PROBE_ID }] }
+  }
+];
+
+function collectPlanStages(plan, stages = []) {
+  if (!plan) return stages;
+  const node = plan.queryPlan || plan;
+  if (node.stage) stages.push(node.stage);
+  collectPlanStages(node.inputStage, stages);
+  (node.inputStages || []).forEach(child => collectPlanStages(child, stages));
+  return stages;
+}
+
+// Run explain() on every canonical query and report the ones that still scan
+async function auditQueryPlans() {
+  await ensureIndexes();
+  
+  const queries = await Promise.all(CANONICAL_QUERIES.map(async ({ name, collection, filter, sort }) => {
+    const explanation = await db.collection(collection)
+      .find(filter, sort ? { sort } : {})
+      .explain('queryPlanner');
+    const stages = collectPlanStages(explanation.queryPlanner?.winningPlan);
+    return {
+      name,
+      collection,
+      filter,
+      sort: sort || null,
+      stages,
+      collscan: stages.includes('COLLSCAN')
+    };
+  }));
+  
+  return {
+    queries,
+    scanning: queries.filter(query => query.collscan).map(query => query.name)
+  };
+}
+
 // Utility function to handle CORS
 function corsResponse(response = null) {
   const headers = {
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key, X-User-Id',
   };
   
   if (response) {
@@ -40,25 +587,315 @@ function corsResponse(response = null) {
   return new NextResponse(null, { status: 200, headers });
 }
 
-// Audit logging function
-async function logAudit(action, entity, entityId, payload, userId = 'system', ip = 'unknown') {
+// Per-process response cache for the catalog GET routes, with TTL and LRU
+// eviction (a Map keeps insertion order, so the first key is the oldest).
+// Entries are invalidated by the catalog POST handlers and by the audit path.
+const CATALOG_CACHE_TTL_MS = parseInt(process.env.CATALOG_CACHE_TTL_MS || '300000', 10);
+const CATALOG_CACHE_MAX_ENTRIES = parseInt(process.env.CATALOG_CACHE_MAX_ENTRIES || '200', 10);
+
+// Route segment -> collection
+const CACHED_CATALOG_ROUTES = {
+  'projects': 'projects',
+  'cost-centers': 'cost_centers',
+  'engineers': 'engineers',
+  'concepts': 'concepts'
+};
+
+// Audit entity -> route segment
+const CATALOG_AUDIT_ENTITIES = {
+  project: 'projects',
+  cost_center: 'cost-centers',
+  engineer: 'engineers',
+  concept: 'concepts'
+};
+
+const catalogCache = new Map();
+const catalogCacheGenerations = {};
+const catalogCacheStats = {
+  evictions: 0,
+  invalidated_entries: 0,
+  routes: Object.fromEntries(Object.keys(CACHED_CATALOG_ROUTES).map(route => [route, { hits: 0, misses: 0, not_modified: 0 }]))
+};
+
+function getCachedCatalog(key) {
+  const entry = catalogCache.get(key);
+  if (!entry) return null;
+  if (entry.expiresAt <= Date.now()) {
+    catalogCache.delete(key);
+    return null;
+  }
+  // Move to the most recently used position
+  catalogCache.delete(key);
+  catalogCache.set(key, entry);
+  return entry;
+}
+
+function setCachedCatalog(key, route, body, generation) {
+  const entry = {
+    route,
+    body,
+    etag: `"${crypto.createHash('sha1').update(body).digest('base64url')}"`,
+    expiresAt: Date.now() + CATALOG_CACHE_TTL_MS
+  };
+  
+  // Do not cache a result computed before an invalidation of the same route
+  if (generation !== (catalogCacheGenerations[route] || 0)) {
+    return entry;
+  }
+  
+  catalogCache.delete(key);
+  catalogCache.set(key, entry);
+  while (catalogCache.size > CATALOG_CACHE_MAX_ENTRIES) {
+    catalogCache.delete(catalogCache.keys().next().value);
+    catalogCacheStats.evictions++;
+  }
+  return entry;
+}
+
+function invalidateCatalogCache(route) {
+  catalogCacheGenerations[route] = (catalogCacheGenerations[route] || 0) + 1;
+  for (const [key, entry] of catalogCache) {
+    if (entry.route === route) {
+      catalogCache.delete(key);
+      catalogCacheStats.invalidated_entries++;
+    }
+  }
+}
+
+async function cachedCatalogResponse(request, route, searchParams) {
+  const routeStats = catalogCacheStats.routes[route];
+  const params = new URLSearchParams(searchParams);
+  params.sort();
+  const key = `${route}?${params.toString()}`;
+  
+  let entry = getCachedCatalog(key);
+  if (entry) {
+    routeStats.hits++;
+  } else {
+    routeStats.misses++;
+    const generation = catalogCacheGenerations[route] || 0;
+    const page = await findPage(CACHED_CATALOG_ROUTES[route], {}, searchParams);
+    entry = setCachedCatalog(key, route, JSON.stringify({ success: true, ...page }), generation);
+  }
+  
+  const headers = { 'ETag': entry.etag, 'Cache-Control': 'private, no-cache' };
+  const ifNoneMatch = request.headers.get('if-none-match');
+  if (ifNoneMatch) {
+    const tags = ifNoneMatch.split(',').map(tag => tag.trim().replace(/^W\//, ''));
+    if (tags.includes('*') || tags.includes(entry.etag)) {
+      routeStats.not_modified++;
+      return new NextResponse(null, { status: 304, headers });
+    }
+  }
+  
+  return new NextResponse(entry.body, {
+    status: 200,
+    headers: { ...headers, 'Content-Type': 'application/json' }
+  });
+}
+
+function catalogCacheReport() {
+  const totals = Object.values(catalogCacheStats.routes).reduce(
+    (sum, stats) => ({ hits: sum.hits + stats.hits, misses: sum.misses + stats.misses }),
+    { hits: 0, misses: 0 }
+  );
+  const lookups = totals.hits + totals.misses;
+  return {
+    entries: catalogCache.size,
+    max_entries: CATALOG_CACHE_MAX_ENTRIES,
+    ttl_ms: CATALOG_CACHE_TTL_MS,
+    hits: totals.hits,
+    misses: totals.misses,
+    hit_rate: lookups > 0 ? totals.hits / lookups : null,
+    evictions: catalogCacheStats.evictions,
+    invalidated_entries: catalogCacheStats.invalidated_entries,
+    routes: catalogCacheStats.routes
+  };
+}
+
+// Buffered audit sink. Entries are queued in memory and written with one
+// insertMany once AUDIT_FLUSH_SIZE entries are pending or AUDIT_FLUSH_INTERVAL_MS
+// has passed, and on shutdown. The queue is bounded by AUDIT_MAX_QUEUE: when it
+// is full the caller waits for a flush, and entries are dropped (and counted)
+// only if the flush could not make room.
+const AUDIT_FLUSH_SIZE = parseInt(process.env.AUDIT_FLUSH_SIZE || '100', 10);
+const AUDIT_FLUSH_INTERVAL_MS = parseInt(process.env.AUDIT_FLUSH_INTERVAL_MS || '1000', 10);
+const AUDIT_MAX_QUEUE = parseInt(process.env.AUDIT_MAX_QUEUE || '10000', 10);
+// 'full' stores the update payload as sent, 'diff' stores only changed fields
+const AUDIT_UPDATE_MODE = process.env.AUDIT_UPDATE_MODE || 'full';
+
+let auditQueue = [];
+let auditFlushTimer = null;
+let auditFlushing = null;
+const auditStats = { enqueued: 0, written: 0, dropped: 0, flushes: 0, failed_flushes: 0, backpressure_waits: 0 };
+
+function buildAuditEntry(action, entity, entityId, payload, userId = 'system', ip = 'unknown') {
+  return {
+    id: uuidv4(),
+    actor_user_id: userId,
+    action,
+    entity,
+    entity_id: entityId,
+    payload,
+    ip,
+    user_agent: 'API',
+    created_at: new Date().toISOString()
+  };
+}
+
+async function enqueueAudit(entries) {
+  new Set(entries.map(entry => CATALOG_AUDIT_ENTITIES[entry.entity]))
+    .forEach(route => route && invalidateCatalogCache(route));
+  
+  if (auditQueue.length + entries.length > AUDIT_MAX_QUEUE) {
+    auditStats.backpressure_waits++;
+    await flushAudit();
+    if (auditQueue.length + entries.length > AUDIT_MAX_QUEUE) {
+      auditStats.dropped += entries.length;
+      console.error(`Audit queue full, dropping ${entries.length} entries`);
+      return;
+    }
+  }
+  
+  auditQueue.push(...entries);
+  auditStats.enqueued += entries.length;
+  
+  if (auditQueue.length >= AUDIT_FLUSH_SIZE) {
+    flushAudit();
+  } else {
+    scheduleAuditFlush();
+  }
+}
+
+function scheduleAuditFlush() {
+  if (auditFlushTimer) return;
+  auditFlushTimer = setTimeout(() => {
+    auditFlushTimer = null;
+    flushAudit();
+  }, AUDIT_FLUSH_INTERVAL_MS);
+  auditFlushTimer.unref?.();
+}
+
+// Write everything queued so far; concurrent callers wait for the same flush
+async function flushAudit() {
+  while (auditFlushing) {
+    await auditFlushing;
+  }
+  if (auditQueue.length === 0) return;
+  
+  if (auditFlushTimer) {
+    clearTimeout(auditFlushTimer);
+    auditFlushTimer = null;
+  }
+  
+  const batch = auditQueue;
+  auditQueue = [];
+  auditFlushing = writeAuditBatch(batch).finally(() => {
+    auditFlushing = null;
+  });
+  await auditFlushing;
+}
+
+async function writeAuditBatch(batch) {
   try {
-    const auditEntry = {
-      id: uuidv4(),
-      actor_user_id: userId,
-      action,
-      entity,
-      entity_id: entityId,
-      payload,
-      ip,
-      user_agent: 'API',
-      created_at: new Date().toISOString()
-    };
-    
-    await db.collection('audit_log').insertOne(auditEntry);
+    await db.collection('audit_log').insertMany(batch, { ordered: false });
+    auditStats.written += batch.length;
+    auditStats.flushes++;
   } catch (error) {
     console.error('Audit logging error:', error);
+    auditStats.failed_flushes++;
+    
+    if (error.writeErrors) {
+      // Per-document failures would fail again; the rest was written
+      const failed = [].concat(error.writeErrors).length;
+      auditStats.written += batch.length - failed;
+      auditStats.dropped += failed;
+      return;
+    }
+    
+    // Database unavailable: put the batch back in front, within the bound
+    const requeued = batch.slice(0, Math.max(AUDIT_MAX_QUEUE - auditQueue.length, 0));
+    auditStats.dropped += batch.length - requeued.length;
+    auditQueue = requeued.concat(auditQueue);
+    scheduleAuditFlush();
+  }
+}
+
+// Flush the buffer on shutdown without owning the process lifecycle: Next.js
+// (or the default signal behaviour) still decides when to exit. The hooks are
+// kept on globalThis, so hot reloads reuse them instead of piling up, and they
+// always call the flush of the latest module instance.
+const AUDIT_SHUTDOWN_HOOK = Symbol.for('ziklo.auditShutdown');
+
+function hookAuditShutdown() {
+  if (globalThis[AUDIT_SHUTDOWN_HOOK]) {
+    globalThis[AUDIT_SHUTDOWN_HOOK].flush = flushAudit;
+    return;
+  }
+  
+  const hook = { flush: flushAudit };
+  globalThis[AUDIT_SHUTDOWN_HOOK] = hook;
+  const flush = () => hook.flush().catch(error => console.error('Audit shutdown flush error:', error));
+  
+  process.once('beforeExit', flush);
+  for (const signal of ['SIGTERM', 'SIGINT']) {
+    const onSignal = async () => {
+      await flush();
+      // No other handler for the signal: fall back to its default (terminate)
+      if (process.listenerCount(signal) === 1) {
+        process.removeListener(signal, onSignal);
+        process.kill(process.pid, signal);
+      }
+    };
+    process.on(signal, onSignal);
+  }
+}
+
+function auditReport() {
+  return {
+    ...auditStats,
+    queued: auditQueue.length,
+    max_queue: AUDIT_MAX_QUEUE,
+    flush_size: AUDIT_FLUSH_SIZE,
+    flush_interval_ms: AUDIT_FLUSH_INTERVAL_MS,
+    update_mode: AUDIT_UPDATE_MODE
+  };
+}
+
+// Audit payload for an UPDATE. In diff mode only the changed fields are kept,
+// as { field: { from, to } }. Sensitive fields are never stored in clear.
+function updateAuditPayload(before, updateData, sensitiveFields = []) {
+  if (AUDIT_UPDATE_MODE !== 'diff') {
+    const payload = { ...updateData };
+    sensitiveFields.forEach(field => {
+      if (payload[field] !== undefined) payload[field] = '[HIDDEN]';
+    });
+    return payload;
+  }
+  
+  const changes = {};
+  for (const [field, value] of Object.entries(updateData)) {
+    if (field === 'updated_at' || value === undefined) continue;
+    if (JSON.stringify(before?.[field]) !== JSON.stringify(value)) {
+      changes[field] = sensitiveFields.includes(field)
+        ? { from: '[HIDDEN]', to: '[HIDDEN]' }
+        : { from: before?.[field] ?? null, to: value };
+    }
   }
+  return { changes };
+}
+
+// Audit logging function
+async function logAudit(action, entity, entityId, payload, userId = 'system', ip = 'unknown') {
+  await enqueueAudit([buildAuditEntry(action, entity, entityId, payload, userId, ip)]);
+}
+
+// Audit logging for a batch of records
+async function logAuditBatch(records, userId = 'system', ip = 'unknown') {
+  if (records.length === 0) return;
+  await enqueueAudit(records.map(({ action, entity, entityId, payload }) => (
+    buildAuditEntry(action, entity, entityId, payload, userId, ip)
+  )));
 }
 
 // Date validation for America/Bogota timezone
@@ -76,199 +913,1029 @@ function validateDate(dateString) {
   }
 }
 
-// Excel export with closure creation
-async function createExcelExport(filters, userId = 'system') {
-  try {
-    const { start_date, end_date, project_ids, cost_center_ids, engineer_ids } = filters;
-    
-    // Build query for time entries
-    let query = {};
-    if (start_date && end_date) {
-      query.date = { $gte: start_date, $lte: end_date };
-    }
-    if (project_ids?.length) {
-      query.project_id = { $in: project_ids };
-    }
-    if (cost_center_ids?.length) {
-      query.cost_center_id = { $in: cost_center_ids };
-    }
-    if (engineer_ids?.length) {
-      query.engineer_id = { $in: engineer_ids };
-    }
-    
-    // Get time entries with lookups
-    const timeEntries = await db.collection('time_entries').aggregate([
-      { $match: query },
-      {
-        $lookup: {
-          from: 'projects',
-          localField: 'project_id',
-          foreignField: 'id',
-          as: 'project'
-        }
-      },
-      { $unwind: { path: '$project', preserveNullAndEmptyArrays: true } },
-      {
-        $lookup: {
-          from: 'engineers',
-          localField: 'engineer_id',
-          foreignField: 'id',
-          as: 'engineer'
-        }
-      },
-      { $unwind: { path: '$engineer', preserveNullAndEmptyArrays: true } },
+// Build the time entry query shared by every export mode
+function buildExportQuery(filters) {
+  const { start_date, end_date, project_ids, cost_center_ids, engineer_ids } = filters;
+  
+  let query = {};
+  if (start_date && end_date) {
+    query.date = { $gte: start_date, $lte: end_date };
+  }
+  if (project_ids?.length) {
+    query.project_id = { $in: project_ids };
+  }
+  if (cost_center_ids?.length) {
+    query.cost_center_id = { $in: cost_center_ids };
+  }
+  if (engineer_ids?.length) {
+    query.engineer_id = { $in: engineer_ids };
+  }
+  return query;
+}
+
+// Export rows come from the denormalized read model, so the export is a
+// single indexed $match + $sort with no joins (plus the archived months)
+function buildExportPipeline(query, archives = []) {
+  return [
+    { $match: query },
+    ...unionArchiveStages(archives, [{ $match: query }]),
+    { $sort: { date: 1, project_name: 1 } }
+  ];
+}
+
+// Export columns: [header, value getter]
+const EXPORT_COLUMNS = [
+  ['Fecha', entry => entry.date],
+  ['Proyecto', entry => entry.project_name || 'N/A'],
+  ['Código Proyecto', entry => entry.project_code || 'N/A'],
+  ['Centro de Costo', entry => entry.cost_center_name || 'N/A'],
+  ['Código CC', entry => entry.cost_center_code || 'N/A'],
+  ['Ingeniero', entry => entry.engineer_title || 'N/A'],
+  ['Documento', entry => entry.engineer_document || 'N/A'],
+  ['Concepto', entry => entry.concept_name || 'N/A'],
+  ['Código Concepto', entry => entry.concept_code || 'N/A'],
+  ['Horas', entry => entry.hours],
+  ['Notas', entry => entry.notes || ''],
+  ['Creado Por', entry => entry.created_by],
+  ['Fecha Creación', entry => entry.created_at],
+  ['Post-Export Adj', entry => entry.post_export_adjustment ? 'SÍ' : 'NO']
+];
+
+function exportRowValues(entry) {
+  return EXPORT_COLUMNS.map(([, getValue]) => getValue(entry));
+}
+
+// Optional summary sheets: hours per catalog dimension. All requested
+// summaries are computed by a single $facet aggregation over the export rows;
+// the detail sheet is still streamed from its own cursor, since a $facet
+// result has to fit in one 16MB document.
+const SUMMARY_SHEETS = {
+  project: { name: 'Por Proyecto', key: 'project_id', columns: [['Código Proyecto', 'project_code'], ['Proyecto', 'project_name']] },
+  engineer: { name: 'Por Ingeniero', key: 'engineer_id', columns: [['Documento', 'engineer_document'], ['Ingeniero', 'engineer_title']] },
+  cost_center: { name: 'Por Centro de Costo', key: 'cost_center_id', columns: [['Código CC', 'cost_center_code'], ['Centro de Costo', 'cost_center_name']] },
+  concept: { name: 'Por Concepto', key: 'concept_id', columns: [['Código Concepto', 'concept_code'], ['Concepto', 'concept_name']] }
+};
+const SUMMARY_VALUE_HEADERS = ['Horas', 'Registros', 'Ajustes Post-Export'];
+
+// Validate the export body options. summary_sheets is true (all sheets) or a
+// list of SUMMARY_SHEETS keys; summaries are only available in XLSX.
+function parseExportOptions(body) {
+  const format = body.format === 'csv' ? 'csv' : 'xlsx';
+  const requested = body.summary_sheets === true ? Object.keys(SUMMARY_SHEETS) : [].concat(body.summary_sheets || []);
+  
+  const invalid = requested.filter(name => !SUMMARY_SHEETS[name]);
+  let message = null;
+  if (invalid.length > 0) {
+    message = `Hojas de resumen desconocidas: ${invalid.join(', ')}`;
+  } else if (format === 'csv' && requested.length > 0) {
+    message = 'Las hojas de resumen solo están disponibles en formato xlsx';
+  }
+  if (message) {
+    const error = new Error(message);
+    error.status = 400;
+    throw error;
+  }
+  
+  return { format, summarySheets: Object.keys(SUMMARY_SHEETS).filter(name => requested.includes(name)) };
+}
+
+async function computeSummaries(query, archives, summarySheets) {
+  const facets = Object.fromEntries(summarySheets.map(name => {
+    const { key, columns } = SUMMARY_SHEETS[name];
+    return [name, [
       {
-        $lookup: {
-          from: 'cost_centers',
-          localField: 'cost_center_id',
-          foreignField: 'id',
-          as: 'cost_center'
+        $group: {
+          _id: `$${key}`,
+          ...Object.fromEntries(columns.map(([, field]) => [field, { $first: `$${field}` }])),
+          hours: { $sum: { $toDouble: '$hours' } },
+          entries: { $sum: 1 },
+          adjustments: { $sum: { $cond: [{ $eq: ['$post_export_adjustment', true] }, 1, 0] } }
         }
       },
-      { $unwind: { path: '$cost_center', preserveNullAndEmptyArrays: true } },
+      { $sort: { hours: -1, _id: 1 } }
+    ]];
+  }));
+  
+  const [summaries] = await db.collection('time_entry_views').aggregate([
+    { $match: query },
+    ...unionArchiveStages(archives, [{ $match: query }]),
+    { $facet: facets }
+  ], { allowDiskUse: true }).toArray();
+  return summaries;
+}
+
+function summaryHeader(name) {
+  return [...SUMMARY_SHEETS[name].columns.map(([header]) => header), ...SUMMARY_VALUE_HEADERS];
+}
+
+function summaryRowValues(name, groups) {
+  const { columns } = SUMMARY_SHEETS[name];
+  const totals = { hours: 0, entries: 0, adjustments: 0 };
+  const rows = groups.map(group => {
+    totals.hours += group.hours;
+    totals.entries += group.entries;
+    totals.adjustments += group.adjustments;
+    return [
+      ...columns.map(([, field]) => group[field] || 'N/A'),
+      Math.round(group.hours * 100) / 100,
+      group.entries,
+      group.adjustments
+    ];
+  });
+  
+  rows.push(['Total', ...columns.slice(1).map(() => ''), Math.round(totals.hours * 100) / 100, totals.entries, totals.adjustments]);
+  return rows;
+}
+
+async function* summaryRows(name, summaries) {
+  yield* summaryRowValues(name, (await summaries)[name]);
+}
+
+// Content fingerprint of the rows an export would contain, computed before
+// any row is materialized. Count, hours and the latest change are aggregated
+// on the server. The id hash needs a digest per id, which the aggregation
+// language cannot compute, so it is summed here from a pass that reads only
+// the ids; a sum of per-id digests does not depend on the order of the rows.
+async function computeExportFingerprint(query, archives = []) {
+  const views = db.collection('time_entry_views');
+  const totalStages = [
+    { $match: query },
+    { $project: { _id: 0, hours: 1, updated_at: { $ifNull: ['$updated_at', '$created_at'] } } }
+  ];
+  const idStages = [{ $match: query }, { $project: { _id: 0, id: 1 } }];
+  
+  const [[totals], idsHash] = await Promise.all([
+    views.aggregate([
+      ...totalStages,
+      ...unionArchiveStages(archives, totalStages),
       {
-        $lookup: {
-          from: 'concepts',
-          localField: 'concept_id',
-          foreignField: 'id',
-          as: 'concept'
+        $group: {
+          _id: null,
+          count: { $sum: 1 },
+          hours: { $sum: { $toDouble: '$hours' } },
+          max_updated_at: { $max: '$updated_at' }
         }
-      },
-      { $unwind: { path: '$concept', preserveNullAndEmptyArrays: true } },
-      { $sort: { date: 1, 'project.name': 1 } }
-    ]).toArray();
-    
-    // Create Excel workbook
-    const workbook = XLSX.utils.book_new();
-    
-    // Prepare data for Excel
-    const excelData = timeEntries.map(entry => ({
-      'Fecha': entry.date,
-      'Proyecto': entry.project?.name || 'N/A',
-      'Código Proyecto': entry.project?.code || 'N/A',
-      'Centro de Costo': entry.cost_center?.name || 'N/A',
-      'Código CC': entry.cost_center?.code || 'N/A',
-      'Ingeniero': entry.engineer?.title || 'N/A',
-      'Documento': entry.engineer?.document_number || 'N/A',
-      'Concepto': entry.concept?.name || 'N/A',
-      'Código Concepto': entry.concept?.code || 'N/A',
-      'Horas': entry.hours,
-      'Notas': entry.notes || '',
-      'Creado Por': entry.created_by,
-      'Fecha Creación': entry.created_at,
-      'Post-Export Adj': entry.post_export_adjustment ? 'SÍ' : 'NO'
-    }));
-    
-    // Create worksheet
-    const worksheet = XLSX.utils.json_to_sheet(excelData);
-    XLSX.utils.book_append_sheet(workbook, worksheet, 'Registros de Tiempo');
-    
-    // Generate buffer
-    const excelBuffer = XLSX.write(workbook, { type: 'buffer', bookType: 'xlsx' });
-    
-    // Generate hash for idempotency
-    const exportHash = Buffer.from(JSON.stringify({
-      start_date,
-      end_date,
-      project_ids: project_ids?.sort(),
-      cost_center_ids: cost_center_ids?.sort(),
-      engineer_ids: engineer_ids?.sort(),
-      count: timeEntries.length
-    })).toString('base64');
-    
-    // Check for existing identical closure (idempotency)
-    const existingClosure = await db.collection('export_closures').findOne({
-      status: 'ACTIVO',
-      date_start: start_date,
-      date_end: end_date,
-      export_hash: exportHash
-    });
-    
-    let closure;
-    if (existingClosure) {
-      // Update existing closure (increment revision)
-      closure = await db.collection('export_closures').findOneAndUpdate(
-        { id: existingClosure.id },
-        { 
-          $set: { 
-            revision: existingClosure.revision + 1,
-            export_file_id: uuidv4(),
-            created_at: new Date().toISOString()
-          }
-        },
-        { returnDocument: 'after' }
-      );
-      await logAudit('UPDATE', 'export_closure', existingClosure.id, { revision: closure.revision }, userId);
-    } else {
-      // Create new closure
-      const closureId = uuidv4();
-      closure = {
-        id: closureId,
-        status: 'ACTIVO',
-        date_start: start_date,
-        date_end: end_date,
-        created_by: userId,
-        created_at: new Date().toISOString(),
-        export_file_id: uuidv4(),
-        export_hash: exportHash,
-        revision: 1
-      };
-      
-      await db.collection('export_closures').insertOne(closure);
-      
-      // Create closure scope entries
-      const scopeEntries = [];
-      
-      // If no specific filters, means "all" (null values)
-      if (!project_ids?.length && !cost_center_ids?.length && !engineer_ids?.length) {
-        scopeEntries.push({
-          id: uuidv4(),
-          closure_id: closureId,
-          project_id: null,
-          cost_center_id: null,
-          engineer_id: null
-        });
-      } else {
-        // Create specific scope entries
-        const projects = project_ids?.length ? project_ids : [null];
-        const costCenters = cost_center_ids?.length ? cost_center_ids : [null];
-        const engineers = engineer_ids?.length ? engineer_ids : [null];
-        
-        for (const projectId of projects) {
-          for (const costCenterId of costCenters) {
-            for (const engineerId of engineers) {
-              scopeEntries.push({
-                id: uuidv4(),
-                closure_id: closureId,
-                project_id: projectId,
-                cost_center_id: costCenterId,
-                engineer_id: engineerId
-              });
-            }
-          }
-        }
-      }
-      
-      if (scopeEntries.length > 0) {
-        await db.collection('export_closure_scope').insertMany(scopeEntries);
       }
-      
-      await logAudit('CREATE', 'export_closure', closureId, closure, userId);
+    ], { allowDiskUse: true }).toArray(),
+    sumIdDigests(views.aggregate([
+      ...idStages,
+      ...unionArchiveStages(archives, idStages)
+    ], { batchSize: EXPORT_BATCH_SIZE }))
+  ]);
+  
+  return {
+    count: totals?.count || 0,
+    hours: Math.round((totals?.hours || 0) * 100) / 100,
+    max_updated_at: totals?.max_updated_at || null,
+    ids_hash: idsHash
+  };
+}
+
+async function sumIdDigests(cursor) {
+  let hash = 0n;
+  for await (const { id } of cursor) {
+    const digest = crypto.createHash('sha1').update(id).digest();
+    hash = BigInt.asUintN(64, hash + digest.readBigUInt64BE(0));
+  }
+  return hash.toString(16).padStart(16, '0');
+}
+
+// Stored artifact for a file id, if it was fully written in the given format
+// with the same summary sheets
+async function findExportArtifact(fileId, format, summarySheets = []) {
+  if (!fileId) return null;
+  return db.collection('export_artifacts.files').findOne({
+    _id: fileId,
+    'metadata.contentType': EXPORT_CONTENT_TYPES[format],
+    'metadata.summary_sheets': summarySheets.length > 0 ? summarySheets : { $in: [null, []] }
+  });
+}
+
+// Closure scope: one id list per dimension, null meaning "all". An entry is
+// in scope when every dimension matches, which is the same rule the former
+// cartesian export_closure_scope rows expressed with one row per combination.
+const CLOSURE_SCOPE_DIMENSIONS = {
+  project_ids: 'project_id',
+  cost_center_ids: 'cost_center_id',
+  engineer_ids: 'engineer_id'
+};
+
+function buildClosureScope(filters) {
+  return Object.fromEntries(Object.keys(CLOSURE_SCOPE_DIMENSIONS).map(dimension => (
+    [dimension, filters[dimension]?.length ? [...new Set(filters[dimension])].sort() : null]
+  )));
+}
+
+// Scope of a closure created before scopes were stored on the closure,
+// derived from its export_closure_scope rows
+function closureScopeFromRows(rows) {
+  return Object.fromEntries(Object.entries(CLOSURE_SCOPE_DIMENSIONS).map(([dimension, field]) => {
+    if (rows.length === 0 || rows.some(row => row[field] == null)) return [dimension, null];
+    return [dimension, [...new Set(rows.map(row => row[field]))].sort()];
+  }));
+}
+
+// Fill in the scope of closures that only have legacy scope rows
+// withClosureScopes over a cursor, one batch of closures at a time
+async function* streamWithClosureScopes(closures, batchSize = 500) {
+  let batch = [];
+  for await (const closure of closures) {
+    batch.push(closure);
+    if (batch.length >= batchSize) {
+      yield* await withClosureScopes(batch);
+      batch = [];
+    }
+  }
+  if (batch.length > 0) {
+    yield* await withClosureScopes(batch);
+  }
+}
+
+async function withClosureScopes(closures) {
+  const legacyIds = closures.filter(closure => !closure.scope).map(closure => closure.id);
+  if (legacyIds.length === 0) return closures;
+  
+  const rows = await db.collection('export_closure_scope').find({ closure_id: { $in: legacyIds } }).toArray();
+  const rowsByClosure = new Map(legacyIds.map(id => [id, []]));
+  rows.forEach(row => rowsByClosure.get(row.closure_id).push(row));
+  
+  return closures.map(closure => (
+    closure.scope ? closure : { ...closure, scope: closureScopeFromRows(rowsByClosure.get(closure.id)) }
+  ));
+}
+
+// Store the derived scope on every legacy closure and drop its scope rows
+async function migrateClosureScopes() {
+  const legacy = await withClosureScopes(
+    await db.collection('export_closures').find({ scope: { $exists: false } }).toArray()
+  );
+  
+  for (const closure of legacy) {
+    await db.collection('export_closures').updateOne(
+      { id: closure.id, scope: { $exists: false } },
+      { $set: { scope: closure.scope } }
+    );
+  }
+  
+  const closureIds = legacy.map(closure => closure.id);
+  const { deletedCount } = closureIds.length > 0
+    ? await db.collection('export_closure_scope').deleteMany({ closure_id: { $in: closureIds } })
+    : { deletedCount: 0 };
+  
+  await invalidateClosureIndex();
+  return { closures: closureIds.length, scope_rows_deleted: deletedCount };
+}
+
+// Closure an export belongs to: the ACTIVO closure with the same filters and
+// content fingerprint, or a new one. Nothing is written yet; the plan holds
+// the ids the artifact is stored under, and the stored artifact when the
+// closure's previous export can be served again as is.
+async function planExportClosure(filters, fingerprint, format = 'xlsx', summarySheets = []) {
+  const { start_date, end_date, project_ids, cost_center_ids, engineer_ids } = filters;
+  
+  // Generate hash for idempotency
+  const exportHash = crypto.createHash('sha1').update(JSON.stringify({
+    start_date,
+    end_date,
+    project_ids: project_ids?.slice().sort(),
+    cost_center_ids: cost_center_ids?.slice().sort(),
+    engineer_ids: engineer_ids?.slice().sort(),
+    fingerprint
+  })).digest('hex');
+  
+  // Check for existing identical closure (idempotency)
+  const existingClosure = await db.collection('export_closures').findOne({
+    status: 'ACTIVO',
+    date_start: start_date,
+    date_end: end_date,
+    export_hash: exportHash
+  });
+  
+  // Same content: reuse the stored file if it is complete, otherwise build a new one
+  const artifact = existingClosure
+    ? await findExportArtifact(existingClosure.export_file_id, format, summarySheets)
+    : null;
+  
+  return {
+    filters,
+    fingerprint,
+    exportHash,
+    existingClosure,
+    artifact,
+    closureId: existingClosure?.id || uuidv4(),
+    exportFileId: artifact ? existingClosure.export_file_id : uuidv4()
+  };
+}
+
+// Create the planned closure, or bump the revision of the existing one. Called
+// once the artifact is complete, so a failed build never leaves an ACTIVO
+// closure pointing at a file that does not exist.
+async function upsertExportClosure(plan, userId = 'system') {
+  const { filters, fingerprint, existingClosure, artifact } = plan;
+  
+  let closure;
+  if (existingClosure) {
+    closure = await db.collection('export_closures').findOneAndUpdate(
+      { id: existingClosure.id },
+      { 
+        $inc: { revision: 1 },
+        $set: { 
+          export_file_id: plan.exportFileId,
+          created_at: new Date().toISOString(),
+          revised_at: new Date().toISOString()
+        }
+      },
+      { returnDocument: 'after' }
+    );
+    await logAudit('UPDATE', 'export_closure', existingClosure.id, {
+      revision: closure.revision,
+      artifact_reused: Boolean(artifact)
+    }, userId);
+  } else {
+    // Create new closure
+    closure = {
+      id: plan.closureId,
+      status: 'ACTIVO',
+      date_start: filters.start_date,
+      date_end: filters.end_date,
+      created_by: userId,
+      created_at: new Date().toISOString(),
+      revised_at: new Date().toISOString(),
+      export_file_id: plan.exportFileId,
+      export_hash: plan.exportHash,
+      fingerprint: fingerprint,
+      scope: buildClosureScope(filters),
+      revision: 1
+    };
+    
+    await db.collection('export_closures').insertOne(closure);
+    
+    await logAudit('CREATE', 'export_closure', closure.id, closure, userId);
+  }
+  
+  await recordClosureRevision(closure, 'COMPLETA', {
+    export_file_id: closure.export_file_id,
+    record_count: fingerprint.count
+  }, userId);
+  
+  await invalidateClosureIndex();
+  return closure;
+}
+
+// Closure ids known before the closure is written, for response headers and
+// artifact metadata
+function plannedClosure(plan) {
+  return { id: plan.closureId, export_file_id: plan.exportFileId };
+}
+
+// History of a closure's exports: one document per revision, full or delta
+async function recordClosureRevision(closure, type, details, userId = 'system') {
+  const revision = {
+    id: uuidv4(),
+    closure_id: closure.id,
+    revision: closure.revision,
+    type: type,
+    ...details,
+    created_by: userId,
+    created_at: closure.revised_at
+  };
+  await db.collection('export_closure_revisions').insertOne(revision);
+  return revision;
+}
+
+// Streaming export: rows are read from the cursor in batches and written to the
+// response as they arrive, so memory use does not depend on the export size
+const EXPORT_BATCH_SIZE = parseInt(process.env.EXPORT_BATCH_SIZE || '1000', 10);
+
+const EXPORT_CONTENT_TYPES = {
+  xlsx: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+  csv: 'text/csv; charset=utf-8'
+};
+
+async function streamExcelExport(filters, userId = 'system', format = 'xlsx') {
+  try {
+    const { start_date, end_date } = filters;
+    const { summarySheets } = parseExportOptions({ ...filters, format });
+    const query = buildExportQuery(filters);
+    
+    await timeStage('read_models', () => ensureReadModels());
+    
+    // Fingerprint first so the closure and X-Record-Count are known before any row is sent
+    const archives = await archiveCollections(start_date, end_date);
+    const fingerprint = await timeStage('fingerprint', () => computeExportFingerprint(query, archives));
+    const recordCount = fingerprint.count;
+    const plan = await timeStage('closure', () => planExportClosure(filters, fingerprint, format, summarySheets));
+    const { artifact } = plan;
+    
+    // Unchanged content: stream the stored file instead of rebuilding it
+    if (artifact) {
+      const closure = await timeStage('closure_commit', () => upsertExportClosure(plan, userId));
+      return {
+        closure: closure,
+        chunks: exportArtifacts().openDownloadStream(artifact._id),
+        contentType: EXPORT_CONTENT_TYPES[format],
+        filename: artifact.filename,
+        recordCount: recordCount
+      };
+    }
+    
+    const cursor = db.collection('time_entry_views').aggregate(buildExportPipeline(query, archives), {
+      allowDiskUse: true,
+      batchSize: EXPORT_BATCH_SIZE
+    });
+    const header = EXPORT_COLUMNS.map(([name]) => name);
+    const rows = mapCursor(cursor, exportRowValues);
+    
+    // Summaries are aggregated while the detail sheet streams
+    let summaries = null;
+    if (summarySheets.length > 0) {
+      summaries = timeStage('summaries', () => computeSummaries(query, archives, summarySheets));
+      summaries.catch(() => {}); // Surfaced when the summary sheets are written
     }
     
+    const chunks = format === 'csv'
+      ? csvChunks(header, rows)
+      : xlsxWorkbookChunks([
+        { name: 'Registros de Tiempo', header, rows },
+        ...summarySheets.map(name => ({ name: SUMMARY_SHEETS[name].name, header: summaryHeader(name), rows: summaryRows(name, summaries) }))
+      ]);
+    const filename = `registros_tiempo_${start_date}_${end_date}.${format}`;
+    
+    // Every chunk is also written to the artifact store as it is produced; the
+    // closure is written once the stored file is complete
     return {
-      closure: closure,
-      excelBuffer: excelBuffer,
-      filename: `registros_tiempo_${start_date}_${end_date}.xlsx`,
-      recordCount: timeEntries.length
+      closure: plannedClosure(plan),
+      chunks: timeChunks('stream_body', storeArtifactChunks(chunks, plan.exportFileId, filename, {
+        contentType: EXPORT_CONTENT_TYPES[format],
+        closure_id: plan.closureId,
+        record_count: recordCount,
+        summary_sheets: summarySheets
+      }, () => timeStage('closure_commit', () => upsertExportClosure(plan, userId)))),
+      contentType: EXPORT_CONTENT_TYPES[format],
+      filename: filename,
+      recordCount: recordCount
     };
     
   } catch (error) {
-    console.error('Error creating Excel export:', error);
+    console.error('Error creating streaming export:', error);
     throw error;
   }
 }
 
+// Delta export of a closure: only the entries created (ALTA), changed
+// (MODIFICACIÓN) or deleted (BAJA) since the closure's last revision, read
+// from the views' updated_at and the DELETE audit entries. The delta is
+// stored and recorded as a new revision of the closure.
+const CHANGE_TYPE_HEADER = 'Tipo de Cambio';
+
+function closureExportFilters(closure) {
+  return { start_date: closure.date_start, end_date: closure.date_end, ...closure.scope };
+}
+
+function entryInClosure(entry, closure) {
+  if (entry.date < closure.date_start || entry.date > closure.date_end) return false;
+  return Object.entries(CLOSURE_SCOPE_DIMENSIONS).every(([dimension, field]) => (
+    !closure.scope[dimension] || closure.scope[dimension].includes(entry[field])
+  ));
+}
+
+async function createDeltaExport(closureId, userId = 'system', format = 'xlsx') {
+  const [closure] = await withClosureScopes(
+    await db.collection('export_closures').find({ id: closureId }).toArray()
+  );
+  if (!closure) return null;
+  
+  // Pending audit entries must be visible before deletions are read
+  const query = buildExportQuery(closureExportFilters(closure));
+  await Promise.all([ensureReadModels(), flushAudit()]);
+  
+  const since = closure.revised_at || closure.created_at;
+  const revisedAt = new Date().toISOString();
+  const [changed, deletions] = await Promise.all([
+    db.collection('time_entry_views')
+      .find({ ...query, updated_at: { $gt: since } })
+      .toArray(),
+    db.collection('audit_log')
+      .find({ entity: 'time_entry', action: 'DELETE', created_at: { $gt: since } })
+      .toArray()
+  ]);
+  
+  // Entries created and deleted after the last revision were never exported
+  const deleted = await buildTimeEntryViews(deletions
+    .map(audit => audit.payload)
+    .filter(entry => entry && entry.created_at <= since && entryInClosure(entry, closure)));
+  
+  const changes = [
+    ...changed.map(entry => [entry.created_at > since ? 'ALTA' : 'MODIFICACIÓN', entry]),
+    ...deleted.map(entry => ['BAJA', entry])
+  ].sort(([, a], [, b]) => (
+    a.date.localeCompare(b.date) || (a.project_name || '').localeCompare(b.project_name || '')
+  ));
+  
+  const counts = { ALTA: 0, 'MODIFICACIÓN': 0, BAJA: 0 };
+  changes.forEach(([type]) => counts[type]++);
+  
+  const header = [CHANGE_TYPE_HEADER, ...EXPORT_COLUMNS.map(([name]) => name)];
+  const rows = changes.map(([type, entry]) => [type, ...exportRowValues(entry)]);
+  const chunks = format === 'csv'
+    ? csvChunks(header, rows)
+    : xlsxWorkbookChunks([{ name: 'Ajustes', header, rows }]);
+  const fileId = uuidv4();
+  const filename = `ajustes_${closure.date_start}_${closure.date_end}_${revisedAt.slice(0, 10)}.${format}`;
+  
+  await drain(storeArtifactChunks(chunks, fileId, filename, {
+    contentType: EXPORT_CONTENT_TYPES[format],
+    closure_id: closure.id,
+    record_count: changes.length
+  }));
+  
+  const revised = await db.collection('export_closures').findOneAndUpdate(
+    { id: closure.id },
+    { $inc: { revision: 1 }, $set: { revised_at: revisedAt } },
+    { returnDocument: 'after' }
+  );
+  const revision = await recordClosureRevision(revised, 'DELTA', {
+    since: since,
+    export_file_id: fileId,
+    record_count: changes.length,
+    changes: counts
+  }, userId);
+  await logAudit('DELTA_EXPORT', 'export_closure', closure.id, { revision: revision.revision, changes: counts }, userId);
+  
+  return revision;
+}
+
+// Export artifacts are stored in GridFS under the closure's export_file_id
+function exportArtifacts() {
+  return new GridFSBucket(db, { bucketName: 'export_artifacts' });
+}
+
+// Pass chunks through while writing them to the artifact store. The upload is
+// aborted if the source fails or the consumer stops early; onStored runs once
+// the file is complete, before the last read of the body returns.
+async function* storeArtifactChunks(chunks, fileId, filename, metadata, onStored = null) {
+  const upload = exportArtifacts().openUploadStreamWithId(fileId, filename, { metadata });
+  let completed = false;
+  
+  try {
+    for await (const chunk of chunks) {
+      if (!upload.write(chunk)) {
+        await once(upload, 'drain');
+      }
+      yield chunk;
+    }
+    upload.end();
+    await once(upload, 'finish');
+    completed = true;
+    if (onStored) await onStored();
+  } finally {
+    if (!completed) {
+      await upload.abort().catch(error => console.error('Artifact abort error:', error));
+    }
+  }
+}
+
+async function drain(iterable) {
+  for await (const chunk of iterable) {
+    // Consumed for its side effects
+  }
+}
+
+// Response streaming a stored artifact, or null if it does not exist
+async function artifactResponse(fileId) {
+  const file = await db.collection('export_artifacts.files').findOne({ _id: fileId });
+  if (!file) return null;
+  
+  const headers = {
+    'Content-Type': file.metadata?.contentType || 'application/octet-stream',
+    'Content-Length': String(file.length),
+    'Content-Disposition': `attachment; filename="${file.filename}"`,
+    'X-Export-File-Id': fileId
+  };
+  if (file.metadata?.closure_id) headers['X-Closure-Id'] = file.metadata.closure_id;
+  if (file.metadata?.record_count !== undefined) headers['X-Record-Count'] = String(file.metadata.record_count);
+  
+  return new NextResponse(iterableToStream(exportArtifacts().openDownloadStream(fileId)), { status: 200, headers });
+}
+
+// Asynchronous export jobs: POST /api/export-jobs queues the export and an
+// in-process worker runs it, storing the file in the artifact store. Jobs are
+// claimed atomically, so several processes can share the queue; a job whose
+// lease expired (process crashed mid-export) is picked up again.
+const EXPORT_WORKER_CONCURRENCY = parseInt(process.env.EXPORT_WORKER_CONCURRENCY || '1', 10);
+const EXPORT_JOB_LEASE_MS = parseInt(process.env.EXPORT_JOB_LEASE_MS || '900000', 10);
+let activeExportWorkers = 0;
+
+async function enqueueExportJob(filters, userId = 'system') {
+  const { user_id, ...jobFilters } = filters;
+  const { format } = parseExportOptions(filters);
+  const job = {
+    id: uuidv4(),
+    status: 'EN_COLA',
+    format: format,
+    filters: jobFilters,
+    user_id: userId,
+    attempts: 0,
+    created_at: new Date().toISOString()
+  };
+  
+  await db.collection('export_jobs').insertOne(job);
+  await logAudit('CREATE', 'export_job', job.id, job, userId);
+  startExportWorkers();
+  
+  return job;
+}
+
+function startExportWorkers() {
+  while (activeExportWorkers < EXPORT_WORKER_CONCURRENCY) {
+    activeExportWorkers++;
+    runExportWorker().finally(() => {
+      activeExportWorkers--;
+    });
+  }
+}
+
+async function runExportWorker() {
+  try {
+    while (true) {
+      const now = new Date();
+      const job = await db.collection('export_jobs').findOneAndUpdate(
+        {
+          $or: [
+            { status: 'EN_COLA' },
+            { status: 'EN_PROCESO', lease_expires_at: { $lt: now.toISOString() } }
+          ]
+        },
+        {
+          $set: {
+            status: 'EN_PROCESO',
+            started_at: now.toISOString(),
+            lease_expires_at: new Date(now.getTime() + EXPORT_JOB_LEASE_MS).toISOString()
+          },
+          $inc: { attempts: 1 }
+        },
+        { sort: { created_at: 1 }, returnDocument: 'after' }
+      );
+      
+      if (!job) return;
+      await processExportJob(job);
+    }
+  } catch (error) {
+    console.error('Export worker error:', error);
+  }
+}
+
+async function processExportJob(job) {
+  try {
+    const exportResult = await streamExcelExport(job.filters, job.user_id, job.format);
+    await drain(exportResult.chunks);
+    
+    await db.collection('export_jobs').updateOne(
+      { id: job.id },
+      {
+        $set: {
+          status: 'COMPLETADO',
+          closure_id: exportResult.closure.id,
+          export_file_id: exportResult.closure.export_file_id,
+          filename: exportResult.filename,
+          record_count: exportResult.recordCount,
+          finished_at: new Date().toISOString()
+        },
+        $unset: { lease_expires_at: '' }
+      }
+    );
+  } catch (error) {
+    console.error(`Export job ${job.id} failed:`, error);
+    await db.collection('export_jobs').updateOne(
+      { id: job.id },
+      {
+        $set: { status: 'FALLIDO', error: error.message, finished_at: new Date().toISOString() },
+        $unset: { lease_expires_at: '' }
+      }
+    );
+  }
+}
+
+async function* mapCursor(cursor, mapFn) {
+  for await (const doc of cursor) {
+    yield mapFn(doc);
+  }
+}
+
+// Wrap an async iterable of byte chunks in a pull-based ReadableStream, so the
+// cursor is only advanced when the client is ready for more data
+function iterableToStream(iterable) {
+  const iterator = iterable[Symbol.asyncIterator]();
+  return new ReadableStream({
+    async pull(controller) {
+      try {
+        const { value, done } = await iterator.next();
+        if (done) {
+          controller.close();
+        } else {
+          controller.enqueue(value);
+        }
+      } catch (error) {
+        console.error('Export stream error:', error);
+        controller.error(error);
+      }
+    },
+    async cancel() {
+      await iterator.return?.();
+    }
+  });
+}
+
+// NDJSON mode of the large read endpoints (Accept: application/x-ndjson).
+// Documents are serialized one at a time from the cursor, in chunks of about
+// NDJSON_CHUNK_BYTES, and compressed with br or gzip when Accept-Encoding
+// allows it; neither the result set nor its JSON text is held whole.
+const NDJSON_CONTENT_TYPE = 'application/x-ndjson';
+const NDJSON_CHUNK_BYTES = parseInt(process.env.NDJSON_CHUNK_BYTES || '65536', 10);
+const NDJSON_ENCODINGS = ['br', 'gzip'];
+
+function wantsNdjson(request) {
+  return (request.headers.get('accept') || '').includes(NDJSON_CONTENT_TYPE);
+}
+
+// First of NDJSON_ENCODINGS accepted with q > 0, or null for identity
+function negotiateEncoding(request) {
+  const accepted = new Map((request.headers.get('accept-encoding') || '').split(',').map(part => {
+    const [name, ...params] = part.trim().toLowerCase().split(';').map(value => value.trim());
+    const q = params.find(param => param.startsWith('q='));
+    return [name, q ? parseFloat(q.slice(2)) : 1];
+  }));
+  return NDJSON_ENCODINGS.find(encoding => (accepted.get(encoding) ?? accepted.get('*') ?? 0) > 0) || null;
+}
+
+async function* ndjsonChunks(docs) {
+  let lines = [];
+  let size = 0;
+  for await (const doc of docs) {
+    const line = JSON.stringify(doc) + '\n';
+    lines.push(line);
+    size += line.length;
+    if (size >= NDJSON_CHUNK_BYTES) {
+      yield Buffer.from(lines.join(''));
+      lines = [];
+      size = 0;
+    }
+  }
+  if (lines.length > 0) {
+    yield Buffer.from(lines.join(''));
+  }
+}
+
+function ndjsonResponse(request, docs) {
+  const headers = { 'Content-Type': NDJSON_CONTENT_TYPE, 'Vary': 'Accept, Accept-Encoding' };
+  let chunks = ndjsonChunks(docs);
+  
+  const encoding = negotiateEncoding(request);
+  if (encoding) {
+    const encoder = encoding === 'br'
+      ? zlib.createBrotliCompress({ params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 } })
+      : zlib.createGzip();
+    // Destroying the encoder (client gone) also closes the source cursor
+    pipeline(Readable.from(chunks), encoder, error => {
+      if (error && error.code !== 'ERR_STREAM_PREMATURE_CLOSE') {
+        console.error('NDJSON stream error:', error);
+      }
+    });
+    chunks = encoder;
+    headers['Content-Encoding'] = encoding;
+  }
+  
+  return new NextResponse(iterableToStream(chunks), { status: 200, headers });
+}
+
+function csvValue(value) {
+  if (value === null || value === undefined) return '';
+  const text = String(value);
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+}
+
+async function* csvChunks(header, rows) {
+  // BOM so Excel opens the UTF-8 file with the right encoding
+  let batch = '\uFEFF' + header.map(csvValue).join(',') + '\r\n';
+  let batchRows = 0;
+  
+  for await (const values of rows) {
+    batch += values.map(csvValue).join(',') + '\r\n';
+    if (++batchRows >= EXPORT_BATCH_SIZE) {
+      yield Buffer.from(batch, 'utf8');
+      batch = '';
+      batchRows = 0;
+    }
+  }
+  
+  if (batch) {
+    yield Buffer.from(batch, 'utf8');
+  }
+}
+
+// Minimal streaming ZIP writer. Entries use data descriptors so that sizes and
+// CRCs can be written after the data; each chunk is deflated with a sync flush
+// so independent chunks concatenate into one valid deflate stream.
+const CRC32_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+function crc32(buffer, crc = 0) {
+  crc = (crc ^ 0xFFFFFFFF) >>> 0;
+  for (let i = 0; i < buffer.length; i++) {
+    crc = CRC32_TABLE[(crc ^ buffer[i]) & 0xFF] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+
+function createZipWriter() {
+  const entries = [];
+  const now = new Date();
+  const dosTime = (now.getHours() << 11) | (now.getMinutes() << 5) | Math.floor(now.getSeconds() / 2);
+  const dosDate = ((now.getFullYear() - 1980) << 9) | ((now.getMonth() + 1) << 5) | now.getDate();
+  const FLAGS = 0x0808; // data descriptor + UTF-8 names
+  let offset = 0;
+  let current = null;
+  
+  const track = (buffer) => {
+    offset += buffer.length;
+    if (current) current.compressedSize += buffer.length;
+    return buffer;
+  };
+  
+  return {
+    startEntry(name) {
+      const nameBuffer = Buffer.from(name, 'utf8');
+      const header = Buffer.alloc(30);
+      header.writeUInt32LE(0x04034b50, 0);
+      header.writeUInt16LE(20, 4);
+      header.writeUInt16LE(FLAGS, 6);
+      header.writeUInt16LE(8, 8);
+      header.writeUInt16LE(dosTime, 10);
+      header.writeUInt16LE(dosDate, 12);
+      header.writeUInt16LE(nameBuffer.length, 26);
+      const entry = { nameBuffer, offset, crc: 0, size: 0, compressedSize: 0 };
+      const out = Buffer.concat([header, nameBuffer]);
+      offset += out.length;
+      current = entry;
+      entries.push(entry);
+      return out;
+    },
+    
+    writeEntry(data) {
+      const buffer = Buffer.isBuffer(data) ? data : Buffer.from(data, 'utf8');
+      if (buffer.length === 0) return Buffer.alloc(0);
+      current.crc = crc32(buffer, current.crc);
+      current.size += buffer.length;
+      return track(zlib.deflateRawSync(buffer, { finishFlush: zlib.constants.Z_SYNC_FLUSH }));
+    },
+    
+    endEntry() {
+      // Empty final deflate block closes the stream
+      const finalBlock = track(zlib.deflateRawSync(Buffer.alloc(0)));
+      const descriptor = Buffer.alloc(16);
+      descriptor.writeUInt32LE(0x08074b50, 0);
+      descriptor.writeUInt32LE(current.crc, 4);
+      descriptor.writeUInt32LE(current.compressedSize >>> 0, 8);
+      descriptor.writeUInt32LE(current.size >>> 0, 12);
+      offset += descriptor.length;
+      current = null;
+      return Buffer.concat([finalBlock, descriptor]);
+    },
+    
+    finish() {
+      const centralOffset = offset;
+      const records = entries.map(entry => {
+        const record = Buffer.alloc(46);
+        record.writeUInt32LE(0x02014b50, 0);
+        record.writeUInt16LE(20, 4);
+        record.writeUInt16LE(20, 6);
+        record.writeUInt16LE(FLAGS, 8);
+        record.writeUInt16LE(8, 10);
+        record.writeUInt16LE(dosTime, 12);
+        record.writeUInt16LE(dosDate, 14);
+        record.writeUInt32LE(entry.crc, 16);
+        record.writeUInt32LE(entry.compressedSize >>> 0, 20);
+        record.writeUInt32LE(entry.size >>> 0, 24);
+        record.writeUInt16LE(entry.nameBuffer.length, 28);
+        record.writeUInt32LE(entry.offset >>> 0, 42);
+        return Buffer.concat([record, entry.nameBuffer]);
+      });
+      const centralDirectory = Buffer.concat(records);
+      const end = Buffer.alloc(22);
+      end.writeUInt32LE(0x06054b50, 0);
+      end.writeUInt16LE(entries.length, 8);
+      end.writeUInt16LE(entries.length, 10);
+      end.writeUInt32LE(centralDirectory.length, 12);
+      end.writeUInt32LE(centralOffset >>> 0, 16);
+      return Buffer.concat([centralDirectory, end]);
+    }
+  };
+}
+
+const XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n';
+const SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main';
+const RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships';
+
+function xmlEscape(value) {
+  return String(value)
+    .replace(/[\u0000-\u0008\u000B\u000C\u000E-\u001F]/g, '')
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;');
+}
+
+function xlsxCell(value) {
+  if (typeof value === 'number' && Number.isFinite(value)) {
+    return `<c><v>${value}</v></c>`;
+  }
+  if (value === null || value === undefined || value === '') {
+    return '<c/>';
+  }
+  return `<c t="inlineStr"><is><t xml:space="preserve">${xmlEscape(value)}</t></is></c>`;
+}
+
+function xlsxRow(values) {
+  return `<row>${values.map(xlsxCell).join('')}</row>`;
+}
+
+function xlsxSheetName(name, index) {
+  const cleaned = String(name || '').replace(/[\[\]:*?\/\\]/g, ' ').trim().slice(0, 31);
+  return cleaned || `Hoja ${index + 1}`;
+}
+
+// Write an XLSX workbook as a sequence of byte chunks. Each sheet is
+// { name, header, rows } where rows is an (async) iterable of value arrays.
+// Cells use inline strings, so no shared string table has to be held in memory.
+async function* xlsxWorkbookChunks(sheets) {
+  const zip = createZipWriter();
+  
+  for (let i = 0; i < sheets.length; i++) {
+    const { header, rows } = sheets[i];
+    yield zip.startEntry(`xl/worksheets/sheet${i + 1}.xml`);
+    
+    let batch = `${XML_HEADER}<worksheet xmlns="${SPREADSHEET_NS}"><sheetData>${xlsxRow(header)}`;
+    let batchRows = 0;
+    for await (const values of rows) {
+      batch += xlsxRow(values);
+      if (++batchRows >= EXPORT_BATCH_SIZE) {
+        yield zip.writeEntry(batch);
+        batch = '';
+        batchRows = 0;
+      }
+    }
+    batch += '</sheetData></worksheet>';
+    yield zip.writeEntry(batch);
+    yield zip.endEntry();
+  }
+  
+  const names = sheets.map((sheet, i) => xlsxSheetName(sheet.name, i));
+  const parts = {
+    '[Content_Types].xml': `${XML_HEADER}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">` +
+      '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>' +
+      '<Default Extension="xml" ContentType="application/xml"/>' +
+      '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>' +
+      '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>' +
+      names.map((_, i) => `<Override PartName="/xl/worksheets/sheet${i + 1}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>`).join('') +
+      '</Types>',
+    '_rels/.rels': `${XML_HEADER}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">` +
+      `<Relationship Id="rId1" Type="${RELATIONSHIP_NS}/officeDocument" Target="xl/workbook.xml"/>` +
+      '</Relationships>',
+    'xl/workbook.xml': `${XML_HEADER}<workbook xmlns="${SPREADSHEET_NS}" xmlns:r="${RELATIONSHIP_NS}"><sheets>` +
+      names.map((name, i) => `<sheet name="${xmlEscape(name)}" sheetId="${i + 1}" r:id="rId${i + 1}"/>`).join('') +
+      '</sheets></workbook>',
+    'xl/_rels/workbook.xml.rels': `${XML_HEADER}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">` +
+      names.map((_, i) => `<Relationship Id="rId${i + 1}" Type="${RELATIONSHIP_NS}/worksheet" Target="worksheets/sheet${i + 1}.xml"/>`).join('') +
+      `<Relationship Id="rId${names.length + 1}" Type="${RELATIONSHIP_NS}/styles" Target="styles.xml"/>` +
+      '</Relationships>',
+    'xl/styles.xml': `${XML_HEADER}<styleSheet xmlns="${SPREADSHEET_NS}">` +
+      '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>' +
+      '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>' +
+      '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>' +
+      '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>' +
+      '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>' +
+      '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>' +
+      '</styleSheet>'
+  };
+  
+  for (const [name, content] of Object.entries(parts)) {
+    yield zip.startEntry(name);
+    yield zip.writeEntry(content);
+    yield zip.endEntry();
+  }
+  
+  yield zip.finish();
+}
+
 // Reopen closure (total or partial)
 async function reopenClosure(closureId, reopenType = 'total', partialFilters = null, userId = 'system') {
   try {
@@ -330,6 +1997,12 @@ async function reopenClosure(closureId, reopenType = 'total', partialFilters = n
       );
     }
     
+    // Archived months in the reopened range become writable again
+    const reopenedStart = reopenType === 'partial' ? partialFilters.start_date || closure.date_start : closure.date_start;
+    const reopenedEnd = reopenType === 'partial' ? partialFilters.end_date || closure.date_end : closure.date_end;
+    await rehydrateRange(reopenedStart, reopenedEnd, userId);
+    
+    await invalidateClosureIndex();
     await logAudit('REOPEN', 'export_closure', closureId, { type: reopenType, filters: partialFilters }, userId);
     
     return { success: true, status: newStatus };
@@ -340,186 +2013,1644 @@ async function reopenClosure(closureId, reopenType = 'total', partialFilters = n
   }
 }
 
-// Enhanced closure check with partial reopen support
-async function checkExportClosureEnhanced(projectId, costCenterId, engineerId, date) {
+// In-process interval index of the closures that can block time entry writes
+// (ACTIVO and PARCIALMENTE_REABIERTO) with their scope rows and exceptions.
+// Every closure change bumps a shared revision in closure_index_state; each
+// lookup reads it (a point read by _id) and rebuilds the index when it moved,
+// so closures created or reopened by other processes are seen immediately.
+const CLOSURE_INDEX_STATE_ID = 'export_closures';
+let closureIndex = null;
+let closureIndexLoading = null;
+
+async function closureIndexRevision() {
+  const state = await db.collection('closure_index_state').findOne({ _id: CLOSURE_INDEX_STATE_ID });
+  return state?.revision || 0;
+}
+
+async function invalidateClosureIndex() {
+  closureIndex = null;
+  closureIndexLoading = null;
+  await db.collection('closure_index_state').updateOne(
+    { _id: CLOSURE_INDEX_STATE_ID },
+    { $inc: { revision: 1 } },
+    { upsert: true }
+  );
+}
+
+// The revision is read before the closures, so a change made while loading
+// leaves the index one revision behind and the next lookup reloads it
+async function loadClosureIndex(revision) {
+  const closures = await db.collection('export_closures')
+    .find({ status: { $in: ['ACTIVO', 'PARCIALMENTE_REABIERTO'] } })
+    .sort({ date_start: 1 })
+    .toArray();
+  
+  const closureIds = closures.map(closure => closure.id);
+  const [scoped, exceptions] = await Promise.all([
+    withClosureScopes(closures),
+    db.collection('export_closure_exceptions').find({ closure_id: { $in: closureIds } }).toArray()
+  ]);
+  
+  // Scope dimensions become Sets so a check is constant time per dimension
+  const entriesById = new Map(scoped.map(closure => [closure.id, {
+    closure,
+    scope: Object.fromEntries(Object.entries(CLOSURE_SCOPE_DIMENSIONS).map(([dimension, field]) => (
+      [field, closure.scope[dimension] ? new Set(closure.scope[dimension]) : null]
+    ))),
+    exceptions: []
+  }]));
+  exceptions.forEach(exception => entriesById.get(exception.closure_id).exceptions.push(exception));
+  const entries = [...entriesById.values()];
+  
+  // Running maximum of date_end lets a lookup stop scanning as soon as no
+  // earlier closure can still cover the date
+  const maxEnd = [];
+  let max = '';
+  for (const entry of entries) {
+    if (entry.closure.date_end > max) max = entry.closure.date_end;
+    maxEnd.push(max);
+  }
+  
+  return { entries, maxEnd, revision };
+}
+
+async function getClosureIndex() {
+  const revision = await closureIndexRevision();
+  if (closureIndex && closureIndex.revision === revision) {
+    return closureIndex;
+  }
+  if (closureIndexLoading?.revision === revision) {
+    return closureIndexLoading;
+  }
+  
+  // Only the latest load publishes its index; a local invalidation while it
+  // runs clears closureIndexLoading, so its result is discarded
+  const loading = loadClosureIndex(revision).then(index => {
+    if (closureIndexLoading === loading) {
+      closureIndex = index;
+      closureIndexLoading = null;
+    }
+    return index;
+  }, error => {
+    if (closureIndexLoading === loading) closureIndexLoading = null;
+    throw error;
+  });
+  loading.revision = revision;
+  closureIndexLoading = loading;
+  return loading;
+}
+
+// All indexed closures whose date range contains the date
+function closuresCoveringDate(index, date) {
+  const { entries, maxEnd } = index;
+  
+  // First closure starting after the date
+  let lo = 0;
+  let hi = entries.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (entries[mid].closure.date_start <= date) lo = mid + 1;
+    else hi = mid;
+  }
+  
+  const covering = [];
+  for (let i = lo - 1; i >= 0 && maxEnd[i] >= date; i--) {
+    if (entries[i].closure.date_end >= date) covering.push(entries[i]);
+  }
+  return covering.reverse();
+}
+
+function evaluateClosure(entry, projectId, costCenterId, engineerId, date) {
+  const { closure } = entry;
+  
+  // If partially reopened, check exceptions first
+  if (closure.status === 'PARCIALMENTE_REABIERTO') {
+    const isInException = entry.exceptions.some(exception => (
+      exception.date_start <= date &&
+      exception.date_end >= date &&
+      (!exception.projects_override || exception.projects_override.includes(projectId)) &&
+      (!exception.cost_centers_override || exception.cost_centers_override.includes(costCenterId)) &&
+      (!exception.engineers_override || exception.engineers_override.includes(engineerId))
+    ));
+    
+    if (isInException) {
+      return { isBlocked: false, closure: closure, inException: true };
+    }
+  }
+  
+  // Null scope values mean "all"
+  const { scope } = entry;
+  const isInScope = (
+    (!scope.project_id || scope.project_id.has(projectId)) &&
+    (!scope.cost_center_id || scope.cost_center_id.has(costCenterId)) &&
+    (!scope.engineer_id || scope.engineer_id.has(engineerId))
+  );
+  
+  if (isInScope) {
+    return { 
+      isBlocked: true, 
+      closure: closure,
+      message: `Operación bloqueada por cierre ${closure.status.toLowerCase()} del ${closure.date_start} al ${closure.date_end}` 
+    };
+  }
+  
+  return null;
+}
+
+// Enhanced closure check with partial reopen support. Every closure covering
+// the date is evaluated: any closure in scope blocks the write, otherwise the
+// first exception that allows it marks the entry as a post-export adjustment.
+// If the closures cannot be read the write is blocked with a 503, never let
+// through into a period that may be closed.
+async function checkExportClosureEnhanced(projectId, costCenterId, engineerId, date) {
+  try {
+    const index = await getClosureIndex();
+    let exceptionResult = null;
+    
+    for (const entry of closuresCoveringDate(index, date)) {
+      const result = evaluateClosure(entry, projectId, costCenterId, engineerId, date);
+      if (result?.isBlocked) {
+        return result;
+      }
+      if (result?.inException && !exceptionResult) {
+        exceptionResult = result;
+      }
+    }
+    
+    return exceptionResult || { isBlocked: false, closure: null };
+  } catch (error) {
+    console.error('Error checking enhanced export closure:', error);
+    return {
+      isBlocked: true,
+      status: 503,
+      closure: null,
+      message: 'No se pudo verificar el cierre de exportación, intente nuevamente'
+    };
+  }
+}
+
+// Per engineer and day hour ledger. The daily limit check and the reservation
+// are one conditional $inc, so concurrent writes for the same engineer and
+// day cannot both pass. Handlers give the hours back if their write fails;
+// POST /api/maintenance/reconcile-hour-ledger rebuilds it from time_entries.
+const MAX_HOURS_PER_DAY = parseFloat(process.env.MAX_HOURS_PER_DAY || '8');
+const HOURS_TOLERANCE = 1e-9;
+
+function dailyLimitResult(totalHours) {
+  const rounded = Math.round(totalHours * 100) / 100;
+  const isValid = totalHours <= MAX_HOURS_PER_DAY + HOURS_TOLERANCE;
+  return {
+    isValid,
+    totalHours: rounded,
+    maxHours: MAX_HOURS_PER_DAY,
+    message: isValid ? null : `Total de horas (${rounded}) excede el límite diario de ${MAX_HOURS_PER_DAY}h`
+  };
+}
+
+// Zero, negative or non-numeric hours are rejected: a negative $inc would
+// lower the day's total and let later entries exceed MAX_HOURS_PER_DAY
+function validEntryHours(hours) {
+  return Number.isFinite(hours) && hours > 0;
+}
+
+async function reserveDailyHours(engineerId, date, hours) {
+  if (!validEntryHours(hours)) {
+    return { isValid: false, message: 'Horas inválidas' };
+  }
+  
+  // The unique (engineer_id, date) index and a backfilled ledger are required
+  await Promise.all([ensureIndexes(), ensureReadModels()]);
+  
+  const ledger = db.collection('daily_hour_ledger');
+  const filter = { engineer_id: engineerId, date: date, hours: { $lte: MAX_HOURS_PER_DAY - hours + HOURS_TOLERANCE } };
+  const update = { $inc: { hours: hours }, $set: { updated_at: new Date().toISOString() } };
+  
+  let reserved;
+  try {
+    reserved = await ledger.findOneAndUpdate(filter, update, {
+      upsert: hours <= MAX_HOURS_PER_DAY + HOURS_TOLERANCE,
+      returnDocument: 'after'
+    });
+  } catch (error) {
+    // Duplicate key: the day already has a ledger document without room for
+    // these hours, or a concurrent request created it first
+    if (error.code !== 11000) throw error;
+    reserved = await ledger.findOneAndUpdate(filter, update, { returnDocument: 'after' });
+  }
+  
+  if (reserved) {
+    return dailyLimitResult(reserved.hours);
+  }
+  const current = await ledger.findOne({ engineer_id: engineerId, date: date });
+  return dailyLimitResult((current?.hours || 0) + hours);
+}
+
+async function releaseDailyHours(engineerId, date, hours) {
+  if (!hours) return;
+  try {
+    await db.collection('daily_hour_ledger').updateOne(
+      { engineer_id: engineerId, date: date },
+      { $inc: { hours: -hours }, $set: { updated_at: new Date().toISOString() } }
+    );
+  } catch (error) {
+    console.error('Hour ledger release error:', error);
+  }
+}
+
+// Reserve the hours an update adds. The returned commit() releases the hours
+// the update frees once the write succeeded; rollback() undoes the reservation.
+async function reserveHoursChange(before, after) {
+  if (!validEntryHours(after.hours)) {
+    return { isValid: false, message: 'Horas inválidas', commit: async () => {}, rollback: () => undefined };
+  }
+  
+  const samePair = before.engineer_id === after.engineer_id && before.date === after.date;
+  const previousHours = parseFloat(before.hours) || 0;
+  const reserve = samePair ? Math.max(after.hours - previousHours, 0) : after.hours;
+  const release = samePair ? Math.max(previousHours - after.hours, 0) : previousHours;
+  
+  const validation = reserve !== 0
+    ? await reserveDailyHours(after.engineer_id, after.date, reserve)
+    : { isValid: true };
+  
+  return {
+    ...validation,
+    commit: () => releaseDailyHours(before.engineer_id, before.date, release),
+    rollback: () => validation.isValid ? releaseDailyHours(after.engineer_id, after.date, reserve) : undefined
+  };
+}
+
+async function reconcileDailyHourLedger() {
+  await db.collection('time_entries').aggregate([
+    ...unionArchiveStages(await archiveCollections()),
+    {
+      $group: {
+        _id: { engineer_id: '$engineer_id', date: '$date' },
+        hours: { $sum: { $toDouble: '$hours' } }
+      }
+    },
+    {
+      $project: {
+        _id: 0,
+        engineer_id: '$_id.engineer_id',
+        date: '$_id.date',
+        hours: 1,
+        updated_at: new Date().toISOString()
+      }
+    },
+    { $out: 'daily_hour_ledger' }
+  ], { allowDiskUse: true }).toArray();
+  
+  return { days: await db.collection('daily_hour_ledger').countDocuments({}) };
+}
+
+// Maintained rollup of hours per date, project, cost center, engineer and
+// concept. Time entry handlers apply their changes as $inc deltas; the
+// dashboard and report endpoints read only this collection.
+function dailyHoursKey(entry) {
+  return {
+    date: entry.date,
+    project_id: entry.project_id,
+    cost_center_id: entry.cost_center_id,
+    engineer_id: entry.engineer_id,
+    concept_id: entry.concept_id
+  };
+}
+
+async function updateDailyHoursRollup({ inserted = [], updated = [], deleted = [] }) {
+  const deltas = new Map();
+  const addDelta = (entry, sign) => {
+    const key = dailyHoursKey(entry);
+    const mapKey = JSON.stringify(key);
+    const delta = deltas.get(mapKey) || { key, hours: 0, entries: 0 };
+    delta.hours += sign * parseFloat(entry.hours);
+    delta.entries += sign;
+    deltas.set(mapKey, delta);
+  };
+  
+  inserted.forEach(entry => addDelta(entry, 1));
+  updated.forEach(({ before, after }) => {
+    addDelta(before, -1);
+    addDelta(after, 1);
+  });
+  deleted.forEach(entry => addDelta(entry, -1));
+  
+  const updatedAt = new Date().toISOString();
+  const operations = [...deltas.values()]
+    .filter(delta => delta.hours !== 0 || delta.entries !== 0)
+    .map(({ key, hours, entries }) => ({
+      updateOne: {
+        filter: key,
+        update: { $inc: { hours, entries }, $set: { updated_at: updatedAt } },
+        upsert: true
+      }
+    }));
+  
+  if (operations.length === 0) return;
+  
+  try {
+    await db.collection('daily_hours').bulkWrite(operations, { ordered: false });
+  } catch (error) {
+    // The rollup can always be rebuilt from time_entries
+    console.error('Daily hours rollup error:', error);
+  }
+}
+
+// Rebuild the rollup from scratch (backfill or repair)
+async function rebuildDailyHoursRollup() {
+  await db.collection('time_entries').aggregate([
+    ...unionArchiveStages(await archiveCollections()),
+    {
+      $group: {
+        _id: {
+          date: '$date',
+          project_id: '$project_id',
+          cost_center_id: '$cost_center_id',
+          engineer_id: '$engineer_id',
+          concept_id: '$concept_id'
+        },
+        hours: { $sum: { $toDouble: '$hours' } },
+        entries: { $sum: 1 }
+      }
+    },
+    {
+      $project: {
+        _id: 0,
+        date: '$_id.date',
+        project_id: '$_id.project_id',
+        cost_center_id: '$_id.cost_center_id',
+        engineer_id: '$_id.engineer_id',
+        concept_id: '$_id.concept_id',
+        hours: 1,
+        entries: 1,
+        updated_at: new Date().toISOString()
+      }
+    },
+    { $out: 'daily_hours' }
+  ], { allowDiskUse: true }).toArray();
+  
+  return { rows: await db.collection('daily_hours').countDocuments({}) };
+}
+
+// Denormalized read model: one document per time entry carrying the catalog
+// display fields used by exports and reports. Written with every time entry
+// change and refreshed in bulk when a catalog record changes.
+const VIEW_CATALOGS = {
+  project: { collection: 'projects', field: 'project_id', fields: { project_code: 'code', project_name: 'name' } },
+  cost_center: { collection: 'cost_centers', field: 'cost_center_id', fields: { cost_center_code: 'code', cost_center_name: 'name' } },
+  engineer: { collection: 'engineers', field: 'engineer_id', fields: { engineer_title: 'title', engineer_document: 'document_number' } },
+  concept: { collection: 'concepts', field: 'concept_id', fields: { concept_code: 'code', concept_name: 'name' } }
+};
+
+async function buildTimeEntryViews(entries) {
+  const catalogs = await Promise.all(Object.values(VIEW_CATALOGS).map(async ({ collection, field, fields }) => {
+    const ids = [...new Set(entries.map(entry => entry[field]).filter(Boolean))];
+    const projection = Object.fromEntries([['_id', 0], ['id', 1], ...Object.values(fields).map(source => [source, 1])]);
+    const records = await db.collection(collection).find({ id: { $in: ids } }, { projection }).toArray();
+    return { field, fields, records: new Map(records.map(record => [record.id, record])) };
+  }));
+  
+  return entries.map(({ _id, ...entry }) => {
+    const view = { ...entry };
+    for (const { field, fields, records } of catalogs) {
+      const record = records.get(entry[field]);
+      for (const [viewField, source] of Object.entries(fields)) {
+        view[viewField] = record?.[source] ?? null;
+      }
+    }
+    return view;
+  });
+}
+
+// View writes are retried; entries whose views still could not be written are
+// queued in time_entry_view_repairs and rewritten by a background job every
+// VIEW_REPAIR_INTERVAL_MS, outside any request
+const VIEW_WRITE_ATTEMPTS = parseInt(process.env.VIEW_WRITE_ATTEMPTS || '3', 10);
+const VIEW_REPAIR_INTERVAL_MS = parseInt(process.env.VIEW_REPAIR_INTERVAL_MS || '30000', 10);
+let viewRepairTimer = null;
+
+// Write the views of the given entries from their current time_entries state,
+// so racing writers converge on the latest version. A view is only replaced by
+// one at least as recent (updated_at); a duplicate key on the upsert means a
+// newer view is already stored.
+async function writeTimeEntryViews(entryIds) {
+  const entries = await db.collection('time_entries').find({ id: { $in: entryIds } }).toArray();
+  const operations = (await buildTimeEntryViews(entries)).map(view => ({
+    replaceOne: {
+      filter: { id: view.id, $or: [{ updated_at: { $lte: view.updated_at } }, { updated_at: { $exists: false } }] },
+      replacement: view,
+      upsert: true
+    }
+  }));
+  const live = new Set(entries.map(entry => entry.id));
+  entryIds.filter(id => !live.has(id)).forEach(id => operations.push({ deleteOne: { filter: { id } } }));
+  if (operations.length === 0) return;
+  
+  try {
+    await db.collection('time_entry_views').bulkWrite(operations, { ordered: false });
+  } catch (error) {
+    const writeErrors = [].concat(error.writeErrors || []);
+    if (writeErrors.length === 0 || writeErrors.some(writeError => writeError.code !== 11000)) throw error;
+  }
+}
+
+async function updateTimeEntryViews({ inserted = [], updated = [], deleted = [] }) {
+  const entryIds = [...new Set([...inserted, ...updated.map(({ after }) => after), ...deleted].map(entry => entry.id))];
+  if (entryIds.length === 0) return;
+  
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await writeTimeEntryViews(entryIds);
+    } catch (error) {
+      if (attempt < VIEW_WRITE_ATTEMPTS) {
+        await new Promise(resolve => setTimeout(resolve, 50 * 2 ** attempt));
+        continue;
+      }
+      console.error('Time entry view error, queued for repair:', error);
+      await db.collection('time_entry_view_repairs').insertOne({
+        id: uuidv4(),
+        entry_ids: entryIds,
+        error: error.message,
+        created_at: new Date().toISOString()
+      });
+      return;
+    }
+  }
+}
+
+// Apply the queued view repairs
+async function repairTimeEntryViews() {
+  const repairs = await db.collection('time_entry_view_repairs').find({}).toArray();
+  for (const repair of repairs) {
+    await writeTimeEntryViews(repair.entry_ids);
+    await db.collection('time_entry_view_repairs').deleteOne({ id: repair.id });
+  }
+  return { repaired: repairs.length };
+}
+
+function startViewRepairs() {
+  if (viewRepairTimer) return;
+  viewRepairTimer = setInterval(() => {
+    repairTimeEntryViews().catch(error => console.error('Time entry view repair error:', error));
+  }, VIEW_REPAIR_INTERVAL_MS);
+  viewRepairTimer.unref?.();
+}
+
+// Consistency check of a range (POST /api/maintenance/check-time-entry-views):
+// the views must match time_entries in count, hours and latest update. On a
+// mismatch the views of that range are rebuilt from time_entries. It scans
+// both collections, so it never runs on the export path.
+async function viewsSummary(collection, query) {
+  const [summary] = await db.collection(collection).aggregate([
+    { $match: query },
+    { $group: { _id: null, count: { $sum: 1 }, hours: { $sum: { $toDouble: '$hours' } }, updated_at: { $max: '$updated_at' } } }
+  ]).toArray();
+  return summary ? { count: summary.count, hours: Math.round(summary.hours * 100) / 100, updated_at: summary.updated_at ?? null } : { count: 0, hours: 0, updated_at: null };
+}
+
+async function ensureTimeEntryViewsConsistent(query) {
+  await repairTimeEntryViews();
+  
+  const [entries, views] = await Promise.all([viewsSummary('time_entries', query), viewsSummary('time_entry_views', query)]);
+  if (entries.count === views.count && entries.hours === views.hours && entries.updated_at === views.updated_at) {
+    return { rebuilt: false };
+  }
+  
+  console.warn('Time entry views out of step, rebuilding range:', JSON.stringify({ query, entries, views }));
+  await db.collection('time_entries').aggregate([
+    { $match: query },
+    ...timeEntryViewStages(),
+    { $merge: { into: 'time_entry_views', on: 'id', whenMatched: 'replace', whenNotMatched: 'insert' } }
+  ], { allowDiskUse: true }).toArray();
+  
+  const orphans = await db.collection('time_entry_views').aggregate([
+    { $match: query },
+    { $lookup: { from: 'time_entries', localField: 'id', foreignField: 'id', as: 'entry' } },
+    { $match: { entry: { $size: 0 } } },
+    { $project: { _id: 0, id: 1 } }
+  ]).toArray();
+  if (orphans.length > 0) {
+    await db.collection('time_entry_views').deleteMany({ id: { $in: orphans.map(orphan => orphan.id) } });
+  }
+  return { rebuilt: true, removed: orphans.length };
+}
+
+// Copy a catalog record's display fields into every view that references it
+async function refreshTimeEntryViews(entity, record) {
+  const { field, fields } = VIEW_CATALOGS[entity];
+  const $set = Object.fromEntries(Object.entries(fields).map(([viewField, source]) => [viewField, record[source] ?? null]));
+  try {
+    await db.collection('time_entry_views').updateMany({ [field]: record.id }, { $set });
+  } catch (error) {
+    console.error('Time entry view refresh error:', error);
+  }
+}
+
+// Stages turning time_entries documents into view documents
+function timeEntryViewStages() {
+  const lookups = [];
+  const display = {};
+  for (const [entity, { collection, field, fields }] of Object.entries(VIEW_CATALOGS)) {
+    lookups.push(
+      { $lookup: { from: collection, localField: field, foreignField: 'id', as: entity } },
+      { $unwind: { path: `$${entity}`, preserveNullAndEmptyArrays: true } }
+    );
+    for (const [viewField, source] of Object.entries(fields)) {
+      display[viewField] = { $ifNull: [`$${entity}.${source}`, null] };
+    }
+  }
+  
+  return [
+    ...lookups,
+    { $addFields: display },
+    { $project: { _id: 0, ...Object.fromEntries(Object.keys(VIEW_CATALOGS).map(entity => [entity, 0])) } }
+  ];
+}
+
+// Rebuild the read model from scratch (backfill or repair)
+async function rebuildTimeEntryViews() {
+  await db.collection('time_entries').aggregate([
+    ...timeEntryViewStages(),
+    { $out: 'time_entry_views' }
+  ], { allowDiskUse: true }).toArray();
+  
+  return { rows: await db.collection('time_entry_views').countDocuments({}) };
+}
+
+// Build read models that are empty while time_entries is not (first start
+// after an upgrade). Exports wait for this before reading.
+let readModelsReady = null;
+
+function ensureReadModels() {
+  if (!readModelsReady) {
+    readModelsReady = (async () => {
+      try {
+        if (await db.collection('time_entries').estimatedDocumentCount() === 0) return;
+        if (await db.collection('time_entry_views').estimatedDocumentCount() === 0) {
+          await rebuildTimeEntryViews();
+        }
+        if (await db.collection('daily_hours').estimatedDocumentCount() === 0) {
+          await rebuildDailyHoursRollup();
+        }
+        if (await db.collection('daily_hour_ledger').estimatedDocumentCount() === 0) {
+          await reconcileDailyHourLedger();
+        }
+        await repairTimeEntryViews();
+      } catch (error) {
+        console.error('Read model backfill error:', error);
+      }
+    })();
+  }
+  return readModelsReady;
+}
+
+// Side effects shared by every time entry write path
+async function syncTimeEntryProjections(changes) {
+  await Promise.all([
+    updateDailyHoursRollup(changes),
+    updateTimeEntryViews(changes)
+  ]);
+}
+
+// Called after a catalog record is written: drops cached catalog responses
+// and refreshes the display fields of the time entry views
+async function catalogChanged(entity, record) {
+  invalidateCatalogCache(CATALOG_AUDIT_ENTITIES[entity]);
+  await refreshTimeEntryViews(entity, record);
+}
+
+// Month archival. A month whose every day is covered by ACTIVO closures with
+// full scope can no longer be written, so its entries are moved (in view
+// shape, with the catalog display fields) to time_entries_archive_YYYY_MM and
+// registered in time_entry_archives. Readers that need an archived month add
+// it with $unionWith; reopening a closure moves its months back.
+const ARCHIVE_COLLECTION_PREFIX = 'time_entries_archive_';
+const VIEW_DISPLAY_FIELDS = Object.values(VIEW_CATALOGS).flatMap(({ fields }) => Object.keys(fields));
+
+function monthRange(month) {
+  const [year, monthNumber] = month.split('-').map(Number);
+  const lastDay = new Date(Date.UTC(year, monthNumber, 0)).getUTCDate();
+  return { start: `${month}-01`, end: `${month}-${String(lastDay).padStart(2, '0')}` };
+}
+
+function nextMonth(month) {
+  const [year, monthNumber] = month.split('-').map(Number);
+  return new Date(Date.UTC(year, monthNumber, 1)).toISOString().slice(0, 7);
+}
+
+function nextDay(date) {
+  const day = new Date(`${date}T00:00:00Z`);
+  day.setUTCDate(day.getUTCDate() + 1);
+  return day.toISOString().slice(0, 10);
+}
+
+// Archive collections of the archived months overlapping a date range (all of them when open-ended)
+async function archiveCollections(startDate = null, endDate = null) {
+  const month = {};
+  if (startDate) month.$gte = startDate.slice(0, 7);
+  if (endDate) month.$lte = endDate.slice(0, 7);
+  
+  const archives = await db.collection('time_entry_archives')
+    .find({ status: 'ARCHIVADO', ...(Object.keys(month).length > 0 && { month }) }, { projection: { collection: 1 } })
+    .sort({ month: 1 })
+    .toArray();
+  return archives.map(archive => archive.collection);
+}
+
+function unionArchiveStages(collections, pipeline = []) {
+  return collections.map(coll => ({ $unionWith: { coll, pipeline } }));
+}
+
+// Months entirely covered by ACTIVO closures with full scope
+async function closedMonths() {
+  const closures = await withClosureScopes(
+    await db.collection('export_closures').find({ status: 'ACTIVO' }).sort({ date_start: 1 }).toArray()
+  );
+  
+  // Merge the covered date ranges, joining ranges that touch
+  const ranges = [];
+  closures
+    .filter(closure => Object.values(closure.scope).every(ids => ids == null))
+    .forEach(({ date_start, date_end }) => {
+      const last = ranges[ranges.length - 1];
+      if (last && date_start <= nextDay(last.end)) {
+        if (date_end > last.end) last.end = date_end;
+      } else {
+        ranges.push({ start: date_start, end: date_end });
+      }
+    });
+  
+  const months = [];
+  for (const range of ranges) {
+    for (let month = range.start.slice(0, 7); month <= range.end.slice(0, 7); month = nextMonth(month)) {
+      const { start, end } = monthRange(month);
+      if (start >= range.start && end <= range.end) months.push(month);
+    }
+  }
+  return months;
+}
+
+async function archiveMonth(month, userId = 'system') {
+  const { start, end } = monthRange(month);
+  const collection = `${ARCHIVE_COLLECTION_PREFIX}${month.replace('-', '_')}`;
+  const dateFilter = { date: { $gte: start, $lte: end } };
+  
+  await db.collection(collection).createIndexes([
+    { key: { id: 1 }, unique: true },
+    { key: { date: 1, project_name: 1 } }
+  ]);
+  await db.collection('time_entries').aggregate([
+    { $match: dateFilter },
+    ...timeEntryViewStages(),
+    { $merge: { into: collection, on: 'id', whenMatched: 'replace', whenNotMatched: 'insert' } }
+  ], { allowDiskUse: true }).toArray();
+  
+  // Only remove the live rows once every one of them is in the archive
+  const [live, [totals]] = await Promise.all([
+    db.collection('time_entries').countDocuments(dateFilter),
+    db.collection(collection).aggregate([
+      { $group: { _id: null, entries: { $sum: 1 }, hours: { $sum: { $toDouble: '$hours' } } } }
+    ]).toArray()
+  ]);
+  if ((totals?.entries || 0) < live) {
+    throw new Error(`Archivo incompleto para ${month}`);
+  }
+  
+  const archive = await db.collection('time_entry_archives').findOneAndUpdate(
+    { month: month },
+    {
+      $set: {
+        collection: collection,
+        status: 'ARCHIVADO',
+        entry_count: totals?.entries || 0,
+        hours: totals?.hours || 0,
+        archived_at: new Date().toISOString(),
+        archived_by: userId
+      },
+      $setOnInsert: { id: uuidv4(), month: month }
+    },
+    { upsert: true, returnDocument: 'after', projection: { _id: 0 } }
+  );
+  await Promise.all([
+    db.collection('time_entries').deleteMany(dateFilter),
+    db.collection('time_entry_views').deleteMany(dateFilter)
+  ]);
+  
+  await logAudit('ARCHIVE', 'time_entry_archive', archive.id, archive, userId);
+  return archive;
+}
+
+// Archive the requested months, or every closed month that still has live entries
+async function archiveClosedMonths(months = null, userId = 'system') {
+  const closed = await closedMonths();
+  const results = [];
+  
+  for (const month of months || closed) {
+    if (!closed.includes(month)) {
+      results.push({ month, archived: false, message: 'El mes no está cubierto por cierres activos completos' });
+      continue;
+    }
+    const { start, end } = monthRange(month);
+    if (!months && await db.collection('time_entries').countDocuments({ date: { $gte: start, $lte: end } }, { limit: 1 }) === 0) {
+      continue;
+    }
+    results.push({ month, archived: true, archive: await archiveMonth(month, userId) });
+  }
+  return results;
+}
+
+// Move an archived month back into time_entries and the views
+async function rehydrateMonth(month, userId = 'system') {
+  const archive = await db.collection('time_entry_archives').findOne({ month: month, status: 'ARCHIVADO' });
+  if (!archive) return null;
+  
+  const hidden = Object.fromEntries(VIEW_DISPLAY_FIELDS.map(field => [field, 0]));
+  await db.collection(archive.collection).aggregate([
+    { $project: { _id: 0, ...hidden } },
+    { $merge: { into: 'time_entries', on: 'id', whenMatched: 'keepExisting', whenNotMatched: 'insert' } }
+  ], { allowDiskUse: true }).toArray();
+  await db.collection(archive.collection).aggregate([
+    { $project: { _id: 0 } },
+    { $merge: { into: 'time_entry_views', on: 'id', whenMatched: 'keepExisting', whenNotMatched: 'insert' } }
+  ], { allowDiskUse: true }).toArray();
+  
+  await db.collection('time_entry_archives').deleteOne({ id: archive.id });
+  await db.collection(archive.collection).drop().catch(error => console.error('Archive drop error:', error));
+  
+  await logAudit('REHYDRATE', 'time_entry_archive', archive.id, { month, entry_count: archive.entry_count }, userId);
+  return { month, entry_count: archive.entry_count };
+}
+
+async function rehydrateRange(startDate, endDate, userId = 'system') {
+  const archives = await db.collection('time_entry_archives')
+    .find({ status: 'ARCHIVADO', month: { $gte: startDate.slice(0, 7), $lte: endDate.slice(0, 7) } })
+    .toArray();
+  const results = [];
+  for (const archive of archives) {
+    results.push(await rehydrateMonth(archive.month, userId));
+  }
+  return results;
+}
+
+// Hours reports grouped by one dimension of the rollup
+const HOURS_REPORTS = {
+  'hours-by-project': { field: 'project_id', from: 'projects', nameField: 'project_name', source: '$catalog.name' },
+  'hours-by-engineer': { field: 'engineer_id', from: 'engineers', nameField: 'engineer_name', source: '$catalog.title' },
+  'hours-by-cost-center': { field: 'cost_center_id', from: 'cost_centers', nameField: 'cost_center_name', source: '$catalog.name' }
+};
+
+async function hoursReport({ field, from, nameField, source }, matchQuery) {
+  return db.collection('daily_hours').aggregate([
+    { $match: matchQuery },
+    {
+      $group: {
+        _id: `$${field}`,
+        total_hours: { $sum: '$hours' },
+        entries: { $sum: '$entries' }
+      }
+    },
+    { $match: { entries: { $gt: 0 } } },
+    // Only the grouped rows are joined, never the individual entries
+    {
+      $lookup: {
+        from: from,
+        localField: '_id',
+        foreignField: 'id',
+        as: 'catalog'
+      }
+    },
+    { $unwind: '$catalog' },
+    { $project: { [nameField]: source, total_hours: 1 } },
+    { $sort: { total_hours: -1 } }
+  ]).toArray();
+}
+
+function buildTimeEntry(body, date, closureCheck) {
+  return {
+    id: uuidv4(),
+    date: date,
+    project_id: body.project_id,
+    cost_center_id: body.cost_center_id,
+    engineer_id: body.engineer_id,
+    concept_id: body.concept_id,
+    hours: parseFloat(body.hours),
+    notes: body.notes || '',
+    created_by: body.created_by || 'system',
+    created_at: new Date().toISOString(),
+    updated_at: new Date().toISOString(),
+    closure_id: closureCheck.inException ? closureCheck.closure.id : null,
+    post_export_adjustment: closureCheck.inException ? true : false
+  };
+}
+
+// Bulk time entry ingestion: the whole batch is validated together (one
+// closure check per distinct scope and date, hours reserved in the daily
+// ledger) and written with a single insertMany plus one audit insert
+const MAX_BULK_TIME_ENTRIES = parseInt(process.env.MAX_BULK_TIME_ENTRIES || '500', 10);
+
+async function createTimeEntriesBulk(rows, createdBy = 'system') {
+  const results = new Array(rows.length);
+  const reject = (index, status, message) => {
+    results[index] = { index, success: false, status, message };
+  };
+  
+  // Validate dates and resolve closure checks once per distinct scope
+  const closureChecks = new Map();
+  let candidates = [];
+  rows.forEach((rawRow, index) => {
+    const row = { created_by: createdBy, ...rawRow };
+    const dateValidation = validateDate(row.date);
+    if (!dateValidation.isValid) {
+      return reject(index, 400, 'Fecha inválida');
+    }
+    if (!validEntryHours(parseFloat(row.hours))) {
+      return reject(index, 400, 'Horas inválidas');
+    }
+    
+    const date = dateValidation.isoString;
+    const key = [row.project_id, row.cost_center_id, row.engineer_id, date].join('|');
+    if (!closureChecks.has(key)) {
+      closureChecks.set(key, checkExportClosureEnhanced(row.project_id, row.cost_center_id, row.engineer_id, date));
+    }
+    candidates.push({ index, row, date, key });
+  });
+  
+  for (const candidate of candidates) {
+    candidate.closureCheck = await closureChecks.get(candidate.key);
+    if (candidate.closureCheck.isBlocked) {
+      reject(candidate.index, candidate.closureCheck.status || 409, candidate.closureCheck.message);
+    }
+  }
+  candidates = candidates.filter(candidate => !candidate.closureCheck.isBlocked);
+  
+  // Reserve hours in the ledger: pairs in parallel, rows of the same
+  // engineer and day in batch order
+  const byPair = new Map();
+  for (const candidate of candidates) {
+    const pairKey = `${candidate.row.engineer_id}|${candidate.date}`;
+    if (!byPair.has(pairKey)) byPair.set(pairKey, []);
+    byPair.get(pairKey).push(candidate);
+  }
+  
+  const accepted = [];
+  await Promise.all([...byPair.values()].map(async pairCandidates => {
+    for (const candidate of pairCandidates) {
+      const hours = parseFloat(candidate.row.hours);
+      const hoursValidation = await reserveDailyHours(candidate.row.engineer_id, candidate.date, hours);
+      if (!hoursValidation.isValid) {
+        reject(candidate.index, 400, hoursValidation.message);
+        continue;
+      }
+      accepted.push({ index: candidate.index, timeEntry: buildTimeEntry(candidate.row, candidate.date, candidate.closureCheck) });
+    }
+  }));
+  accepted.sort((a, b) => a.index - b.index);
+  
+  // Single write for the accepted rows
+  const failedWrites = new Map();
+  if (accepted.length > 0) {
+    try {
+      await db.collection('time_entries').insertMany(accepted.map(({ timeEntry }) => timeEntry), { ordered: false });
+    } catch (error) {
+      if (!error.writeErrors) throw error;
+      [].concat(error.writeErrors).forEach(writeError => failedWrites.set(writeError.index, writeError.errmsg));
+    }
+  }
+  
+  const inserted = [];
+  const released = [];
+  accepted.forEach(({ index, timeEntry }, position) => {
+    if (failedWrites.has(position)) {
+      reject(index, 500, failedWrites.get(position));
+      released.push(releaseDailyHours(timeEntry.engineer_id, timeEntry.date, timeEntry.hours));
+    } else {
+      results[index] = { index, success: true, data: timeEntry };
+      inserted.push(timeEntry);
+    }
+  });
+  
+  await Promise.all(released);
+  await syncTimeEntryProjections({ inserted });
+  await logAuditBatch(
+    inserted.map(timeEntry => ({ action: 'CREATE', entity: 'time_entry', entityId: timeEntry.id, payload: timeEntry })),
+    createdBy
+  );
+  
+  return {
+    inserted: inserted.length,
+    rejected: rows.length - inserted.length,
+    results
+  };
+}
+
+// Live change feed pushed to the UI over Server-Sent Events (GET /api/events).
+// One feed per process is shared by every connected client: a change stream
+// when MongoDB supports it (replica set), otherwise a poller over audit_log
+// that refetches the changed records. Deletes are always taken from the
+// DELETE audit entries, since a delete change event carries only the _id.
+// When events may have been lost (the change stream restarted, the poller
+// fell behind, a client overflowed its buffer) clients get a 'reset' event
+// and reload everything instead of applying individual changes.
+const CHANGE_FEED_COLLECTIONS = {
+  time_entries: 'time_entry',
+  projects: 'project',
+  cost_centers: 'cost_center',
+  engineers: 'engineer',
+  concepts: 'concept',
+  app_users: 'app_user',
+  export_closures: 'export_closure'
+};
+const CHANGE_FEED_ENTITIES = Object.fromEntries(
+  Object.entries(CHANGE_FEED_COLLECTIONS).map(([collection, entity]) => [entity, collection])
+);
+const CHANGE_FEED_POLL_MS = parseInt(process.env.CHANGE_FEED_POLL_MS || '2000', 10);
+const CHANGE_FEED_HEARTBEAT_MS = parseInt(process.env.CHANGE_FEED_HEARTBEAT_MS || '25000', 10);
+const CHANGE_FEED_MAX_BUFFER = parseInt(process.env.CHANGE_FEED_MAX_BUFFER || '1000', 10);
+const CHANGE_FEED_POLL_LIMIT = parseInt(process.env.CHANGE_FEED_POLL_LIMIT || '1000', 10);
+const CHANGE_FEED_LOOKBACK_MS = parseInt(
+  process.env.CHANGE_FEED_LOOKBACK_MS || String(Math.max(2 * AUDIT_FLUSH_INTERVAL_MS, 10000)),
+  10
+);
+const changeFeedSubscribers = new Set();
+let changeFeed = null;
+let changeFeedEventId = 0;
+
+function publishChange(type, entity, doc) {
+  const { _id, clave, ...data } = doc;
+  const event = { id: ++changeFeedEventId, type, entity, entity_id: data.id, data: type === 'delete' ? null : data };
+  changeFeedSubscribers.forEach(subscriber => subscriber(event));
+}
+
+function publishReset(reason) {
+  const event = { id: ++changeFeedEventId, type: 'reset', reason };
+  changeFeedSubscribers.forEach(subscriber => subscriber(event));
+}
+
+function startChangeStream() {
+  const stream = db.watch([
+    {
+      $match: {
+        $or: [
+          { operationType: { $in: ['insert', 'update', 'replace'] }, 'ns.coll': { $in: Object.keys(CHANGE_FEED_COLLECTIONS) } },
+          { operationType: 'insert', 'ns.coll': 'audit_log', 'fullDocument.action': 'DELETE' }
+        ]
+      }
+    }
+  ], { fullDocument: 'updateLookup' });
+  const feed = { mode: 'change_stream', stop: () => stream.close().catch(() => {}) };
+  
+  stream.on('change', change => {
+    const doc = change.fullDocument;
+    if (!doc) return;
+    if (change.ns.coll === 'audit_log') {
+      if (CHANGE_FEED_ENTITIES[doc.entity]) publishChange('delete', doc.entity, { id: doc.entity_id });
+    } else {
+      publishChange('upsert', CHANGE_FEED_COLLECTIONS[change.ns.coll], doc);
+    }
+  });
+  
+  stream.on('error', error => {
+    if (changeFeed !== feed) return;
+    feed.stop();
+    // 40573: change streams need a replica set
+    if (error.code === 40573) {
+      changeFeed = startAuditPoller();
+    } else {
+      console.error('Change stream error:', error);
+      changeFeed = { mode: 'restarting', stop: () => clearTimeout(restart) };
+      const restart = setTimeout(() => {
+        if (changeFeedSubscribers.size === 0) return;
+        changeFeed = startChangeStream();
+        publishReset('restart');
+      }, CHANGE_FEED_POLL_MS);
+    }
+  });
+  
+  return feed;
+}
+
+// Polls audit_log in _id order. The _id is assigned when the buffered sink
+// inserts the entry, not when it was logged, so entries queued for up to
+// AUDIT_FLUSH_INTERVAL_MS still land after the last poll; the window is
+// re-read CHANGE_FEED_LOOKBACK_MS back to cover other processes' clocks and
+// slow flushes, and entries already published are skipped by audit id.
+function startAuditPoller() {
+  const seen = new Map();
+  let lastPoll = Date.now();
+  let stopped = false;
+  let timer = null;
+  
+  const poll = async () => {
+    const pollStarted = Date.now();
+    const windowStart = lastPoll - CHANGE_FEED_LOOKBACK_MS;
+    try {
+      const limit = CHANGE_FEED_POLL_LIMIT + seen.size;
+      const entries = await db.collection('audit_log')
+        .find({
+          _id: { $gte: ObjectId.createFromTime(Math.floor(windowStart / 1000)) },
+          entity: { $in: Object.keys(CHANGE_FEED_ENTITIES) }
+        })
+        .sort({ _id: 1 })
+        .limit(limit)
+        .toArray();
+      const fresh = entries.filter(entry => !seen.has(entry.id));
+      fresh.forEach(entry => seen.set(entry.id, entry._id.getTimestamp().getTime()));
+      
+      if (entries.length >= limit) {
+        // Too many changes to replay one by one; let clients reload
+        publishReset('overflow');
+      } else if (fresh.length > 0) {
+        // Refetch the current state of every changed record, one query per entity
+        const changedIds = new Map();
+        fresh.forEach(entry => {
+          if (!entry.entity_id || entry.action === 'DELETE') return;
+          if (!changedIds.has(entry.entity)) changedIds.set(entry.entity, new Set());
+          changedIds.get(entry.entity).add(entry.entity_id);
+        });
+        for (const [entity, ids] of changedIds) {
+          const docs = await db.collection(CHANGE_FEED_ENTITIES[entity]).find({ id: { $in: [...ids] } }).toArray();
+          docs.forEach(doc => publishChange('upsert', entity, doc));
+        }
+        fresh.filter(entry => entry.action === 'DELETE' && entry.entity_id)
+          .forEach(entry => publishChange('delete', entry.entity, { id: entry.entity_id }));
+      }
+      
+      lastPoll = pollStarted;
+      // ObjectId timestamps have one-second resolution
+      const expired = pollStarted - CHANGE_FEED_LOOKBACK_MS - 1000;
+      seen.forEach((insertedAt, id) => {
+        if (insertedAt < expired) seen.delete(id);
+      });
+    } catch (error) {
+      // lastPoll is left as is, so the next poll re-reads this window
+      console.error('Change feed poll error:', error);
+    } finally {
+      if (!stopped) timer = setTimeout(poll, CHANGE_FEED_POLL_MS);
+    }
+  };
+  
+  timer = setTimeout(poll, CHANGE_FEED_POLL_MS);
+  return { mode: 'polling', stop: () => { stopped = true; clearTimeout(timer); } };
+}
+
+function subscribeChanges(subscriber) {
+  changeFeedSubscribers.add(subscriber);
+  if (!changeFeed) {
+    changeFeed = startChangeStream();
+  }
+  
+  return () => {
+    changeFeedSubscribers.delete(subscriber);
+    if (changeFeedSubscribers.size === 0 && changeFeed) {
+      changeFeed.stop();
+      changeFeed = null;
+    }
+  };
+}
+
+// SSE response for one client. A client that falls too far behind is sent a
+// reset and disconnected; EventSource reconnects and the page reloads.
+function changeFeedResponse(request) {
+  const encoder = new TextEncoder();
+  let cleanup = () => {};
+  
+  const stream = new ReadableStream({
+    start(controller) {
+      let closed = false;
+      const close = () => {
+        if (closed) return;
+        closed = true;
+        cleanup();
+        try { controller.close(); } catch (error) { /* already closed */ }
+      };
+      const send = text => {
+        if (closed) return;
+        if (controller.desiredSize !== null && controller.desiredSize < -CHANGE_FEED_MAX_BUFFER) {
+          controller.enqueue(encoder.encode(`id: ${changeFeedEventId}\nevent: reset\ndata: ${JSON.stringify({ type: 'reset', reason: 'overflow' })}\n\n`));
+          return close();
+        }
+        controller.enqueue(encoder.encode(text));
+      };
+      
+      const unsubscribe = subscribeChanges(event => {
+        const name = event.type === 'reset' ? 'reset' : 'change';
+        send(`id: ${event.id}\nevent: ${name}\ndata: ${JSON.stringify(event)}\n\n`);
+      });
+      const heartbeat = setInterval(() => send(': ping\n\n'), CHANGE_FEED_HEARTBEAT_MS);
+      cleanup = () => {
+        clearInterval(heartbeat);
+        unsubscribe();
+      };
+      
+      send(`retry: ${CHANGE_FEED_POLL_MS}\n\n`);
+      request.signal?.addEventListener('abort', close);
+    },
+    cancel() {
+      cleanup();
+    }
+  });
+  
+  return new NextResponse(stream, {
+    status: 200,
+    headers: {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache, no-transform',
+      'Connection': 'keep-alive'
+    }
+  });
+}
+
+function changeFeedReport() {
+  return {
+    mode: changeFeed?.mode || 'idle',
+    subscribers: changeFeedSubscribers.size,
+    events_published: changeFeedEventId
+  };
+}
+
+// Idempotency-Key support for POST and PUT. The first request with a key runs
+// and its response is stored; a retry with the same key and body gets the
+// stored response back without running the handler (validation, inserts,
+// audit) again. JSON bodies are stored as-is, export files by reference to
+// their artifact (X-Export-File-Id), recorded once the file has been fully
+// sent. Errors, 5xx and 429 responses release the key so the client can retry.
+const IDEMPOTENCY_KEY_TTL_SECONDS = parseInt(process.env.IDEMPOTENCY_KEY_TTL_SECONDS || '86400', 10);
+const IDEMPOTENCY_LOCK_MS = parseInt(process.env.IDEMPOTENCY_LOCK_MS || '300000', 10);
+const IDEMPOTENCY_REPLAY_HEADERS = ['X-Closure-Id', 'X-Record-Count', 'X-Revision'];
+
+function idempotencyError(message, status, headers = {}) {
+  return corsResponse(NextResponse.json({ success: false, message }, { status, headers }));
+}
+
+// Returns { claimed: true } when this request owns the key, otherwise the stored record
+async function claimIdempotencyKey(key, requestHash, method, path) {
+  const now = new Date();
   try {
-    // Find active or partially reopened closures
-    const activeClosure = await db.collection('export_closures').findOne({
-      status: { $in: ['ACTIVO', 'PARCIALMENTE_REABIERTO'] },
-      date_start: { $lte: date },
-      date_end: { $gte: date }
+    await db.collection('idempotency_keys').insertOne({
+      key: key,
+      method: method,
+      path: path,
+      request_hash: requestHash,
+      status: 'EN_PROCESO',
+      locked_until: new Date(now.getTime() + IDEMPOTENCY_LOCK_MS),
+      created_at: now.toISOString(),
+      expires_at: new Date(now.getTime() + IDEMPOTENCY_KEY_TTL_SECONDS * 1000)
     });
+    return { claimed: true };
+  } catch (error) {
+    if (error.code !== 11000) throw error;
+  }
+  
+  // Take over a claim whose lock expired (the process died mid-request)
+  const record = await db.collection('idempotency_keys').findOne({ key });
+  if (record?.status === 'EN_PROCESO' && record.request_hash === requestHash && record.locked_until < now) {
+    const takeover = await db.collection('idempotency_keys').updateOne(
+      { key, status: 'EN_PROCESO', locked_until: record.locked_until },
+      { $set: { locked_until: new Date(now.getTime() + IDEMPOTENCY_LOCK_MS) } }
+    );
+    if (takeover.modifiedCount === 1) return { claimed: true };
+  }
+  return { claimed: false, record };
+}
 
-    if (!activeClosure) {
-      return { isBlocked: false, closure: null };
-    }
+async function releaseIdempotencyKey(key) {
+  await db.collection('idempotency_keys').deleteOne({ key, status: 'EN_PROCESO' });
+}
+
+async function storeIdempotentResponse(key, response) {
+  const stored = { status: response.status };
+  const fileId = response.headers.get('X-Export-File-Id');
+  if (fileId) {
+    stored.export_file_id = fileId;
+    stored.headers = Object.fromEntries(IDEMPOTENCY_REPLAY_HEADERS
+      .filter(header => response.headers.has(header))
+      .map(header => [header, response.headers.get(header)]));
+  } else {
+    stored.body = await response.clone().text();
+    stored.content_type = response.headers.get('Content-Type') || 'application/json';
+  }
+  
+  await db.collection('idempotency_keys').updateOne(
+    { key },
+    { $set: { status: 'COMPLETADO', response: stored, completed_at: new Date().toISOString() }, $unset: { locked_until: '' } }
+  );
+}
 
-    // If closure is fully active, check scope
-    if (activeClosure.status === 'ACTIVO') {
-      return await checkClosureScope(activeClosure, projectId, costCenterId, engineerId, date);
+async function replayIdempotentResponse(stored) {
+  let response;
+  if (stored.export_file_id) {
+    response = await artifactResponse(stored.export_file_id);
+    if (!response) {
+      return idempotencyError('El archivo de exportación original ya no está disponible', 410);
     }
+    Object.entries(stored.headers || {}).forEach(([header, value]) => response.headers.set(header, value));
+  } else {
+    response = new NextResponse(stored.body, { status: stored.status, headers: { 'Content-Type': stored.content_type } });
+  }
+  response.headers.set('Idempotent-Replayed', 'true');
+  return corsResponse(response);
+}
 
-    // If partially reopened, check exceptions
-    if (activeClosure.status === 'PARCIALMENTE_REABIERTO') {
-      const exceptions = await db.collection('export_closure_exceptions').find({
-        closure_id: activeClosure.id,
-        date_start: { $lte: date },
-        date_end: { $gte: date }
-      }).toArray();
+// Pass a body through, calling onComplete once it was fully read, onAbort otherwise
+async function* settleAfterBody(body, onComplete, onAbort) {
+  let completed = false;
+  try {
+    for await (const chunk of body) {
+      yield chunk;
+    }
+    completed = true;
+    await onComplete().catch(error => console.error('Response completion error:', error));
+  } finally {
+    if (!completed) {
+      await onAbort().catch(error => console.error('Response abort error:', error));
+    }
+  }
+}
 
-      // Check if any exception allows this operation
-      for (const exception of exceptions) {
-        const isInException = (
-          (!exception.projects_override || exception.projects_override.includes(projectId)) &&
-          (!exception.cost_centers_override || exception.cost_centers_override.includes(costCenterId)) &&
-          (!exception.engineers_override || exception.engineers_override.includes(engineerId))
-        );
-        
-        if (isInException) {
-          return { isBlocked: false, closure: activeClosure, inException: true };
-        }
+function withIdempotency(handler) {
+  return async (request, context) => {
+    const key = request.headers.get('idempotency-key');
+    if (!key) return handler(request, context);
+    if (key.length > 255) {
+      return idempotencyError('Idempotency-Key inválida', 400);
+    }
+    
+    await connectToDatabase();
+    await ensureIndexes();
+    const { pathname } = new URL(request.url);
+    const body = await request.clone().text();
+    const requestHash = crypto.createHash('sha256').update(`${request.method} ${pathname}\n${body}`).digest('hex');
+    
+    const { claimed, record } = await claimIdempotencyKey(key, requestHash, request.method, pathname);
+    if (!claimed) {
+      // Expired between the insert and the lookup: run without deduplication
+      if (!record) return handler(request, context);
+      if (record.request_hash !== requestHash) {
+        return idempotencyError('La Idempotency-Key ya se usó con una solicitud distinta', 422);
       }
-
-      // If not in any exception, check original scope
-      return await checkClosureScope(activeClosure, projectId, costCenterId, engineerId, date);
+      if (record.status !== 'COMPLETADO') {
+        return idempotencyError('Hay una solicitud en curso con esta Idempotency-Key', 409, { 'Retry-After': '1' });
+      }
+      return replayIdempotentResponse(record.response);
     }
+    
+    let response;
+    try {
+      response = await handler(request, context);
+    } catch (error) {
+      await releaseIdempotencyKey(key);
+      throw error;
+    }
+    
+    // Not stored: server errors and admission rejections (429) must stay retryable
+    if (response.status >= 500 || response.status === 429) {
+      await releaseIdempotencyKey(key);
+      return response;
+    }
+    if (!response.headers.has('X-Export-File-Id') || !response.body) {
+      await storeIdempotentResponse(key, response);
+      return response;
+    }
+    
+    // Export files are recorded once fully sent, when the artifact is complete
+    return new NextResponse(iterableToStream(settleAfterBody(
+      response.body,
+      () => storeIdempotentResponse(key, response),
+      () => releaseIdempotencyKey(key)
+    )), { status: response.status, headers: response.headers });
+  };
+}
+
+// Admission control for the expensive routes (exports, detailed closures,
+// maintenance rebuilds). At most ADMISSION_MAX_CONCURRENT of them run at once
+// and an identified user may hold ADMISSION_MAX_PER_USER running or queued;
+// the rest wait in a bounded FIFO queue. A user over their cap gets 429, a full
+// queue or a wait past the timeout 503, both with Retry-After. Other routes are
+// never queued, so time entry writes keep their latency during export bursts.
+// A slot is held until the response body has been fully sent.
+const ADMISSION_MAX_CONCURRENT = parseInt(process.env.ADMISSION_MAX_CONCURRENT || '4', 10);
+const ADMISSION_MAX_PER_USER = parseInt(process.env.ADMISSION_MAX_PER_USER || '2', 10);
+const ADMISSION_QUEUE_LIMIT = parseInt(process.env.ADMISSION_QUEUE_LIMIT || '20', 10);
+const ADMISSION_QUEUE_TIMEOUT_MS = parseInt(process.env.ADMISSION_QUEUE_TIMEOUT_MS || '15000', 10);
+const ADMISSION_RETRY_AFTER_SECONDS = parseInt(process.env.ADMISSION_RETRY_AFTER_SECONDS || '5', 10);
 
-    return { isBlocked: false, closure: null };
+const admission = {
+  active: 0,
+  queue: [],
+  users: new Map(),
+  admitted: 0,
+  rejected_user_limit: 0,
+  rejected_queue_full: 0,
+  rejected_timeout: 0
+};
+
+// Class of an expensive request, or null for routes admitted directly
+function admissionClass(method, pathSegments) {
+  const [resource, , action] = pathSegments;
+  if (method === 'POST' && resource === 'export-excel') return 'export';
+  if (method === 'POST' && resource === 'export-closures' && action === 'delta-export') return 'export';
+  if (method === 'GET' && resource === 'export-closures-detailed') return 'closures_detailed';
+  if (method === 'POST' && resource === 'maintenance') return 'maintenance';
+  return null;
+}
+
+// X-User-Id header, user_id query parameter or user_id in the JSON body
+async function admissionUser(request, searchParams) {
+  const user = request.headers.get('x-user-id') || searchParams.get('user_id');
+  if (user || request.method === 'GET') return user;
+  try {
+    const body = await request.clone().json();
+    return body?.user_id ? String(body.user_id) : null;
   } catch (error) {
-    console.error('Error checking enhanced export closure:', error);
-    return { isBlocked: false, closure: null };
+    return null;
   }
 }
 
-async function checkClosureScope(closure, projectId, costCenterId, engineerId, date) {
-  const scopeQuery = {
-    closure_id: closure.id,
-    $or: [
-      // All projects (project_id is null)
-      { project_id: null },
-      // Specific project matches
-      { project_id: projectId }
-    ]
-  };
+function admissionRejected(status, message, counter) {
+  admission[counter]++;
+  return corsResponse(NextResponse.json({ success: false, message }, {
+    status,
+    headers: { 'Retry-After': String(ADMISSION_RETRY_AFTER_SECONDS) }
+  }));
+}
 
-  const scope = await db.collection('export_closure_scope').findOne(scopeQuery);
-  
-  if (scope) {
-    // Additional checks for cost_center and engineer scope
-    const isInScope = (
-      (scope.cost_center_id === null || scope.cost_center_id === costCenterId) &&
-      (scope.engineer_id === null || scope.engineer_id === engineerId)
-    );
-    
-    if (isInScope) {
-      return { 
-        isBlocked: true, 
-        closure: closure,
-        message: `Operación bloqueada por cierre ${closure.status.toLowerCase()} del ${closure.date_start} al ${closure.date_end}` 
-      };
-    }
+function holdUserSlot(user, delta) {
+  if (!user) return;
+  const held = (admission.users.get(user) || 0) + delta;
+  if (held > 0) {
+    admission.users.set(user, held);
+  } else {
+    admission.users.delete(user);
   }
-
-  return { isBlocked: false, closure: closure };
 }
 
-// Validate daily hours limit
-async function validateDailyHours(engineerId, date, newHours, excludeEntryId = null) {
-  try {
-    const existingEntries = await db.collection('time_entries').find({
-      engineer_id: engineerId,
-      date: date,
-      ...(excludeEntryId && { id: { $ne: excludeEntryId } })
-    }).toArray();
+// Resolves true once a slot is granted, false if the wait timed out
+function acquireAdmission() {
+  if (admission.active < ADMISSION_MAX_CONCURRENT) {
+    admission.active++;
+    return Promise.resolve(true);
+  }
+  
+  return new Promise(resolve => {
+    const waiter = { resolve, enqueuedAt: performance.now() };
+    waiter.timer = setTimeout(() => {
+      admission.queue.splice(admission.queue.indexOf(waiter), 1);
+      resolve(false);
+    }, ADMISSION_QUEUE_TIMEOUT_MS);
+    admission.queue.push(waiter);
+  });
+}
 
-    const totalExistingHours = existingEntries.reduce((sum, entry) => sum + parseFloat(entry.hours), 0);
-    const totalHours = totalExistingHours + parseFloat(newHours);
-    const maxHours = parseFloat(process.env.MAX_HOURS_PER_DAY || '8');
+// Hand the slot to the oldest waiter, or free it
+function releaseAdmission() {
+  const next = admission.queue.shift();
+  if (next) {
+    clearTimeout(next.timer);
+    next.resolve(true);
+  } else {
+    admission.active--;
+  }
+}
 
-    return {
-      isValid: totalHours <= maxHours,
-      totalHours,
-      maxHours,
-      message: totalHours > maxHours ? `Total de horas (${totalHours}) excede el límite diario de ${maxHours}h` : null
+function withAdmission(method, handler) {
+  return async (request, context) => {
+    const { pathname, searchParams } = new URL(request.url);
+    const routeClass = admissionClass(method, pathname.split('/').filter(Boolean).slice(1));
+    if (!routeClass) return handler(request, context);
+    
+    const user = await admissionUser(request, searchParams);
+    if (user && (admission.users.get(user) || 0) >= ADMISSION_MAX_PER_USER) {
+      return admissionRejected(429, `Máximo ${ADMISSION_MAX_PER_USER} operaciones pesadas simultáneas por usuario`, 'rejected_user_limit');
+    }
+    if (admission.active >= ADMISSION_MAX_CONCURRENT && admission.queue.length >= ADMISSION_QUEUE_LIMIT) {
+      return admissionRejected(503, 'Servidor ocupado, intente nuevamente en unos segundos', 'rejected_queue_full');
+    }
+    
+    holdUserSlot(user, 1);
+    const start = performance.now();
+    const admitted = await acquireAdmission();
+    const waitMs = performance.now() - start;
+    requestContext.getStore()?.stages.push(['admission', waitMs]);
+    observe('ziklo_admission_wait_seconds', 'Time expensive requests waited for an admission slot', {
+      class: routeClass,
+      outcome: admitted ? 'admitted' : 'timeout'
+    }, waitMs / 1000);
+    
+    if (!admitted) {
+      holdUserSlot(user, -1);
+      return admissionRejected(503, 'Servidor ocupado, intente nuevamente en unos segundos', 'rejected_timeout');
+    }
+    admission.admitted++;
+    
+    let released = false;
+    const release = async () => {
+      if (released) return;
+      released = true;
+      releaseAdmission();
+      holdUserSlot(user, -1);
     };
-  } catch (error) {
-    console.error('Error validating daily hours:', error);
-    return { isValid: false, message: 'Error validating daily hours' };
-  }
+    
+    let response;
+    try {
+      response = await handler(request, context);
+    } catch (error) {
+      await release();
+      throw error;
+    }
+    
+    if (!response.body) {
+      await release();
+      return response;
+    }
+    return new NextResponse(iterableToStream(settleAfterBody(response.body, release, release)), {
+      status: response.status,
+      headers: response.headers
+    });
+  };
 }
 
-export async function GET(request, { params }) {
+function admissionReport() {
+  return {
+    active: admission.active,
+    queued: admission.queue.length,
+    oldest_wait_ms: admission.queue.length > 0 ? Math.round(performance.now() - admission.queue[0].enqueuedAt) : 0,
+    users_active: admission.users.size,
+    max_concurrent: ADMISSION_MAX_CONCURRENT,
+    max_per_user: ADMISSION_MAX_PER_USER,
+    queue_limit: ADMISSION_QUEUE_LIMIT,
+    admitted: admission.admitted,
+    rejected_user_limit: admission.rejected_user_limit,
+    rejected_queue_full: admission.rejected_queue_full,
+    rejected_timeout: admission.rejected_timeout
+  };
+}
+
+async function handleGET(request, { params }) {
   await connectToDatabase();
   
-  const { pathname } = new URL(request.url);
+  const { pathname, searchParams } = new URL(request.url);
   const pathSegments = pathname.split('/').filter(Boolean).slice(1); // Remove 'api' prefix
   
   try {
     // Routes
     if (pathSegments[0] === 'users') {
-      const users = await db.collection('users').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: users }));
+      const users = await findPage('users', {}, searchParams);
+      return corsResponse(NextResponse.json({ success: true, ...users }));
     }
     
     if (pathSegments[0] === 'app-users') {
-      const appUsers = await db.collection('app_users').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: appUsers }));
+      const appUsers = await findPage('app_users', {}, searchParams, { hiddenFields: ['clave'] });
+      return corsResponse(NextResponse.json({ success: true, ...appUsers }));
     }
     
-    if (pathSegments[0] === 'projects') {
-      const projects = await db.collection('projects').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: projects }));
+    // Catalogs (projects, cost centers, engineers, concepts) go through the response cache
+    if (CACHED_CATALOG_ROUTES[pathSegments[0]] && !pathSegments[1]) {
+      return corsResponse(await cachedCatalogResponse(request, pathSegments[0], searchParams));
     }
     
-    if (pathSegments[0] === 'cost-centers') {
-      const costCenters = await db.collection('cost_centers').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: costCenters }));
+    // Archived months
+    if (pathSegments[0] === 'archives') {
+      const archives = await db.collection('time_entry_archives')
+        .find({}, { projection: { _id: 0 } })
+        .sort({ month: -1 })
+        .toArray();
+      return corsResponse(NextResponse.json({ success: true, data: archives }));
     }
     
-    if (pathSegments[0] === 'engineers') {
-      const engineers = await db.collection('engineers').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: engineers }));
+    // Prometheus scrape endpoint
+    if (pathSegments[0] === 'metrics') {
+      return corsResponse(new NextResponse(await metricsText(), {
+        status: 200,
+        headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' }
+      }));
     }
     
-    if (pathSegments[0] === 'concepts') {
-      const concepts = await db.collection('concepts').find({}).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: concepts }));
+    if (pathSegments[0] === 'admission' && pathSegments[1] === 'stats') {
+      return corsResponse(NextResponse.json({ success: true, data: admissionReport() }));
+    }
+    
+    if (pathSegments[0] === 'cache' && pathSegments[1] === 'stats') {
+      return corsResponse(NextResponse.json({ success: true, data: catalogCacheReport() }));
+    }
+    
+    // Live change feed (Server-Sent Events)
+    if (pathSegments[0] === 'events') {
+      if (pathSegments[1] === 'stats') {
+        return corsResponse(NextResponse.json({ success: true, data: changeFeedReport() }));
+      }
+      return corsResponse(changeFeedResponse(request));
+    }
+    
+    if (pathSegments[0] === 'audit' && pathSegments[1] === 'stats') {
+      return corsResponse(NextResponse.json({ success: true, data: auditReport() }));
     }
     
     if (pathSegments[0] === 'time-entries') {
-      const { searchParams } = new URL(request.url);
       const startDate = searchParams.get('start_date');
       const endDate = searchParams.get('end_date');
-      const projectId = searchParams.get('project_id');
-      const engineerId = searchParams.get('engineer_id');
+      const query = buildTimeEntryQuery(searchParams);
+      
+      const archives = await archiveCollections(startDate, endDate);
+      if (wantsNdjson(request)) {
+        return corsResponse(ndjsonResponse(request, findCursor('time_entries', query, searchParams, {
+          archives,
+          hiddenFields: VIEW_DISPLAY_FIELDS
+        })));
+      }
+      
+      const [timeEntries, totals] = await Promise.all([
+        findPage('time_entries', query, searchParams, {
+          archives,
+          hiddenFields: VIEW_DISPLAY_FIELDS
+        }),
+        searchParams.get('include_totals') ? timeEntryTotals(query, archives) : null
+      ]);
+      return corsResponse(NextResponse.json({ success: true, ...timeEntries, ...(totals && { totals }) }));
+    }
+    
+    // Revision history of a closure, and the stored file of each revision
+    if (pathSegments[0] === 'export-closures' && pathSegments[2] === 'revisions') {
+      if (pathSegments[3]) {
+        const revision = await db.collection('export_closure_revisions').findOne({
+          closure_id: pathSegments[1],
+          revision: parseInt(pathSegments[3], 10)
+        });
+        const response = revision && await artifactResponse(revision.export_file_id);
+        if (!response) {
+          return corsResponse(NextResponse.json({ 
+            success: false, 
+            message: 'El archivo de esta revisión no está disponible' 
+          }, { status: 404 }));
+        }
+        return corsResponse(response);
+      }
+      
+      const revisions = await db.collection('export_closure_revisions')
+        .find({ closure_id: pathSegments[1] }, { projection: { _id: 0 } })
+        .sort({ revision: -1 })
+        .toArray();
+      return corsResponse(NextResponse.json({ success: true, data: revisions }));
+    }
+    
+    // Download the stored artifact of a closure's latest revision
+    if (pathSegments[0] === 'export-closures' && pathSegments[2] === 'download') {
+      const closure = await db.collection('export_closures').findOne({ id: pathSegments[1] });
+      if (!closure) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'Cierre no encontrado' 
+        }, { status: 404 }));
+      }
+      
+      const response = await artifactResponse(closure.export_file_id);
+      if (!response) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'El archivo de este cierre no está disponible' 
+        }, { status: 404 }));
+      }
+      return corsResponse(response);
+    }
+    
+    // Export job status and download
+    if (pathSegments[0] === 'export-jobs' && pathSegments[1]) {
+      const job = await db.collection('export_jobs').findOne({ id: pathSegments[1] });
+      if (!job) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'Trabajo de exportación no encontrado' 
+        }, { status: 404 }));
+      }
       
-      let query = {};
-      if (startDate && endDate) {
-        query.date = { $gte: startDate, $lte: endDate };
+      if (pathSegments[2] === 'download') {
+        if (job.status !== 'COMPLETADO') {
+          return corsResponse(NextResponse.json({ 
+            success: false, 
+            message: `El trabajo de exportación está en estado ${job.status}` 
+          }, { status: 409 }));
+        }
+        
+        const response = await artifactResponse(job.export_file_id);
+        if (!response) {
+          return corsResponse(NextResponse.json({ 
+            success: false, 
+            message: 'El archivo de exportación no está disponible' 
+          }, { status: 404 }));
+        }
+        return corsResponse(response);
       }
-      if (projectId) query.project_id = projectId;
-      if (engineerId) query.engineer_id = engineerId;
       
-      const timeEntries = await db.collection('time_entries').find(query).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: timeEntries }));
+      return corsResponse(NextResponse.json({ success: true, data: job }));
     }
     
     if (pathSegments[0] === 'export-closures') {
-      const closures = await db.collection('export_closures').find({}).sort({ created_at: -1 }).toArray();
-      return corsResponse(NextResponse.json({ success: true, data: closures }));
+      const closures = await findPage('export_closures', {}, searchParams, { defaultOrder: 'desc' });
+      return corsResponse(NextResponse.json({ success: true, ...closures }));
     }
     
     // Export closures with scope details
     if (pathSegments[0] === 'export-closures-detailed') {
-      const closures = await db.collection('export_closures').aggregate([
-        {
-          $lookup: {
-            from: 'export_closure_scope',
-            localField: 'id',
-            foreignField: 'closure_id',
-            as: 'scope'
-          }
-        },
+      const cursor = db.collection('export_closures').aggregate([
         {
           $lookup: {
             from: 'export_closure_exceptions',
@@ -529,24 +3660,33 @@ export async function GET(request, { params }) {
           }
         },
         { $sort: { created_at: -1 } }
-      ]).toArray();
+      ]);
       
-      return corsResponse(NextResponse.json({ success: true, data: closures }));
+      if (wantsNdjson(request)) {
+        return corsResponse(ndjsonResponse(request, streamWithClosureScopes(cursor)));
+      }
+      return corsResponse(NextResponse.json({ success: true, data: await withClosureScopes(await cursor.toArray()) }));
+    }
+    
+    // Query plan audit for the canonical queries
+    if (pathSegments[0] === 'diagnostics' && pathSegments[1] === 'query-plans') {
+      const report = await auditQueryPlans();
+      return corsResponse(NextResponse.json({ success: true, data: report }));
     }
     
     if (pathSegments[0] === 'dashboard') {
       if (pathSegments[1] === 'kpis') {
         // Get basic KPIs
-        const totalProjects = await db.collection('projects').countDocuments({});
+        const totalProjects = await db.collection('projects').estimatedDocumentCount();
         const activeProjects = await db.collection('projects').countDocuments({ status: 'active' });
-        const totalEngineers = await db.collection('engineers').countDocuments({});
+        const totalEngineers = await db.collection('engineers').estimatedDocumentCount();
         
-        // Get time entries for current month
+        // Get hours for current month from the rollup
         const now = new Date();
         const startOfMonth = new Date(now.getFullYear(), now.getMonth(), 1).toISOString().split('T')[0];
         const endOfMonth = new Date(now.getFullYear(), now.getMonth() + 1, 0).toISOString().split('T')[0];
         
-        const monthlyHours = await db.collection('time_entries').aggregate([
+        const monthlyHours = await db.collection('daily_hours').aggregate([
           {
             $match: {
               date: { $gte: startOfMonth, $lte: endOfMonth }
@@ -555,7 +3695,7 @@ export async function GET(request, { params }) {
           {
             $group: {
               _id: null,
-              total_hours: { $sum: { $toDouble: "$hours" } }
+              total_hours: { $sum: '$hours' }
             }
           }
         ]).toArray();
@@ -573,8 +3713,7 @@ export async function GET(request, { params }) {
         }));
       }
       
-      if (pathSegments[1] === 'hours-by-project') {
-        const { searchParams } = new URL(request.url);
+      if (HOURS_REPORTS[pathSegments[1]]) {
         const startDate = searchParams.get('start_date');
         const endDate = searchParams.get('end_date');
         
@@ -583,40 +3722,20 @@ export async function GET(request, { params }) {
           matchQuery.date = { $gte: startDate, $lte: endDate };
         }
         
-        const hoursByProject = await db.collection('time_entries').aggregate([
-          { $match: matchQuery },
-          {
-            $lookup: {
-              from: 'projects',
-              localField: 'project_id',
-              foreignField: 'id',
-              as: 'project'
-            }
-          },
-          { $unwind: '$project' },
-          {
-            $group: {
-              _id: '$project_id',
-              project_name: { $first: '$project.name' },
-              total_hours: { $sum: { $toDouble: '$hours' } }
-            }
-          },
-          { $sort: { total_hours: -1 } }
-        ]).toArray();
-        
-        return corsResponse(NextResponse.json({ success: true, data: hoursByProject }));
+        const report = await hoursReport(HOURS_REPORTS[pathSegments[1]], matchQuery);
+        return corsResponse(NextResponse.json({ success: true, data: report }));
       }
     }
     
-    return corsResponse(NextResponse.json({ success: false, message: 'Endpoint not found' }, { status: 404 }));
+    return endpointNotFound();
     
   } catch (error) {
     console.error('GET Error:', error);
-    return corsResponse(NextResponse.json({ success: false, message: error.message }, { status: 500 }));
+    return corsResponse(NextResponse.json({ success: false, message: error.message }, { status: error.status || 500 }));
   }
 }
 
-export async function POST(request, { params }) {
+async function handlePOST(request, { params }) {
   await connectToDatabase();
   
   const { pathname } = new URL(request.url);
@@ -656,6 +3775,7 @@ export async function POST(request, { params }) {
       };
       
       await db.collection('projects').insertOne(project);
+      await catalogChanged('project', project);
       await logAudit('CREATE', 'project', project.id, project);
       
       return corsResponse(NextResponse.json({ success: true, data: project }));
@@ -674,6 +3794,7 @@ export async function POST(request, { params }) {
       };
       
       await db.collection('cost_centers').insertOne(costCenter);
+      await catalogChanged('cost_center', costCenter);
       await logAudit('CREATE', 'cost_center', costCenter.id, costCenter);
       
       return corsResponse(NextResponse.json({ success: true, data: costCenter }));
@@ -693,6 +3814,7 @@ export async function POST(request, { params }) {
       };
       
       await db.collection('engineers').insertOne(engineer);
+      await catalogChanged('engineer', engineer);
       await logAudit('CREATE', 'engineer', engineer.id, engineer);
       
       return corsResponse(NextResponse.json({ success: true, data: engineer }));
@@ -711,6 +3833,7 @@ export async function POST(request, { params }) {
       };
       
       await db.collection('concepts').insertOne(concept);
+      await catalogChanged('concept', concept);
       await logAudit('CREATE', 'concept', concept.id, concept);
       
       return corsResponse(NextResponse.json({ success: true, data: concept }));
@@ -770,6 +3893,28 @@ export async function POST(request, { params }) {
       return corsResponse(NextResponse.json({ success: true, data: { ...appUser, clave: '[HIDDEN]' } }));
     }
     
+    // Bulk time entry ingestion
+    if (pathSegments[0] === 'time-entries' && pathSegments[1] === 'bulk') {
+      const entries = Array.isArray(body) ? body : body.entries;
+      
+      if (!Array.isArray(entries) || entries.length === 0) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'Se requiere una lista de registros' 
+        }, { status: 400 }));
+      }
+      
+      if (entries.length > MAX_BULK_TIME_ENTRIES) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: `Máximo ${MAX_BULK_TIME_ENTRIES} registros por lote` 
+        }, { status: 400 }));
+      }
+      
+      const result = await createTimeEntriesBulk(entries, body.created_by || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
     if (pathSegments[0] === 'time-entries') {
       const dateValidation = validateDate(body.date);
       if (!dateValidation.isValid) {
@@ -791,14 +3936,14 @@ export async function POST(request, { params }) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: closureCheck.message 
-        }, { status: 409 }));
+        }, { status: closureCheck.status || 409 }));
       }
       
-      // Validate daily hours
-      const hoursValidation = await validateDailyHours(
+      // Check and reserve the daily hours in one step
+      const hoursValidation = await reserveDailyHours(
         body.engineer_id, 
         dateValidation.isoString, 
-        body.hours
+        parseFloat(body.hours)
       );
       
       if (!hoursValidation.isValid) {
@@ -808,40 +3953,93 @@ export async function POST(request, { params }) {
         }, { status: 400 }));
       }
       
-      const timeEntry = {
-        id: uuidv4(),
-        date: dateValidation.isoString,
-        project_id: body.project_id,
-        cost_center_id: body.cost_center_id,
-        engineer_id: body.engineer_id,
-        concept_id: body.concept_id,
-        hours: parseFloat(body.hours),
-        notes: body.notes || '',
-        created_by: body.created_by || 'system',
-        created_at: new Date().toISOString(),
-        updated_at: new Date().toISOString(),
-        closure_id: closureCheck.inException ? closureCheck.closure.id : null,
-        post_export_adjustment: closureCheck.inException ? true : false
-      };
+      const timeEntry = buildTimeEntry(body, dateValidation.isoString, closureCheck);
       
-      await db.collection('time_entries').insertOne(timeEntry);
+      try {
+        await db.collection('time_entries').insertOne(timeEntry);
+      } catch (error) {
+        await releaseDailyHours(timeEntry.engineer_id, timeEntry.date, timeEntry.hours);
+        throw error;
+      }
+      await syncTimeEntryProjections({ inserted: [timeEntry] });
       await logAudit('CREATE', 'time_entry', timeEntry.id, timeEntry);
       
       return corsResponse(NextResponse.json({ success: true, data: timeEntry }));
     }
     
+    // Maintenance: archive closed months (all of them unless months are given)
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'archive-months') {
+      const results = await archiveClosedMonths(body.months || null, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: results }));
+    }
+    
+    // Maintenance: move an archived month back into time_entries
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'rehydrate-month') {
+      const result = await rehydrateMonth(body.month, body.user_id || 'system');
+      if (!result) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'El mes no está archivado' 
+        }, { status: 404 }));
+      }
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Maintenance: move legacy closure scope rows onto their closures
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'migrate-closure-scopes') {
+      const result = await migrateClosureScopes();
+      await logAudit('MIGRATE', 'export_closure_scope', null, result, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Maintenance: rebuild the denormalized time entry views
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'rebuild-time-entry-views') {
+      const result = await rebuildTimeEntryViews();
+      await logAudit('REBUILD', 'time_entry_views', null, result, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Maintenance: check the time entry views of a range and rebuild them on a mismatch
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'check-time-entry-views') {
+      const result = await ensureTimeEntryViewsConsistent(buildExportQuery(body));
+      await logAudit('CHECK', 'time_entry_views', null, result, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Maintenance: rebuild the per engineer and day hour ledger
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'reconcile-hour-ledger') {
+      const result = await reconcileDailyHourLedger();
+      await logAudit('REBUILD', 'daily_hour_ledger', null, result, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Maintenance: rebuild the daily hours rollup from time_entries
+    if (pathSegments[0] === 'maintenance' && pathSegments[1] === 'rebuild-daily-hours') {
+      const result = await rebuildDailyHoursRollup();
+      await logAudit('REBUILD', 'daily_hours', null, result, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: result }));
+    }
+    
+    // Queue an export to run in the background
+    if (pathSegments[0] === 'export-jobs') {
+      const job = await enqueueExportJob(body, body.user_id || 'system');
+      return corsResponse(NextResponse.json({ success: true, data: job }, { status: 202 }));
+    }
+    
     // Excel Export endpoint
     if (pathSegments[0] === 'export-excel') {
       try {
-        const exportResult = await createExcelExport(body, body.user_id || 'system');
+        // Every export is streamed, so memory use does not depend on its size
+        const { format } = parseExportOptions(body);
+        const exportResult = await streamExcelExport(body, body.user_id || 'system', format);
         
-        // Return file as response
-        const response = new NextResponse(exportResult.excelBuffer, {
+        const response = new NextResponse(iterableToStream(exportResult.chunks), {
           status: 200,
           headers: {
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            'Content-Type': exportResult.contentType,
             'Content-Disposition': `attachment; filename="${exportResult.filename}"`,
             'X-Closure-Id': exportResult.closure.id,
+            'X-Export-File-Id': exportResult.closure.export_file_id,
             'X-Record-Count': exportResult.recordCount.toString()
           }
         });
@@ -851,10 +4049,26 @@ export async function POST(request, { params }) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: `Error en exportación: ${error.message}` 
-        }, { status: 500 }));
+        }, { status: error.status || 500 }));
       }
     }
     
+    // Delta export of the changes since the closure's last revision
+    if (pathSegments[0] === 'export-closures' && pathSegments[2] === 'delta-export') {
+      const format = body.format === 'csv' ? 'csv' : 'xlsx';
+      const revision = await createDeltaExport(pathSegments[1], body.user_id || 'system', format);
+      if (!revision) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'Cierre no encontrado' 
+        }, { status: 404 }));
+      }
+      
+      const response = await artifactResponse(revision.export_file_id);
+      response.headers.set('X-Revision', String(revision.revision));
+      return corsResponse(response);
+    }
+    
     // Reopen closure endpoints
     if (pathSegments[0] === 'export-closures' && pathSegments[2] === 'reopen') {
       const closureId = pathSegments[1];
@@ -873,15 +4087,15 @@ export async function POST(request, { params }) {
       }
     }
     
-    return corsResponse(NextResponse.json({ success: false, message: 'Endpoint not found' }, { status: 404 }));
+    return endpointNotFound();
     
   } catch (error) {
     console.error('POST Error:', error);
-    return corsResponse(NextResponse.json({ success: false, message: error.message }, { status: 500 }));
+    return corsResponse(NextResponse.json({ success: false, message: error.message }, { status: error.status || 500 }));
   }
 }
 
-export async function PUT(request, { params }) {
+async function handlePUT(request, { params }) {
   await connectToDatabase();
   
   const { pathname } = new URL(request.url);
@@ -941,20 +4155,21 @@ export async function PUT(request, { params }) {
         }, { status: 400 }));
       }
       
-      const result = await db.collection('app_users').findOneAndUpdate(
+      const previous = await db.collection('app_users').findOneAndUpdate(
         { id: id },
         { $set: updateData },
-        { returnDocument: 'after' }
+        { returnDocument: 'before' }
       );
       
-      if (!result) {
+      if (!previous) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: 'Usuario no encontrado' 
         }, { status: 404 }));
       }
       
-      await logAudit('UPDATE', 'app_user', id, { ...updateData, clave: updateData.clave ? '[HIDDEN]' : undefined });
+      const result = { ...previous, ...updateData };
+      await logAudit('UPDATE', 'app_user', id, updateAuditPayload(previous, updateData, ['clave']));
       
       return corsResponse(NextResponse.json({ success: true, data: { ...result, clave: '[HIDDEN]' } }));
     }
@@ -980,22 +4195,7 @@ export async function PUT(request, { params }) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: closureCheck.message 
-        }, { status: 409 }));
-      }
-      
-      // Validate daily hours (excluding current entry)
-      const hoursValidation = await validateDailyHours(
-        body.engineer_id, 
-        dateValidation.isoString, 
-        body.hours,
-        id
-      );
-      
-      if (!hoursValidation.isValid) {
-        return corsResponse(NextResponse.json({ 
-          success: false, 
-          message: hoursValidation.message 
-        }, { status: 400 }));
+        }, { status: closureCheck.status || 409 }));
       }
       
       const updateData = {
@@ -1012,25 +4212,52 @@ export async function PUT(request, { params }) {
         post_export_adjustment: closureCheck.inException ? true : false
       };
       
-      const result = await db.collection('time_entries').findOneAndUpdate(
-        { id: id },
-        { $set: updateData },
-        { returnDocument: 'after' }
-      );
-      
-      if (!result) {
+      const previous = await db.collection('time_entries').findOne({ id: id });
+      if (!previous) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: 'Registro de tiempo no encontrado' 
         }, { status: 404 }));
       }
       
-      await logAudit('UPDATE', 'time_entry', id, updateData);
+      // Reserve only the hours the update adds to the ledger
+      const hoursChange = await reserveHoursChange(previous, updateData);
+      if (!hoursChange.isValid) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: hoursChange.message 
+        }, { status: 400 }));
+      }
+      
+      // The update only applies to the version the reservation was made for
+      let updated;
+      try {
+        updated = await db.collection('time_entries').updateOne(
+          { id: id, engineer_id: previous.engineer_id, date: previous.date, hours: previous.hours },
+          { $set: updateData }
+        );
+      } catch (error) {
+        await hoursChange.rollback();
+        throw error;
+      }
+      
+      if (updated.matchedCount === 0) {
+        await hoursChange.rollback();
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'El registro de tiempo fue modificado por otra operación, intente de nuevo' 
+        }, { status: 409 }));
+      }
+      await hoursChange.commit();
+      
+      const result = { ...previous, ...updateData };
+      await syncTimeEntryProjections({ updated: [{ before: previous, after: result }] });
+      await logAudit('UPDATE', 'time_entry', id, updateAuditPayload(previous, updateData));
       
       return corsResponse(NextResponse.json({ success: true, data: result }));
     }
     
-    return corsResponse(NextResponse.json({ success: false, message: 'Endpoint not found' }, { status: 404 }));
+    return endpointNotFound();
     
   } catch (error) {
     console.error('PUT Error:', error);
@@ -1038,7 +4265,7 @@ export async function PUT(request, { params }) {
   }
 }
 
-export async function DELETE(request, { params }) {
+async function handleDELETE(request, { params }) {
   await connectToDatabase();
   
   const { pathname } = new URL(request.url);
@@ -1084,16 +4311,26 @@ export async function DELETE(request, { params }) {
         return corsResponse(NextResponse.json({ 
           success: false, 
           message: closureCheck.message 
-        }, { status: 409 }));
+        }, { status: closureCheck.status || 409 }));
       }
       
-      await db.collection('time_entries').deleteOne({ id: id });
+      // Only the request that actually removed the row updates the ledger,
+      // rollup, views and audit log; a concurrent delete got there first
+      const { deletedCount } = await db.collection('time_entries').deleteOne({ id: id });
+      if (deletedCount === 0) {
+        return corsResponse(NextResponse.json({ 
+          success: false, 
+          message: 'Registro de tiempo no encontrado' 
+        }, { status: 404 }));
+      }
+      await releaseDailyHours(entry.engineer_id, entry.date, parseFloat(entry.hours));
+      await syncTimeEntryProjections({ deleted: [entry] });
       await logAudit('DELETE', 'time_entry', id, entry);
       
       return corsResponse(NextResponse.json({ success: true, message: 'Registro eliminado' }));
     }
     
-    return corsResponse(NextResponse.json({ success: false, message: 'Endpoint not found' }, { status: 404 }));
+    return endpointNotFound();
     
   } catch (error) {
     console.error('DELETE Error:', error);
@@ -1101,6 +4338,11 @@ export async function DELETE(request, { params }) {
   }
 }
 
+export const GET = instrumentHandler('GET', withAdmission('GET', handleGET));
+export const POST = instrumentHandler('POST', withIdempotency(withAdmission('POST', handlePOST)));
+export const PUT = instrumentHandler('PUT', withIdempotency(handlePUT));
+export const DELETE = instrumentHandler('DELETE', handleDELETE);
+
 export async function OPTIONS(request) {
   return corsResponse();
 }
\ No newline at end of file
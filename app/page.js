@@ -1,6 +1,6 @@
 'use client';
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
@@ -15,6 +15,12 @@ import { toast } from 'sonner';
 import { Clock, Users, Building2, FolderOpen, Calendar, Download, AlertTriangle, Plus, Edit2, Trash2, BarChart3 } from 'lucide-react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 
+// Time entries grid: fixed row height so only the visible window is rendered
+const TIME_ENTRY_PAGE_SIZE = 100;
+const TIME_ENTRY_ROW_HEIGHT = 69;
+const TIME_ENTRY_VIEWPORT_HEIGHT = 600;
+const TIME_ENTRY_OVERSCAN = 10;
+
 export default function App() {
   // State management
   const [activeTab, setActiveTab] = useState('dashboard');
@@ -26,7 +32,6 @@ export default function App() {
   const [engineers, setEngineers] = useState([]);
   const [concepts, setConcepts] = useState([]);
   const [appUsers, setAppUsers] = useState([]);
-  const [timeEntries, setTimeEntries] = useState([]);
   const [exportClosures, setExportClosures] = useState([]);
   const [kpis, setKpis] = useState({});
   const [chartData, setChartData] = useState([]);
@@ -64,7 +69,8 @@ export default function App() {
     end_date: new Date().toISOString().split('T')[0],
     project_ids: [],
     cost_center_ids: [],
-    engineer_ids: []
+    engineer_ids: [],
+    summary_sheets: false
   });
   const [showExportDialog, setShowExportDialog] = useState(false);
   const [showReopenDialog, setShowReopenDialog] = useState(false);
@@ -74,6 +80,13 @@ export default function App() {
   // Time entries view states
   const [selectedProject, setSelectedProject] = useState(null);
   const [projectTimeEntries, setProjectTimeEntries] = useState([]);
+  const [timeEntryPage, setTimeEntryPage] = useState({ has_more: false, next_cursor: null });
+  const [loadingMoreTimeEntries, setLoadingMoreTimeEntries] = useState(false);
+  const [timeEntryScrollTop, setTimeEntryScrollTop] = useState(0);
+  const [timeEntryTotals, setTimeEntryTotals] = useState({
+    filtered: { entries: 0, hours: 0 },
+    project: { entries: 0, hours: 0 }
+  });
   
   // Time entries filters
   const [timeEntryFilters, setTimeEntryFilters] = useState({
@@ -119,17 +132,65 @@ export default function App() {
     }
   };
 
+  // Catalog pages by URL with the ETag they were served with. Reloads send
+  // If-None-Match, so a page that did not change comes back as an empty 304
+  // and is taken from here instead of being downloaded again.
+  const catalogPagesRef = useRef(new Map());
+  
+  const apiCallCached = async (endpoint) => {
+    const cached = catalogPagesRef.current.get(endpoint);
+    try {
+      const response = await fetch(`/api/${endpoint}`, {
+        cache: 'no-store',
+        headers: cached ? { 'If-None-Match': cached.etag } : {}
+      });
+      if (response.status === 304 && cached) {
+        return cached.result;
+      }
+      
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.message || 'Error en la operación');
+      }
+      
+      const etag = response.headers.get('ETag');
+      if (etag) {
+        catalogPagesRef.current.set(endpoint, { etag, result });
+      }
+      return result;
+    } catch (error) {
+      console.error(`API Error (GET ${endpoint}):`, error);
+      toast.error(error.message || 'Error en la operación');
+      throw error;
+    }
+  };
+
+  // Fetch every page of a list endpoint by following its keyset cursor;
+  // unchanged pages are revalidated by ETag rather than downloaded
+  const apiCallAll = async (endpoint) => {
+    const separator = endpoint.includes('?') ? '&' : '?';
+    let data = [];
+    let cursor = null;
+    
+    do {
+      const result = await apiCallCached(`${endpoint}${separator}limit=500${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`);
+      data = data.concat(result.data);
+      cursor = result.page?.next_cursor;
+    } while (cursor);
+    
+    return { success: true, data };
+  };
+
   // Load all data
   const loadData = async () => {
     setLoading(true);
     try {
-      const [projectsRes, costCentersRes, engineersRes, conceptsRes, appUsersRes, timeEntriesRes, kpisRes, chartRes, closuresRes] = await Promise.all([
-        apiCall('projects'),
-        apiCall('cost-centers'),
-        apiCall('engineers'),
-        apiCall('concepts'),
-        apiCall('app-users'),
-        apiCall('time-entries'),
+      const [projectsRes, costCentersRes, engineersRes, conceptsRes, appUsersRes, kpisRes, chartRes, closuresRes] = await Promise.all([
+        apiCallAll('projects'),
+        apiCallAll('cost-centers'),
+        apiCallAll('engineers'),
+        apiCallAll('concepts'),
+        apiCallAll('app-users'),
         apiCall('dashboard/kpis'),
         apiCall('dashboard/hours-by-project'),
         apiCall('export-closures-detailed')
@@ -140,7 +201,6 @@ export default function App() {
       setEngineers(engineersRes.data);
       setConcepts(conceptsRes.data);
       setAppUsers(appUsersRes.data);
-      setTimeEntries(timeEntriesRes.data);
       setKpis(kpisRes.data);
       setChartData(chartRes.data);
       setExportClosures(closuresRes.data);
@@ -152,6 +212,82 @@ export default function App() {
     }
   };
 
+  // Live updates: the server pushes entity changes over /api/events and they
+  // are applied to the local state instead of reloading every dataset
+  const changeFeedRef = useRef(null);
+  const selectedProjectRef = useRef(null);
+  const timeEntryFiltersRef = useRef(timeEntryFilters);
+  const dashboardRefreshRef = useRef(null);
+  
+  useEffect(() => {
+    selectedProjectRef.current = selectedProject;
+  }, [selectedProject]);
+  
+  const upsertById = (items, item, prepend = false) => {
+    if (items.some(existing => existing.id === item.id)) {
+      return items.map(existing => existing.id === item.id ? { ...existing, ...item } : existing);
+    }
+    return prepend ? [item, ...items] : [...items, item];
+  };
+  
+  const removeById = (items, id) => items.filter(item => item.id !== id);
+  
+  const CHANGE_SETTERS = {
+    project: setProjects,
+    cost_center: setCostCenters,
+    engineer: setEngineers,
+    concept: setConcepts,
+    app_user: setAppUsers,
+    export_closure: setExportClosures
+  };
+  
+  // KPIs and the chart are derived from time entries: refresh them once per burst of changes
+  const scheduleDashboardRefresh = () => {
+    clearTimeout(dashboardRefreshRef.current);
+    dashboardRefreshRef.current = setTimeout(async () => {
+      try {
+        const [kpisRes, chartRes] = await Promise.all([
+          apiCall('dashboard/kpis'),
+          apiCall('dashboard/hours-by-project'),
+          selectedProjectRef.current && loadTimeEntryTotals(selectedProjectRef.current.id)
+        ]);
+        setKpis(kpisRes.data);
+        setChartData(chartRes.data);
+      } catch (error) {
+        console.error('Error refreshing dashboard:', error);
+      }
+    }, 1000);
+  };
+  
+  const applyChange = ({ type, entity, entity_id, data }) => {
+    if (entity === 'time_entry') {
+      const project = selectedProjectRef.current;
+      setProjectTimeEntries(entries => (
+        type === 'upsert' && project && data.project_id === project.id &&
+        matchesTimeEntryFilters(data, timeEntryFiltersRef.current)
+          ? upsertById(entries, data, true)
+          : removeById(entries, entity_id)
+      ));
+      scheduleDashboardRefresh();
+      return;
+    }
+    
+    const setter = CHANGE_SETTERS[entity];
+    if (!setter) return;
+    setter(items => type === 'upsert'
+      ? upsertById(items, data, entity === 'export_closure')
+      : removeById(items, entity_id));
+  };
+  
+  // Without a live change feed, fall back to reloading everything
+  const reloadIfOffline = async () => {
+    if (changeFeedRef.current?.readyState === EventSource.OPEN) return;
+    await loadData();
+    if (selectedProjectRef.current) {
+      await loadProjectTimeEntries(selectedProjectRef.current.id);
+    }
+  };
+
   // Handle time entry submission
   const handleTimeEntrySubmit = async (e) => {
     e.preventDefault();
@@ -159,10 +295,12 @@ export default function App() {
     
     try {
       if (editingId) {
-        await apiCall(`time-entries/${editingId}`, 'PUT', timeEntryForm);
+        const result = await apiCall(`time-entries/${editingId}`, 'PUT', timeEntryForm);
+        applyChange({ type: 'upsert', entity: 'time_entry', entity_id: result.data.id, data: result.data });
         toast.success('Registro de tiempo actualizado exitosamente');
       } else {
-        await apiCall('time-entries', 'POST', timeEntryForm);
+        const result = await apiCall('time-entries', 'POST', timeEntryForm);
+        applyChange({ type: 'upsert', entity: 'time_entry', entity_id: result.data.id, data: result.data });
         toast.success('Registro de tiempo creado exitosamente');
       }
       
@@ -178,13 +316,7 @@ export default function App() {
         notes: ''
       });
       
-      // Reload data
-      await loadData();
-      
-      // If we're in project detail view, also reload project time entries
-      if (selectedProject) {
-        await loadProjectTimeEntries(selectedProject.id);
-      }
+      await reloadIfOffline();
       
     } catch (error) {
       // Error already handled in apiCall
@@ -193,6 +325,15 @@ export default function App() {
     }
   };
 
+  // Change feed entity names of the entity forms
+  const ENTITY_CHANGE_TYPES = {
+    project: 'project',
+    costCenter: 'cost_center',
+    engineer: 'engineer',
+    concept: 'concept',
+    appUser: 'app_user'
+  };
+
   // Handle entity submission (projects, cost centers, etc.)
   const handleEntitySubmit = async (e) => {
     e.preventDefault();
@@ -205,14 +346,16 @@ export default function App() {
       
       if (editingEntityId) {
         // Update existing entity
-        await apiCall(`${endpoint}/${editingEntityId}`, 'PUT', entityForms[currentEntity]);
+        const result = await apiCall(`${endpoint}/${editingEntityId}`, 'PUT', entityForms[currentEntity]);
+        applyChange({ type: 'upsert', entity: ENTITY_CHANGE_TYPES[currentEntity], entity_id: result.data.id, data: result.data });
         toast.success(`${currentEntity === 'costCenter' ? 'Centro de costos' : 
                         currentEntity === 'engineer' ? 'Ingeniero' : 
                         currentEntity === 'concept' ? 'Concepto' : 
                         currentEntity === 'appUser' ? 'Usuario' : 'Proyecto'} actualizado exitosamente`);
       } else {
         // Create new entity
-        await apiCall(endpoint, 'POST', entityForms[currentEntity]);
+        const result = await apiCall(endpoint, 'POST', entityForms[currentEntity]);
+        applyChange({ type: 'upsert', entity: ENTITY_CHANGE_TYPES[currentEntity], entity_id: result.data.id, data: result.data });
         toast.success(`${currentEntity === 'costCenter' ? 'Centro de costos' : 
                         currentEntity === 'engineer' ? 'Ingeniero' : 
                         currentEntity === 'concept' ? 'Concepto' : 
@@ -234,7 +377,7 @@ export default function App() {
           : { code: '', name: '' }
       });
       
-      await loadData();
+      await reloadIfOffline();
     } catch (error) {
       // Error already handled in apiCall
     } finally {
@@ -247,16 +390,11 @@ export default function App() {
     setLoading(true);
     try {
       await apiCall(`time-entries/${id}`, 'DELETE');
+      applyChange({ type: 'delete', entity: 'time_entry', entity_id: id, data: null });
       toast.success('Registro eliminado exitosamente');
       setDeleteConfirm(null);
       
-      // Reload data
-      await loadData();
-      
-      // If we're in project detail view, also reload project time entries
-      if (selectedProject) {
-        await loadProjectTimeEntries(selectedProject.id);
-      }
+      await reloadIfOffline();
       
     } catch (error) {
       // Error already handled in apiCall
@@ -323,23 +461,32 @@ export default function App() {
     setShowEntityDialog(true);
   };
 
-  // Filter time entries based on current filters
-  const filteredTimeEntries = projectTimeEntries.filter(entry => {
+  // Time entries are filtered by the server; live changes are checked locally
+  // against the same filters to decide whether they belong in the loaded list
+  const matchesTimeEntryFilters = (entry, filters) => {
     const entryDate = entry.date;
-    const startDateMatch = !timeEntryFilters.start_date || entryDate >= timeEntryFilters.start_date;
-    const endDateMatch = !timeEntryFilters.end_date || entryDate <= timeEntryFilters.end_date;
-    const engineerMatch = !timeEntryFilters.engineer_id || entry.engineer_id === timeEntryFilters.engineer_id;
-    const conceptMatch = !timeEntryFilters.concept_id || entry.concept_id === timeEntryFilters.concept_id;
+    const startDateMatch = !filters.start_date || entryDate >= filters.start_date;
+    const endDateMatch = !filters.end_date || entryDate <= filters.end_date;
+    const engineerMatch = !filters.engineer_id || entry.engineer_id === filters.engineer_id;
+    const conceptMatch = !filters.concept_id || entry.concept_id === filters.concept_id;
     
     let postExportMatch = true;
-    if (timeEntryFilters.post_export_status === 'normal') {
+    if (filters.post_export_status === 'normal') {
       postExportMatch = !entry.post_export_adjustment;
-    } else if (timeEntryFilters.post_export_status === 'post_export') {
+    } else if (filters.post_export_status === 'post_export') {
       postExportMatch = entry.post_export_adjustment;
     }
     
     return startDateMatch && endDateMatch && engineerMatch && conceptMatch && postExportMatch;
-  });
+  };
+  
+  const timeEntryQuery = (projectId, filters) => {
+    const params = new URLSearchParams({ project_id: projectId });
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value) params.set(key, value);
+    });
+    return params.toString();
+  };
 
   // Clear time entry filters
   const clearTimeEntryFilters = () => {
@@ -372,23 +519,85 @@ export default function App() {
     });
   };
 
-  // Load project time entries
-  const loadProjectTimeEntries = async (projectId) => {
+  // Load the first page of the project time entries (newest first) with the
+  // totals of the filtered set and of the whole project
+  const timeEntryRequestRef = useRef(0);
+  const timeEntryScrollRef = useRef(null);
+  
+  const loadTimeEntryTotals = async (projectId, filters = timeEntryFiltersRef.current) => {
+    const [filteredRes, projectRes] = await Promise.all([
+      apiCall(`time-entries?${timeEntryQuery(projectId, filters)}&limit=1&include_totals=1`),
+      apiCall(`time-entries?project_id=${projectId}&limit=1&include_totals=1`)
+    ]);
+    setTimeEntryTotals({ filtered: filteredRes.totals, project: projectRes.totals });
+  };
+  
+  const loadProjectTimeEntries = async (projectId, filters = timeEntryFiltersRef.current) => {
+    const request = ++timeEntryRequestRef.current;
     setLoading(true);
     try {
-      const response = await apiCall(`time-entries?project_id=${projectId}`);
+      const [response, projectRes] = await Promise.all([
+        apiCall(`time-entries?${timeEntryQuery(projectId, filters)}&limit=${TIME_ENTRY_PAGE_SIZE}&order=desc&include_totals=1`),
+        apiCall(`time-entries?project_id=${projectId}&limit=1&include_totals=1`)
+      ]);
+      // A newer project or filter selection superseded this request
+      if (request !== timeEntryRequestRef.current) return;
+      
       setProjectTimeEntries(response.data);
+      setTimeEntryPage(response.page);
+      setTimeEntryTotals({ filtered: response.totals, project: projectRes.totals });
+      setTimeEntryScrollTop(0);
+      if (timeEntryScrollRef.current) timeEntryScrollRef.current.scrollTop = 0;
     } catch (error) {
       console.error('Error loading project time entries:', error);
     } finally {
       setLoading(false);
     }
   };
+  
+  const loadMoreTimeEntries = async () => {
+    const project = selectedProjectRef.current;
+    if (!project || !timeEntryPage.has_more || loadingMoreTimeEntries) return;
+    
+    const request = timeEntryRequestRef.current;
+    setLoadingMoreTimeEntries(true);
+    try {
+      const response = await apiCall(
+        `time-entries?${timeEntryQuery(project.id, timeEntryFiltersRef.current)}&limit=${TIME_ENTRY_PAGE_SIZE}&order=desc&cursor=${encodeURIComponent(timeEntryPage.next_cursor)}`
+      );
+      if (request !== timeEntryRequestRef.current) return;
+      
+      setProjectTimeEntries(entries => response.data.reduce((all, entry) => upsertById(all, entry), entries));
+      setTimeEntryPage(response.page);
+    } catch (error) {
+      console.error('Error loading more time entries:', error);
+    } finally {
+      setLoadingMoreTimeEntries(false);
+    }
+  };
+  
+  // Only the rows inside the scroll viewport (plus an overscan margin) are
+  // rendered; the next page is requested when the user nears the end
+  const handleTimeEntryScroll = (e) => {
+    const { scrollTop, clientHeight, scrollHeight } = e.currentTarget;
+    setTimeEntryScrollTop(scrollTop);
+    if (scrollTop + clientHeight >= scrollHeight - TIME_ENTRY_ROW_HEIGHT * TIME_ENTRY_OVERSCAN) {
+      loadMoreTimeEntries();
+    }
+  };
+  
+  const firstVisibleTimeEntry = Math.max(0, Math.floor(timeEntryScrollTop / TIME_ENTRY_ROW_HEIGHT) - TIME_ENTRY_OVERSCAN);
+  const lastVisibleTimeEntry = Math.min(
+    projectTimeEntries.length,
+    Math.ceil((timeEntryScrollTop + TIME_ENTRY_VIEWPORT_HEIGHT) / TIME_ENTRY_ROW_HEIGHT) + TIME_ENTRY_OVERSCAN
+  );
+  const visibleTimeEntries = projectTimeEntries.slice(firstVisibleTimeEntry, lastVisibleTimeEntry);
 
   // Handle project selection
   const handleProjectSelect = (project) => {
     setSelectedProject(project);
-    // Clear time entry filters when selecting a new project
+    // Clear time entry filters when selecting a new project; the entries are
+    // loaded by the effect watching the project and the filters
     setTimeEntryFilters({
       start_date: '',
       end_date: '',
@@ -396,13 +605,13 @@ export default function App() {
       concept_id: '',
       post_export_status: ''
     });
-    loadProjectTimeEntries(project.id);
   };
 
   // Go back to project list
   const handleBackToProjects = () => {
     setSelectedProject(null);
     setProjectTimeEntries([]);
+    setTimeEntryPage({ has_more: false, next_cursor: null });
     // Clear time entry filters when going back
     setTimeEntryFilters({
       start_date: '',
@@ -427,7 +636,7 @@ export default function App() {
       const response = await fetch('/api/export-excel', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(exportFilters)
+        body: JSON.stringify({ ...exportFilters, stream: true })
       });
       
       if (response.ok) {
@@ -448,7 +657,7 @@ export default function App() {
         
         toast.success(`Exportación completada. ${recordCount} registros exportados. Cierre ${closureId} creado.`);
         setShowExportDialog(false);
-        await loadData(); // Reload to show updated closures
+        await reloadIfOffline();
       } else {
         const error = await response.json();
         toast.error(error.message || 'Error en la exportación');
@@ -460,6 +669,43 @@ export default function App() {
     }
   };
 
+  // Export only the changes made since the closure's last revision
+  const handleDeltaExport = async (closure) => {
+    setLoading(true);
+    try {
+      const response = await fetch(`/api/export-closures/${closure.id}/delta-export`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({})
+      });
+      
+      if (response.ok) {
+        const recordCount = response.headers.get('X-Record-Count');
+        const revision = response.headers.get('X-Revision');
+        
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `ajustes_${closure.date_start}_${closure.date_end}_v${revision}.xlsx`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        window.URL.revokeObjectURL(url);
+        
+        toast.success(`Ajustes exportados. ${recordCount} cambios en la revisión v${revision}.`);
+        await reloadIfOffline();
+      } else {
+        const error = await response.json();
+        toast.error(error.message || 'Error en la exportación de ajustes');
+      }
+    } catch (error) {
+      toast.error('Error en la exportación de ajustes: ' + error.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // Handle closure reopen
   const handleReopenClosure = async () => {
     setLoading(true);
@@ -491,7 +737,7 @@ export default function App() {
         toast.success(`Cierre reabierto exitosamente. Estado: ${result.data.status}`);
         setShowReopenDialog(false);
         setSelectedClosure(null);
-        await loadData();
+        await reloadIfOffline();
       } else {
         toast.error(result.message || 'Error al reabrir cierre');
       }
@@ -504,8 +750,43 @@ export default function App() {
 
   useEffect(() => {
     loadData();
+    
+    // After a reconnect, or when the server says events were lost (reset),
+    // the missed changes are unknown: reload once
+    const source = new EventSource('/api/events');
+    let disconnected = false;
+    const reloadAll = () => {
+      loadData();
+      if (selectedProjectRef.current) {
+        loadProjectTimeEntries(selectedProjectRef.current.id);
+      }
+    };
+    source.addEventListener('change', event => applyChange(JSON.parse(event.data)));
+    source.addEventListener('reset', reloadAll);
+    source.onerror = () => {
+      disconnected = true;
+    };
+    source.onopen = () => {
+      if (disconnected) {
+        disconnected = false;
+        reloadAll();
+      }
+    };
+    changeFeedRef.current = source;
+    
+    return () => {
+      source.close();
+      clearTimeout(dashboardRefreshRef.current);
+    };
   }, []);
 
+  useEffect(() => {
+    timeEntryFiltersRef.current = timeEntryFilters;
+    if (selectedProject) {
+      loadProjectTimeEntries(selectedProject.id, timeEntryFilters);
+    }
+  }, [selectedProject, timeEntryFilters]);
+
   const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8'];
 
   return (
@@ -848,7 +1129,7 @@ export default function App() {
                       <div>
                         <CardTitle>Registros de Tiempo</CardTitle>
                         <CardDescription>
-                          {filteredTimeEntries.length} de {projectTimeEntries.length} registro(s) para este proyecto
+                          {timeEntryTotals.filtered.entries} de {timeEntryTotals.project.entries} registro(s) para este proyecto
                         </CardDescription>
                       </div>
                       
@@ -933,15 +1214,20 @@ export default function App() {
                           </div>
                         </div>
                         <div className="text-xs text-muted-foreground">
-                          Mostrando {filteredTimeEntries.reduce((sum, entry) => sum + parseFloat(entry.hours), 0).toFixed(1)}h de {projectTimeEntries.reduce((sum, entry) => sum + parseFloat(entry.hours), 0).toFixed(1)}h totales
+                          Mostrando {timeEntryTotals.filtered.hours.toFixed(1)}h de {timeEntryTotals.project.hours.toFixed(1)}h totales
                         </div>
                       </div>
                     </div>
                   </CardHeader>
                   <CardContent className="p-0">
-                    <div className="overflow-x-auto">
+                    <div
+                      ref={timeEntryScrollRef}
+                      className="overflow-auto"
+                      style={{ maxHeight: TIME_ENTRY_VIEWPORT_HEIGHT }}
+                      onScroll={handleTimeEntryScroll}
+                    >
                       <table className="w-full">
-                        <thead className="border-b bg-muted/50">
+                        <thead className="border-b bg-muted sticky top-0 z-10">
                           <tr>
                             <th className="text-left p-4">Fecha</th>
                             <th className="text-left p-4">Ingeniero</th>
@@ -953,8 +1239,11 @@ export default function App() {
                           </tr>
                         </thead>
                         <tbody>
-                          {filteredTimeEntries.map((entry) => (
-                            <tr key={entry.id} className="border-b hover:bg-muted/50">
+                          {firstVisibleTimeEntry > 0 && (
+                            <tr style={{ height: firstVisibleTimeEntry * TIME_ENTRY_ROW_HEIGHT }} />
+                          )}
+                          {visibleTimeEntries.map((entry) => (
+                            <tr key={entry.id} className="border-b hover:bg-muted/50" style={{ height: TIME_ENTRY_ROW_HEIGHT }}>
                               <td className="p-4">{entry.date}</td>
                               <td className="p-4">
                                 {engineers.find(e => e.id === entry.engineer_id)?.title || 'N/A'}
@@ -997,10 +1286,20 @@ export default function App() {
                               </td>
                             </tr>
                           ))}
+                          {lastVisibleTimeEntry < projectTimeEntries.length && (
+                            <tr style={{ height: (projectTimeEntries.length - lastVisibleTimeEntry) * TIME_ENTRY_ROW_HEIGHT }} />
+                          )}
+                          {loadingMoreTimeEntries && (
+                            <tr>
+                              <td colSpan={7} className="p-4 text-center text-sm text-muted-foreground">
+                                Cargando más registros...
+                              </td>
+                            </tr>
+                          )}
                         </tbody>
                       </table>
                       
-                      {filteredTimeEntries.length === 0 && projectTimeEntries.length > 0 && (
+                      {projectTimeEntries.length === 0 && timeEntryTotals.project.entries > 0 && (
                         <div className="text-center py-8">
                           <p className="text-muted-foreground mb-2">No se encontraron registros con los filtros aplicados</p>
                           <Button variant="outline" size="sm" onClick={clearTimeEntryFilters}>
@@ -1009,7 +1308,7 @@ export default function App() {
                         </div>
                       )}
                       
-                      {projectTimeEntries.length === 0 && (
+                      {timeEntryTotals.project.entries === 0 && (
                         <div className="text-center py-8">
                           <p className="text-muted-foreground mb-4">No hay registros de tiempo para este proyecto</p>
                           <Button onClick={() => {
@@ -1386,6 +1685,15 @@ export default function App() {
                                 Reabrir
                               </Button>
                             )}
+                            {closure.status === 'PARCIALMENTE_REABIERTO' && (
+                              <Button
+                                variant="outline"
+                                size="sm"
+                                onClick={() => handleDeltaExport(closure)}
+                              >
+                                Exportar ajustes
+                              </Button>
+                            )}
                           </td>
                         </tr>
                       ))}
@@ -1934,6 +2242,15 @@ export default function App() {
               </Select>
             </div>
 
+            <label className="flex items-center space-x-2">
+              <input
+                type="checkbox"
+                checked={exportFilters.summary_sheets}
+                onChange={(e) => setExportFilters({...exportFilters, summary_sheets: e.target.checked})}
+              />
+              <span>Incluir hojas de resumen (proyecto, ingeniero, centro de costo y concepto)</span>
+            </label>
+
             <div className="flex justify-end gap-2">
               <Button type="button" variant="outline" onClick={() => setShowExportDialog(false)}>
                 Cancelar
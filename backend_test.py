@@ -5,18 +5,86 @@ Testing the newly implemented Export Closure System with all enhanced features.
 """
 
 import requests
+import argparse
+import io
 import json
+import math
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
 import uuid
+import zipfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import sys
 
-# Configuration
-BASE_URL = "https://nextrack-app.preview.emergentagent.com/api"
+from ziklo_client import ZikloClient
+
+# Configuration (override with BASE_URL or --base-url, e.g. http://localhost:3000/api)
+BASE_URL = os.environ.get("BASE_URL", "https://nextrack-app.preview.emergentagent.com/api")
 HEADERS = {"Content-Type": "application/json"}
 
 class ExportClosureSystemTester:
-    def __init__(self):
+    # Independent test groups: each group runs on its own seeded data, in order,
+    # so groups can be spread over parallel workers (see HermeticTestRunner)
+    TEST_GROUPS = {
+        "closure": ["test_excel_export_with_closure_creation", "test_idempotency", "test_enhanced_closure_blocking"],
+        "reopen_total": ["test_excel_export_with_closure_creation", "test_closure_reopening_total"],
+        "reopen_partial": ["test_partial_closure_reopening"],
+        "closure_scope": ["test_enhanced_closure_check_logic"],
+        "exports": ["test_streaming_export", "test_export_jobs", "test_summary_sheets"],
+        "entries": ["test_bulk_time_entries", "test_concurrent_daily_limit", "test_time_entry_filters",
+                    "test_idempotency_key"],
+        "delta": ["test_delta_export"],
+        "platform": ["test_change_feed", "test_metrics", "test_python_client", "test_admission_control",
+                     "test_ndjson_streaming"],
+        "archival": ["test_month_archival"]
+    }
+    
+    # Tests that close and archive whole months for every project, so they only
+    # run against a server with its own database (hermetic mode)
+    ISOLATED_TESTS = {"test_month_archival"}
+    
+    # Month archived by test_month_archival; no other test or load seed uses it
+    ARCHIVAL_MONTH = "2011-03"
+    
+    # Serial order of a full run against a single shared database. The filter
+    # test runs first, while December still holds only the seeded entries.
+    TEST_ORDER = [
+        "test_time_entry_filters",
+        "test_excel_export_with_closure_creation",
+        "test_idempotency",
+        "test_enhanced_closure_blocking",
+        "test_closure_reopening_total",
+        "test_partial_closure_reopening",
+        "test_enhanced_closure_check_logic",
+        "test_streaming_export",
+        "test_bulk_time_entries",
+        "test_export_jobs",
+        "test_concurrent_daily_limit",
+        "test_delta_export",
+        "test_change_feed",
+        "test_metrics",
+        "test_month_archival",
+        "test_summary_sheets",
+        "test_python_client",
+        "test_idempotency_key",
+        "test_admission_control",
+        "test_ndjson_streaming"
+    ]
+    
+    def __init__(self, isolated=False):
+        # Suffix for unique codes and emails, so runs against a shared database never collide
+        self.run_id = uuid.uuid4().hex[:8]
+        self.isolated = isolated
+        self.results = []
+        self.timings = []
         self.test_data = {}
         self.created_entities = {
             'users': [],
@@ -31,6 +99,7 @@ class ExportClosureSystemTester:
     def log_test(self, test_name, status, message=""):
         """Log test results"""
         status_symbol = "✅" if status else "❌"
+        self.results.append({"test": test_name, "passed": bool(status), "message": message})
         print(f"{status_symbol} {test_name}: {message}")
         
     def setup_test_data(self):
@@ -41,7 +110,7 @@ class ExportClosureSystemTester:
             # Create test user
             user_data = {
                 "name": "Export Test User",
-                "email": "export.test@ziklo.com",
+                "email": f"export.test.{self.run_id}@ziklo.com",
                 "status": "active"
             }
             response = requests.post(f"{BASE_URL}/users", json=user_data, headers=HEADERS)
@@ -56,7 +125,7 @@ class ExportClosureSystemTester:
                 
             # Create test cost center
             cc_data = {
-                "code": "CC-EXPORT-001",
+                "code": f"CC-EXPORT-{self.run_id}",
                 "name": "Export Test Cost Center",
                 "status": "active"
             }
@@ -72,7 +141,7 @@ class ExportClosureSystemTester:
                 
             # Create test project
             project_data = {
-                "code": "PROJ-EXPORT-001",
+                "code": f"PROJ-EXPORT-{self.run_id}",
                 "name": "Export Test Project",
                 "client": "Test Client",
                 "status": "active",
@@ -92,7 +161,7 @@ class ExportClosureSystemTester:
             # Create test engineer
             engineer_data = {
                 "user_id": self.test_data['user_id'],
-                "document_number": "12345678",
+                "document_number": str(int(self.run_id, 16) % 10**8).zfill(8),
                 "title": "Export Test Engineer",
                 "status": "active"
             }
@@ -108,7 +177,7 @@ class ExportClosureSystemTester:
                 
             # Create test concept
             concept_data = {
-                "code": "CONC-EXPORT-001",
+                "code": f"CONC-EXPORT-{self.run_id}",
                 "name": "Export Test Concept",
                 "status": "active"
             }
@@ -155,6 +224,7 @@ class ExportClosureSystemTester:
                 if response.status_code == 200:
                     entry = response.json()['data']
                     self.created_entities['time_entries'].append(entry['id'])
+                    self.test_data.setdefault('seeded_entries', []).append(entry)
                     self.log_test(f"Create Time Entry {date}", True, f"Entry ID: {entry['id']}")
                 else:
                     self.log_test(f"Create Time Entry {date}", False, f"Status: {response.status_code}")
@@ -229,6 +299,10 @@ class ExportClosureSystemTester:
                 "user_id": self.test_data['user_id']
             }
             
+            previous = requests.get(f"{BASE_URL}/export-closures", headers=HEADERS).json()['data']
+            previous_file_id = next((c['export_file_id'] for c in previous
+                                     if c['id'] == self.test_data['closure_id']), None)
+            
             response = requests.post(f"{BASE_URL}/export-excel", json=export_data, headers=HEADERS)
             
             if response.status_code == 200:
@@ -249,6 +323,11 @@ class ExportClosureSystemTester:
                         else:
                             self.log_test("Idempotency - Revision Increment", False, 
                                         f"Revision not incremented: {updated_closure.get('revision', 1)}")
+                        
+                        # Unchanged rows: the stored file is served again
+                        reused = updated_closure and updated_closure.get('export_file_id') == previous_file_id
+                        self.log_test("Idempotency - Artifact Reused", bool(reused),
+                                    f"export_file_id: {updated_closure and updated_closure.get('export_file_id')}")
                 else:
                     self.log_test("Idempotency - Same Closure ID", False, 
                                 f"Different closure ID: {closure_id}")
@@ -527,11 +606,12 @@ class ExportClosureSystemTester:
                     
                     # Check if closures have scope and exceptions data
                     for closure in closures[:2]:  # Check first 2 closures
-                        has_scope = 'scope' in closure and len(closure['scope']) > 0
+                        scope = closure.get('scope') or {}
+                        has_scope = set(scope) == {'project_ids', 'cost_center_ids', 'engineer_ids'}
                         has_exceptions = 'exceptions' in closure
                         
                         self.log_test(f"Closure {closure['id'][:8]}... - Scope Data", has_scope, 
-                                    f"Scope entries: {len(closure.get('scope', []))}")
+                                    f"Scope: {scope}")
                         self.log_test(f"Closure {closure['id'][:8]}... - Exceptions Data", has_exceptions, 
                                     f"Exceptions: {len(closure.get('exceptions', []))}")
                 else:
@@ -566,6 +646,583 @@ class ExportClosureSystemTester:
         except Exception as e:
             self.log_test("Enhanced Closure Check Logic", False, f"Exception: {str(e)}")
             
+    def test_streaming_export(self):
+        """Test 7: Streaming XLSX and CSV exports"""
+        print("\n🧪 TEST 7: Streaming Export")
+        
+        try:
+            export_data = {
+                "start_date": "2024-10-01",
+                "end_date": "2024-10-31",
+                "project_ids": [self.test_data['project_id']],
+                "user_id": self.test_data['user_id'],
+                "stream": True
+            }
+            
+            response = requests.post(f"{BASE_URL}/export-excel", json=export_data, headers=HEADERS, stream=True)
+            
+            if response.status_code == 200:
+                closure_id = response.headers.get('X-Closure-Id')
+                record_count = response.headers.get('X-Record-Count')
+                self.created_entities['export_closures'].append(closure_id)
+                
+                content = b"".join(response.iter_content(chunk_size=65536))
+                if content[:2] == b"PK" and record_count is not None:
+                    self.log_test("Streaming Export - XLSX", True, 
+                                f"Closure ID: {closure_id}, Records: {record_count}, Size: {len(content)} bytes")
+                else:
+                    self.log_test("Streaming Export - XLSX", False, "Response is not a ZIP/XLSX file")
+            else:
+                self.log_test("Streaming Export - XLSX", False, f"Status: {response.status_code}")
+                
+            csv_export_data = dict(export_data, format="csv")
+            response = requests.post(f"{BASE_URL}/export-excel", json=csv_export_data, headers=HEADERS, stream=True)
+            
+            if response.status_code == 200:
+                lines = [line for line in response.iter_lines() if line]
+                record_count = int(response.headers.get('X-Record-Count', '-1'))
+                
+                if lines and len(lines) - 1 == record_count:
+                    self.log_test("Streaming Export - CSV", True, f"Rows: {record_count}")
+                else:
+                    self.log_test("Streaming Export - CSV", False, 
+                                f"Expected {record_count} rows, got {len(lines) - 1}")
+            else:
+                self.log_test("Streaming Export - CSV", False, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Streaming Export", False, f"Exception: {str(e)}")
+            
+    def test_bulk_time_entries(self):
+        """Test 8: Bulk time entry ingestion"""
+        print("\n🧪 TEST 8: Bulk Time Entry Ingestion")
+        
+        try:
+            base_entry = {
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "created_by": self.test_data['user_id']
+            }
+            entries = [
+                dict(base_entry, date="2024-09-02", hours=4.0, notes="Bulk entry 1"),
+                dict(base_entry, date="2024-09-02", hours=4.0, notes="Bulk entry 2"),
+                dict(base_entry, date="2024-09-02", hours=1.0, notes="Exceeds daily limit"),
+                dict(base_entry, date="not-a-date", hours=1.0, notes="Invalid date")
+            ]
+            
+            response = requests.post(f"{BASE_URL}/time-entries/bulk", json={"entries": entries}, headers=HEADERS)
+            
+            if response.status_code == 200:
+                result = response.json()['data']
+                statuses = [row['success'] for row in result['results']]
+                
+                for row in result['results']:
+                    if row['success']:
+                        self.created_entities['time_entries'].append(row['data']['id'])
+                
+                if statuses == [True, True, False, False]:
+                    self.log_test("Bulk Ingestion - Per-row Results", True, 
+                                f"Inserted: {result['inserted']}, Rejected: {result['rejected']}")
+                else:
+                    self.log_test("Bulk Ingestion - Per-row Results", False, f"Unexpected results: {statuses}")
+            else:
+                self.log_test("Bulk Ingestion", False, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Bulk Ingestion", False, f"Exception: {str(e)}")
+            
+    def test_export_jobs(self):
+        """Test 9: Asynchronous export jobs and stored artifacts"""
+        print("\n🧪 TEST 9: Asynchronous Export Jobs")
+        
+        try:
+            job_data = {
+                "start_date": "2024-08-01",
+                "end_date": "2024-08-31",
+                "project_ids": [self.test_data['project_id']],
+                "user_id": self.test_data['user_id']
+            }
+            
+            response = requests.post(f"{BASE_URL}/export-jobs", json=job_data, headers=HEADERS)
+            if response.status_code != 202:
+                self.log_test("Export Job - Enqueue", False, f"Status: {response.status_code}")
+                return
+                
+            job = response.json()['data']
+            self.log_test("Export Job - Enqueue", True, f"Job ID: {job['id']}")
+            
+            deadline = time.time() + 60
+            while job['status'] in ('EN_COLA', 'EN_PROCESO') and time.time() < deadline:
+                time.sleep(1)
+                job = requests.get(f"{BASE_URL}/export-jobs/{job['id']}", headers=HEADERS).json()['data']
+                
+            if job['status'] != 'COMPLETADO':
+                self.log_test("Export Job - Completion", False, f"Final status: {job['status']}")
+                return
+                
+            self.created_entities['export_closures'].append(job['closure_id'])
+            self.log_test("Export Job - Completion", True, f"Records: {job['record_count']}")
+            
+            download = requests.get(f"{BASE_URL}/export-jobs/{job['id']}/download", headers=HEADERS)
+            closure_download = requests.get(f"{BASE_URL}/export-closures/{job['closure_id']}/download", headers=HEADERS)
+            
+            if download.status_code == 200 and closure_download.status_code == 200 and \
+                    download.content == closure_download.content:
+                self.log_test("Export Job - Stored Artifact", True, f"File size: {len(download.content)} bytes")
+            else:
+                self.log_test("Export Job - Stored Artifact", False, 
+                            f"Statuses: {download.status_code}, {closure_download.status_code}")
+                
+        except Exception as e:
+            self.log_test("Export Jobs", False, f"Exception: {str(e)}")
+            
+    def test_concurrent_daily_limit(self):
+        """Test 10: Concurrent submissions cannot exceed the daily hour limit"""
+        print("\n🧪 TEST 10: Concurrent Daily Hour Limit")
+        
+        try:
+            entry = {
+                "date": "2024-09-03",
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "hours": 3.0,
+                "notes": "Concurrent entry",
+                "created_by": self.test_data['user_id']
+            }
+            
+            # Six concurrent 3h entries: at most two fit in an 8h day
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                responses = list(pool.map(
+                    lambda _: requests.post(f"{BASE_URL}/time-entries", json=entry, headers=HEADERS),
+                    range(6)
+                ))
+                
+            accepted = [r.json()['data'] for r in responses if r.status_code == 200]
+            self.created_entities['time_entries'].extend(e['id'] for e in accepted)
+            
+            self.log_test("Daily Limit - Concurrent Reservations", len(accepted) == 2,
+                        f"Accepted: {len(accepted)}, statuses: {[r.status_code for r in responses]}")
+            
+            # Deleting an entry gives its hours back
+            if accepted:
+                requests.delete(f"{BASE_URL}/time-entries/{accepted[0]['id']}", headers=HEADERS)
+                self.created_entities['time_entries'].remove(accepted[0]['id'])
+                retry = requests.post(f"{BASE_URL}/time-entries", json=entry, headers=HEADERS)
+                if retry.status_code == 200:
+                    self.created_entities['time_entries'].append(retry.json()['data']['id'])
+                self.log_test("Daily Limit - Release on Delete", retry.status_code == 200,
+                            f"Status: {retry.status_code}")
+                
+            # Zero or negative hours would lower the day's total in the ledger
+            statuses = [requests.post(f"{BASE_URL}/time-entries", json=dict(entry, hours=hours), headers=HEADERS).status_code
+                        for hours in (0, -3.0)]
+            if len(accepted) > 1:
+                statuses.append(requests.put(f"{BASE_URL}/time-entries/{accepted[1]['id']}",
+                                             json=dict(entry, hours=-3.0), headers=HEADERS).status_code)
+            self.log_test("Daily Limit - Non-positive Hours Rejected", set(statuses) == {400}, 
+                        f"Statuses: {statuses}")
+                
+        except Exception as e:
+            self.log_test("Concurrent Daily Limit", False, f"Exception: {str(e)}")
+            
+    def test_delta_export(self):
+        """Test 11: Delta export of post-closure adjustments"""
+        print("\n🧪 TEST 11: Delta Export")
+        
+        try:
+            entry = {
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "created_by": self.test_data['user_id']
+            }
+            period = {"start_date": "2024-10-01", "end_date": "2024-10-31",
+                      "project_ids": [self.test_data['project_id']]}
+            
+            exported = requests.post(f"{BASE_URL}/time-entries", 
+                                   json=dict(entry, date="2024-10-07", hours=4.0), headers=HEADERS).json()['data']
+            
+            export = requests.post(f"{BASE_URL}/export-excel",
+                                 json=dict(period, stream=True, user_id=self.test_data['user_id']), headers=HEADERS)
+            closure_id = export.headers.get('X-Closure-Id')
+            self.created_entities['export_closures'].append(closure_id)
+            
+            requests.post(f"{BASE_URL}/export-closures/{closure_id}/reopen", json={
+                "type": "partial", "user_id": self.test_data['user_id'], "partial_filters": period
+            }, headers=HEADERS)
+            
+            # One new entry and one deleted entry inside the exception
+            added = requests.post(f"{BASE_URL}/time-entries",
+                                json=dict(entry, date="2024-10-08", hours=2.0), headers=HEADERS).json()['data']
+            self.created_entities['time_entries'].append(added['id'])
+            requests.delete(f"{BASE_URL}/time-entries/{exported['id']}", headers=HEADERS)
+            
+            response = requests.post(f"{BASE_URL}/export-closures/{closure_id}/delta-export",
+                                   json={"format": "csv", "user_id": self.test_data['user_id']}, headers=HEADERS)
+            if response.status_code != 200:
+                self.log_test("Delta Export", False, f"Status: {response.status_code}")
+                return
+                
+            lines = response.content.decode('utf-8-sig').strip().split('\r\n')
+            change_types = sorted(line.split(',')[0] for line in lines[1:])
+            self.log_test("Delta Export - Changed Rows Only", change_types == ['ALTA', 'BAJA'],
+                        f"Change types: {change_types}")
+            
+            revisions = requests.get(f"{BASE_URL}/export-closures/{closure_id}/revisions", headers=HEADERS).json()['data']
+            latest = revisions[0] if revisions else {}
+            self.log_test("Delta Export - Recorded Revision", 
+                        latest.get('type') == 'DELTA' and str(latest.get('revision')) == response.headers.get('X-Revision'),
+                        f"Revisions: {[(r['revision'], r['type']) for r in revisions]}")
+                
+        except Exception as e:
+            self.log_test("Delta Export", False, f"Exception: {str(e)}")
+            
+    def test_change_feed(self):
+        """Test 12: Live change feed over Server-Sent Events"""
+        print("\n🧪 TEST 12: Live Change Feed")
+        
+        try:
+            received = []
+            connected = threading.Event()
+            
+            def listen():
+                with requests.get(f"{BASE_URL}/events", stream=True, timeout=30) as response:
+                    connected.set()
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith('data: '):
+                            received.append(json.loads(line[len('data: '):]))
+                            if any(e['entity'] == 'concept' for e in received):
+                                return
+                                
+            listener = threading.Thread(target=listen, daemon=True)
+            listener.start()
+            connected.wait(10)
+            time.sleep(1)
+            
+            concept = requests.post(f"{BASE_URL}/concepts", json={
+                "code": f"CONC-FEED-{uuid.uuid4().hex[:6]}", "name": "Change Feed Concept", "status": "active"
+            }, headers=HEADERS).json()['data']
+            listener.join(15)
+            
+            event = next((e for e in received if e['entity'] == 'concept'), None)
+            self.log_test("Change Feed - Upsert Event", bool(event) and event['entity_id'] == concept['id'] 
+                        and event['type'] == 'upsert', f"Events received: {len(received)}")
+                
+        except Exception as e:
+            self.log_test("Change Feed", False, f"Exception: {str(e)}")
+            
+    def test_metrics(self):
+        """Test 13: Server-Timing headers and the Prometheus metrics endpoint"""
+        print("\n🧪 TEST 13: Metrics")
+        
+        try:
+            response = requests.get(f"{BASE_URL}/export-closures", headers=HEADERS)
+            timing = response.headers.get('Server-Timing', '')
+            self.log_test("Metrics - Server-Timing Header", 'total;dur=' in timing and 'mongo;dur=' in timing,
+                        f"Server-Timing: {timing}")
+            
+            metrics = requests.get(f"{BASE_URL}/metrics").text
+            expected = [
+                'ziklo_http_request_duration_seconds_bucket{method="GET",route="/export-closures"',
+                'ziklo_mongo_command_duration_seconds_count{collection="export_closures",operation="find"'
+            ]
+            missing = [name for name in expected if name not in metrics]
+            self.log_test("Metrics - Prometheus Endpoint", not missing, f"Missing: {missing}")
+                
+        except Exception as e:
+            self.log_test("Metrics", False, f"Exception: {str(e)}")
+            
+    def test_month_archival(self):
+        """Test 14: Archival of a fully closed month and rehydration on reopen"""
+        print("\n🧪 TEST 14: Month Archival")
+        
+        month = self.ARCHIVAL_MONTH
+        closure_id = None
+        reopened = False
+        try:
+            entry = requests.post(f"{BASE_URL}/time-entries", json={
+                "date": f"{month}-16",
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "hours": 2.0,
+                "notes": "Archival entry",
+                "created_by": self.test_data['user_id']
+            }, headers=HEADERS).json()['data']
+            self.created_entities['time_entries'].append(entry['id'])
+            
+            # A full-scope export closes the whole month
+            export = requests.post(f"{BASE_URL}/export-excel", json={
+                "start_date": f"{month}-01", "end_date": f"{month}-31",
+                "stream": True, "user_id": self.test_data['user_id']
+            }, headers=HEADERS)
+            closure_id = export.headers.get('X-Closure-Id')
+            self.created_entities['export_closures'].append(closure_id)
+            
+            result = requests.post(f"{BASE_URL}/maintenance/archive-months",
+                                 json={"months": [month]}, headers=HEADERS).json()['data']
+            self.log_test("Archival - Month Archived", bool(result) and result[0]['archived'], f"Result: {result}")
+            
+            listed = requests.get(f"{BASE_URL}/time-entries?start_date={month}-01&end_date={month}-31",
+                                headers=HEADERS).json()['data']
+            self.log_test("Archival - Union in Listings", any(e['id'] == entry['id'] for e in listed),
+                        f"Entries listed: {len(listed)}")
+            
+            requests.post(f"{BASE_URL}/export-closures/{closure_id}/reopen",
+                        json={"type": "total", "user_id": self.test_data['user_id']}, headers=HEADERS)
+            reopened = True
+            archives = requests.get(f"{BASE_URL}/archives", headers=HEADERS).json()['data']
+            self.log_test("Archival - Rehydrated on Reopen", not any(a['month'] == month for a in archives),
+                        f"Archived months: {[a['month'] for a in archives]}")
+                
+        except Exception as e:
+            self.log_test("Month Archival", False, f"Exception: {str(e)}")
+        finally:
+            # Never leave the month closed or archived
+            if closure_id and not reopened:
+                requests.post(f"{BASE_URL}/export-closures/{closure_id}/reopen",
+                            json={"type": "total", "user_id": self.test_data['user_id']}, headers=HEADERS)
+            
+    def test_summary_sheets(self):
+        """Test 15: Summary sheets in the export workbook"""
+        print("\n🧪 TEST 15: Summary Sheets")
+        
+        try:
+            export_data = {
+                "start_date": "2024-12-01",
+                "end_date": "2024-12-31",
+                "project_ids": [self.test_data['project_id']],
+                "user_id": self.test_data['user_id'],
+                "stream": True,
+                "summary_sheets": True
+            }
+            
+            response = requests.post(f"{BASE_URL}/export-excel", json=export_data, headers=HEADERS)
+            if response.status_code == 200:
+                with zipfile.ZipFile(io.BytesIO(response.content)) as workbook:
+                    sheets = [name for name in workbook.namelist() if name.startswith('xl/worksheets/')]
+                self.log_test("Summary Sheets - Workbook Sheets", len(sheets) == 5, f"Sheets: {sheets}")
+            else:
+                self.log_test("Summary Sheets - Workbook Sheets", False, f"Status: {response.status_code}")
+                
+            response = requests.post(f"{BASE_URL}/export-excel", json=dict(export_data, format="csv"), headers=HEADERS)
+            self.log_test("Summary Sheets - Rejected for CSV", response.status_code == 400, 
+                        f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Summary Sheets", False, f"Exception: {str(e)}")
+            
+    def test_time_entry_filters(self):
+        """Test 16: Server-side time entry filters and totals"""
+        print("\n🧪 TEST 16: Time Entry Filters and Totals")
+        
+        try:
+            seeded = self.test_data.get('seeded_entries', [])
+            params = {
+                "project_id": self.test_data['project_id'],
+                "start_date": "2024-12-01",
+                "end_date": "2024-12-31",
+                "concept_id": self.test_data['concept_id'],
+                "post_export_status": "normal",
+                "include_totals": "1",
+                "limit": "1"
+            }
+            response = requests.get(f"{BASE_URL}/time-entries", params=params, headers=HEADERS)
+            if response.status_code == 200:
+                result = response.json()
+                totals = result.get('totals', {})
+                entries = result.get('data', [])
+                expected = {"entries": len(seeded), "hours": sum(entry['hours'] for entry in seeded)}
+                self.log_test("Time Entry Filters - Filtered Page", 
+                            len(entries) == 1 and entries[0]['id'] in {entry['id'] for entry in seeded}, 
+                            f"Returned: {[entry['date'] for entry in entries]}")
+                self.log_test("Time Entry Filters - Totals Beyond Page", totals == expected, 
+                            f"Totals: {totals}, Expected: {expected}")
+            else:
+                self.log_test("Time Entry Filters", False, f"Status: {response.status_code}")
+                
+            response = requests.get(f"{BASE_URL}/time-entries", params=dict(params, post_export_status="post_export"), 
+                                  headers=HEADERS)
+            totals = response.json().get('totals', {}) if response.status_code == 200 else {}
+            self.log_test("Time Entry Filters - No Post-Export Entries", totals == {"entries": 0, "hours": 0}, 
+                        f"Totals: {totals}")
+            
+            # Post-export case: close June, reopen part of it and add an adjustment
+            entry = {
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "created_by": self.test_data['user_id']
+            }
+            period = {"start_date": "2024-06-01", "end_date": "2024-06-30",
+                      "project_ids": [self.test_data['project_id']]}
+            
+            exported = requests.post(f"{BASE_URL}/time-entries",
+                                   json=dict(entry, date="2024-06-03", hours=4.0), headers=HEADERS).json()['data']
+            self.created_entities['time_entries'].append(exported['id'])
+            export = requests.post(f"{BASE_URL}/export-excel",
+                                 json=dict(period, stream=True, user_id=self.test_data['user_id']), headers=HEADERS)
+            closure_id = export.headers.get('X-Closure-Id')
+            self.created_entities['export_closures'].append(closure_id)
+            requests.post(f"{BASE_URL}/export-closures/{closure_id}/reopen", json={
+                "type": "partial", "user_id": self.test_data['user_id'],
+                "partial_filters": dict(period, start_date="2024-06-10", end_date="2024-06-20")
+            }, headers=HEADERS)
+            adjustment = requests.post(f"{BASE_URL}/time-entries",
+                                     json=dict(entry, date="2024-06-12", hours=1.5), headers=HEADERS).json()['data']
+            self.created_entities['time_entries'].append(adjustment['id'])
+            
+            june = dict(params, start_date="2024-06-01", end_date="2024-06-30", limit="10")
+            for status, expected_entry, hours in (("post_export", adjustment, 1.5), ("normal", exported, 4.0)):
+                response = requests.get(f"{BASE_URL}/time-entries", params=dict(june, post_export_status=status),
+                                      headers=HEADERS)
+                result = response.json() if response.status_code == 200 else {}
+                ids = [row['id'] for row in result.get('data', [])]
+                totals = result.get('totals', {})
+                self.log_test(f"Time Entry Filters - {status}", 
+                            ids == [expected_entry['id']] and totals == {"entries": 1, "hours": hours}, 
+                            f"Status: {response.status_code}, Ids: {len(ids)}, Totals: {totals}")
+                
+        except Exception as e:
+            self.log_test("Time Entry Filters", False, f"Exception: {str(e)}")
+            
+    def test_python_client(self):
+        """Test 17: Pooled Python client pagination and chunked export download"""
+        print("\n🧪 TEST 17: Python Client")
+        
+        try:
+            with ZikloClient(BASE_URL) as client:
+                entries = list(client.iter_time_entries(project_id=self.test_data['project_id'], page_size=2))
+                totals = client.time_entry_totals(project_id=self.test_data['project_id'])
+                self.log_test("Python Client - Lazy Pagination", len(entries) == totals['entries'], 
+                            f"Iterated: {len(entries)}, Totals: {totals['entries']}")
+                
+                with tempfile.TemporaryDirectory() as directory:
+                    download = client.download_export(directory, "2024-12-01", "2024-12-31",
+                                                      user_id=self.test_data['user_id'],
+                                                      project_ids=[self.test_data['project_id']])
+                    written = os.path.getsize(download.path)
+                self.log_test("Python Client - Export Download", 
+                            download.closure_id is not None and written == download.bytes_written > 0, 
+                            f"File: {os.path.basename(download.path)}, Bytes: {written}")
+                
+        except Exception as e:
+            self.log_test("Python Client", False, f"Exception: {str(e)}")
+            
+    def test_idempotency_key(self):
+        """Test 18: Retried POSTs with an Idempotency-Key run once"""
+        print("\n🧪 TEST 18: Idempotency Keys")
+        
+        try:
+            entry = {
+                "date": "2024-08-05",
+                "project_id": self.test_data['project_id'],
+                "cost_center_id": self.test_data['cost_center_id'],
+                "engineer_id": self.test_data['engineer_id'],
+                "concept_id": self.test_data['concept_id'],
+                "hours": 3.0,
+                "created_by": self.test_data['user_id']
+            }
+            headers = dict(HEADERS, **{"Idempotency-Key": str(uuid.uuid4())})
+            
+            first = requests.post(f"{BASE_URL}/time-entries", json=entry, headers=headers)
+            retry = requests.post(f"{BASE_URL}/time-entries", json=entry, headers=headers)
+            same_entry = (first.status_code == 200 and retry.status_code == 200
+                          and first.json()['data']['id'] == retry.json()['data']['id'])
+            self.log_test("Idempotency Key - Replayed Response", 
+                        same_entry and retry.headers.get('Idempotent-Replayed') == 'true', 
+                        f"Status: {first.status_code}/{retry.status_code}")
+            
+            totals = requests.get(f"{BASE_URL}/time-entries", params={
+                "project_id": self.test_data['project_id'], "start_date": "2024-08-05", "end_date": "2024-08-05",
+                "include_totals": "1", "limit": "1"
+            }, headers=HEADERS).json()['totals']
+            self.log_test("Idempotency Key - Single Entry", totals['entries'] == 1, f"Totals: {totals}")
+            
+            response = requests.post(f"{BASE_URL}/time-entries", json=dict(entry, hours=2.0), headers=headers)
+            self.log_test("Idempotency Key - Different Body Rejected", response.status_code == 422, 
+                        f"Status: {response.status_code}")
+            
+        except Exception as e:
+            self.log_test("Idempotency Keys", False, f"Exception: {str(e)}")
+            
+    def test_admission_control(self):
+        """Test 19: Admission control of concurrent expensive requests"""
+        print("\n🧪 TEST 19: Admission Control")
+        
+        try:
+            stats = requests.get(f"{BASE_URL}/admission/stats", headers=HEADERS).json()['data']
+            rejected_before = stats['rejected_user_limit'] + stats['rejected_queue_full'] + stats['rejected_timeout']
+            # Several times the per-user cap, released together, so requests of
+            # the same user overlap and some exceed the cap
+            burst = stats['max_per_user'] * 5
+            user_headers = dict(HEADERS, **{"X-User-Id": f"admission-{self.run_id}"})
+            
+            throttled, statuses = [], []
+            for _ in range(5):
+                barrier = threading.Barrier(burst)
+                
+                def detailed_closures(_):
+                    barrier.wait()
+                    return requests.get(f"{BASE_URL}/export-closures-detailed", headers=user_headers)
+                
+                with ThreadPoolExecutor(max_workers=burst) as pool:
+                    responses = list(pool.map(detailed_closures, range(burst)))
+                statuses.extend(response.status_code for response in responses)
+                throttled.extend(response for response in responses if response.status_code in (429, 503))
+                if throttled:
+                    break
+                    
+            stats = requests.get(f"{BASE_URL}/admission/stats", headers=HEADERS).json()['data']
+            rejected = stats['rejected_user_limit'] + stats['rejected_queue_full'] + stats['rejected_timeout']
+            self.log_test("Admission Control - Burst Throttled", 
+                        set(statuses) <= {200, 429, 503} and len(throttled) > 0
+                        and all(r.headers.get('Retry-After') for r in throttled)
+                        and rejected - rejected_before >= len(throttled), 
+                        f"Statuses: {statuses}, Rejections: {rejected - rejected_before}")
+            
+            metrics = requests.get(f"{BASE_URL}/metrics").text
+            self.log_test("Admission Control - Slots Released", 
+                        stats['active'] == 0 and 'ziklo_admission_queued' in metrics, f"Stats: {stats}")
+            
+        except Exception as e:
+            self.log_test("Admission Control", False, f"Exception: {str(e)}")
+            
+    def test_ndjson_streaming(self):
+        """Test 20: NDJSON streaming mode with negotiated compression"""
+        print("\n🧪 TEST 20: NDJSON Streaming")
+        
+        try:
+            params = {"project_id": self.test_data['project_id']}
+            response = requests.get(f"{BASE_URL}/time-entries", params=params, headers={
+                "Accept": "application/x-ndjson",
+                "Accept-Encoding": "gzip"
+            }, stream=True)
+            entries = [json.loads(line) for line in response.iter_lines() if line]
+            totals = requests.get(f"{BASE_URL}/time-entries", params=dict(params, include_totals="1", limit="1"),
+                                  headers=HEADERS).json()['totals']
+            self.log_test("NDJSON Streaming - Time Entries", 
+                        response.headers.get('Content-Type', '').startswith('application/x-ndjson')
+                        and response.headers.get('Content-Encoding') == 'gzip'
+                        and len(entries) == totals['entries'], 
+                        f"Lines: {len(entries)}, Totals: {totals['entries']}")
+            
+            response = requests.get(f"{BASE_URL}/export-closures-detailed", headers={"Accept": "application/x-ndjson"})
+            closures = [json.loads(line) for line in response.iter_lines() if line]
+            self.log_test("NDJSON Streaming - Detailed Closures", 
+                        response.status_code == 200 and all('scope' in closure for closure in closures), 
+                        f"Closures: {len(closures)}")
+            
+        except Exception as e:
+            self.log_test("NDJSON Streaming", False, f"Exception: {str(e)}")
+            
     def cleanup_test_data(self):
         """Clean up created test data"""
         print("\n🧹 Cleaning up test data...")
@@ -577,11 +1234,32 @@ class ExportClosureSystemTester:
             if ids:
                 print(f"  {entity_type}: {len(ids)} items")
                 
-    def run_all_tests(self):
-        """Run all export closure system tests"""
+    def run_timed(self, name):
+        """Run one test method and record its wall time"""
+        started = time.perf_counter()
+        getattr(self, name)()
+        self.timings.append({"test": name, "seconds": round(time.perf_counter() - started, 3)})
+        
+    def print_timings(self):
+        print("\n⏱️ Per-test timing:")
+        for timing in self.timings:
+            print(f"  {timing['seconds']:>8.3f}s  {timing['test']}")
+            
+    def run_all_tests(self, groups=None):
+        """Run all export closure system tests, or only the given TEST_GROUPS"""
         print("🚀 Starting Export Closure System Comprehensive Testing")
         print("=" * 60)
         
+        if groups:
+            tests = [name for group in groups for name in self.TEST_GROUPS[group]]
+        else:
+            tests = self.TEST_ORDER
+        if not self.isolated:
+            skipped = [name for name in tests if name in self.ISOLATED_TESTS]
+            if skipped:
+                print(f"ℹ️ Skipping {', '.join(skipped)}: shared database (run in hermetic mode)")
+            tests = [name for name in tests if name not in self.ISOLATED_TESTS]
+        
         # Setup
         if not self.setup_test_data():
             print("❌ Failed to setup test data. Aborting tests.")
@@ -592,24 +1270,504 @@ class ExportClosureSystemTester:
             return False
             
         # Run tests
-        self.test_excel_export_with_closure_creation()
-        self.test_idempotency()
-        self.test_enhanced_closure_blocking()
-        self.test_closure_reopening_total()
-        self.test_partial_closure_reopening()
-        self.test_enhanced_closure_check_logic()
+        for name in tests:
+            self.run_timed(name)
         
         # Cleanup
         self.cleanup_test_data()
+        self.print_timings()
         
         print("\n" + "=" * 60)
         print("🏁 Export Closure System Testing Complete")
         
         return True
 
+class BackendLoadTester:
+    """Concurrent load and benchmark suite for the time tracking API.
+    
+    Seeds its own catalog data (codes are suffixed with a run id, so runs never
+    collide), then drives a weighted mix of time entry creates and edits,
+    dashboard reads and streaming exports from a thread pool and reports
+    latency percentiles and throughput per endpoint.
+    """
+    
+    # Operation -> weight in the request mix
+    DEFAULT_MIX = {
+        "create_time_entry": 30,
+        "update_time_entry": 30,
+        "dashboard_kpis": 15,
+        "dashboard_hours_by_project": 15,
+        "export_excel": 10
+    }
+    
+    def __init__(self, base_url, concurrency=8, requests_count=500, projects=10, engineers=20,
+                 entries=1000, seed_year=2023, mix=None):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.requests_count = requests_count
+        self.seed_sizes = {"projects": projects, "engineers": engineers, "entries": entries}
+        self.seed_year = seed_year
+        self.mix = mix or dict(self.DEFAULT_MIX)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.data = {"projects": [], "export_projects": [], "engineers": [], "time_entries": []}
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.entry_counter = 0
+        
+    def session(self):
+        """One pooled connection per worker thread"""
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.headers.update(HEADERS)
+        return self.local.session
+        
+    def timed(self, operation, method, path, **kwargs):
+        """Run one request and record its latency and status"""
+        start = time.perf_counter()
+        status = None
+        try:
+            response = self.session().request(method, f"{self.base_url}/{path}", timeout=120, **kwargs)
+            if kwargs.get("stream"):
+                for _ in response.iter_content(chunk_size=65536):
+                    pass
+            status = response.status_code
+            return response
+        except requests.RequestException as e:
+            status = type(e).__name__
+            return None
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.samples.setdefault(operation, []).append((elapsed, status))
+                
+    def create(self, path, payload):
+        response = self.session().post(f"{self.base_url}/{path}", json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()["data"]
+        
+    def seed(self):
+        """Create projects, engineers and time entries for the run"""
+        print(f"\n🌱 Seeding run {self.run_id}: {self.seed_sizes}")
+        suffix = self.run_id.upper()
+        
+        user = self.create("users", {"name": f"Load Test {suffix}", "email": f"load.{self.run_id}@ziklo.com"})
+        cost_center = self.create("cost-centers", {"code": f"CC-LOAD-{suffix}", "name": f"Load CC {suffix}"})
+        concept = self.create("concepts", {"code": f"CONC-LOAD-{suffix}", "name": f"Load Concept {suffix}"})
+        self.data.update(user_id=user["id"], cost_center_id=cost_center["id"], concept_id=concept["id"])
+        
+        # A fifth of the projects is reserved for exports, so the closures they
+        # create never block the create/edit traffic
+        project_count = max(self.seed_sizes["projects"], 2)
+        export_count = max(project_count // 5, 1)
+        for i in range(project_count):
+            project = self.create("projects", {
+                "code": f"PROJ-LOAD-{suffix}-{i}",
+                "name": f"Load Project {suffix} {i}",
+                "cost_center_id": cost_center["id"],
+                "leader_user_id": user["id"]
+            })
+            key = "export_projects" if i < export_count else "projects"
+            self.data[key].append(project["id"])
+            
+        for i in range(self.seed_sizes["engineers"]):
+            engineer = self.create("engineers", {
+                "user_id": user["id"],
+                "document_number": f"{self.run_id}{i}",
+                "title": f"Load Engineer {suffix} {i}"
+            })
+            self.data["engineers"].append(engineer["id"])
+            
+        entries = [self.entry_payload(all_projects=True) for _ in range(self.seed_sizes["entries"])]
+        for start in range(0, len(entries), 200):
+            result = self.create("time-entries/bulk", {"entries": entries[start:start + 200]})
+            for row in result["results"]:
+                if row["success"] and row["data"]["project_id"] in self.data["projects"]:
+                    self.data["time_entries"].append(row["data"])
+                    
+        print(f"✅ Seeded {len(self.data['time_entries'])} editable time entries")
+        
+    def entry_payload(self, all_projects=False):
+        """A time entry spread over the seed year so daily limits are rarely hit"""
+        with self.lock:
+            self.entry_counter += 1
+            counter = self.entry_counter
+        engineer_ids = self.data["engineers"]
+        day = datetime(self.seed_year, 1, 1) + timedelta(days=(counter // len(engineer_ids)) % 365)
+        projects = self.data["projects"] + (self.data["export_projects"] if all_projects else [])
+        return {
+            "date": day.strftime("%Y-%m-%d"),
+            "project_id": random.choice(projects),
+            "cost_center_id": self.data["cost_center_id"],
+            "engineer_id": engineer_ids[counter % len(engineer_ids)],
+            "concept_id": self.data["concept_id"],
+            "hours": 0.5,
+            "notes": f"Load test {self.run_id}",
+            "created_by": self.data["user_id"]
+        }
+        
+    def run_operation(self, operation):
+        if operation == "create_time_entry":
+            self.timed(operation, "POST", "time-entries", json=self.entry_payload())
+        elif operation == "update_time_entry" and self.data["time_entries"]:
+            entry = random.choice(self.data["time_entries"])
+            update = {key: entry[key] for key in
+                      ("date", "project_id", "cost_center_id", "engineer_id", "concept_id", "hours")}
+            update["notes"] = f"Edited {uuid.uuid4().hex[:6]}"
+            self.timed(operation, "PUT", f"time-entries/{entry['id']}", json=update)
+        elif operation == "dashboard_kpis":
+            self.timed(operation, "GET", "dashboard/kpis")
+        elif operation == "dashboard_hours_by_project":
+            self.timed(operation, "GET", "dashboard/hours-by-project",
+                       params={"start_date": f"{self.seed_year}-01-01", "end_date": f"{self.seed_year}-12-31"})
+        elif operation == "export_excel":
+            month = random.randint(1, 12)
+            last_day = (datetime(self.seed_year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+            self.timed(operation, "POST", "export-excel", stream=True, json={
+                "start_date": f"{self.seed_year}-{month:02d}-01",
+                "end_date": f"{self.seed_year}-{month:02d}-{last_day:02d}",
+                "project_ids": [random.choice(self.data["export_projects"])],
+                "user_id": self.data["user_id"],
+                "stream": True
+            })
+            
+    def run_load(self):
+        """Drive the weighted request mix from a thread pool"""
+        operations = random.choices(list(self.mix), weights=list(self.mix.values()), k=self.requests_count)
+        print(f"\n🔥 Running {self.requests_count} requests with concurrency {self.concurrency}")
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self.run_operation, operations))
+        return time.perf_counter() - start
+        
+    @staticmethod
+    def percentile(sorted_values, pct):
+        """Nearest-rank percentile"""
+        if not sorted_values:
+            return None
+        rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+        return sorted_values[min(rank, len(sorted_values) - 1)]
+        
+    def summarize(self, wall_time):
+        results = {}
+        for operation, samples in sorted(self.samples.items()):
+            latencies = sorted(elapsed for elapsed, _ in samples)
+            statuses = {}
+            for _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            results[operation] = {
+                "count": len(samples),
+                "errors": errors,
+                "statuses": statuses,
+                "rps": len(samples) / wall_time if wall_time else None,
+                "mean_ms": 1000 * sum(latencies) / len(latencies),
+                "p50_ms": 1000 * self.percentile(latencies, 50),
+                "p95_ms": 1000 * self.percentile(latencies, 95),
+                "p99_ms": 1000 * self.percentile(latencies, 99),
+                "max_ms": 1000 * latencies[-1]
+            }
+        total = sum(result["count"] for result in results.values())
+        return {
+            "run_id": self.run_id,
+            "timestamp": datetime.now().isoformat(),
+            "base_url": self.base_url,
+            "concurrency": self.concurrency,
+            "seed": self.seed_sizes,
+            "mix": self.mix,
+            "wall_time_s": wall_time,
+            "total_requests": total,
+            "total_rps": total / wall_time if wall_time else None,
+            "endpoints": results
+        }
+        
+    @staticmethod
+    def print_report(report, baseline=None):
+        print(f"\n📊 {report['total_requests']} requests in {report['wall_time_s']:.1f}s "
+              f"({report['total_rps']:.1f} req/s)")
+        print(f"{'endpoint':<28}{'count':>7}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for operation, result in report["endpoints"].items():
+            line = (f"{operation:<28}{result['count']:>7}{result['errors']:>6}{result['rps']:>8.1f}"
+                    f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+            previous = (baseline or {}).get("endpoints", {}).get(operation)
+            if previous:
+                line += f"   p95 {result['p95_ms'] - previous['p95_ms']:+.1f}ms vs baseline"
+            print(line)
+            
+    def run(self, output=None, baseline=None):
+        self.seed()
+        wall_time = self.run_load()
+        report = self.summarize(wall_time)
+        
+        baseline_report = None
+        if baseline:
+            with open(baseline) as f:
+                baseline_report = json.load(f)
+        self.print_report(report, baseline_report)
+        
+        if output:
+            with open(output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Results written to {output}")
+        return report
+
+def run_test_groups(groups, report=None, isolated=False):
+    """Run each test group on freshly seeded data and optionally write a JSON report"""
+    results, timings = [], []
+    for group in groups:
+        print(f"\n📦 Test group: {group}")
+        tester = ExportClosureSystemTester(isolated=isolated)
+        if not tester.run_all_tests([group]):
+            tester.log_test(f"Group {group}", False, "Setup failed")
+        results.extend(tester.results)
+        timings.extend(dict(timing, group=group) for timing in tester.timings)
+        
+    if report:
+        with open(report, "w") as f:
+            json.dump({"groups": groups, "results": results, "timings": timings}, f, indent=2)
+    return all(result["passed"] for result in results)
+
+class HermeticTestRunner:
+    """Runs the functional suite locally, with no shared state and no network.
+    
+    Uses the mongod at MONGO_URL (or boots a throwaway one from the mongod
+    binary on PATH), starts one standalone Next.js server per worker, each with
+    its own DB_NAME, and spreads TEST_GROUPS over the workers. Every worker is a
+    subprocess running `backend_test.py functional --groups ...` against its
+    server; their JSON reports are merged into a single timing summary.
+    """
+    
+    def __init__(self, workers=4, mongo_url=None, build=True, keep_databases=False, startup_timeout=120):
+        self.workers = workers
+        self.mongo_url = mongo_url
+        self.build = build
+        self.keep_databases = keep_databases
+        self.startup_timeout = startup_timeout
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.run_id = uuid.uuid4().hex[:8]
+        self.workdir = tempfile.mkdtemp(prefix=f"ziklo-tests-{self.run_id}-")
+        self.processes = []
+        self.databases = []
+        
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+            
+    def spawn(self, name, command, env=None):
+        """Start a background process logging to the work directory"""
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, cwd=self.root, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        self.processes.append((name, process, log))
+        return process
+        
+    def wait_until(self, name, process, ready):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} exited with code {process.returncode}, see {self.workdir}/{name}.log")
+            if ready():
+                return
+            time.sleep(0.5)
+        raise RuntimeError(f"{name} not ready after {self.startup_timeout}s, see {self.workdir}/{name}.log")
+        
+    def start_mongo(self):
+        if self.mongo_url:
+            return
+        mongod = shutil.which("mongod")
+        if not mongod:
+            raise RuntimeError("mongod not found on PATH: install MongoDB or pass --mongo-url / MONGO_URL")
+        
+        port = self.free_port()
+        dbpath = os.path.join(self.workdir, "mongo")
+        os.makedirs(dbpath)
+        process = self.spawn("mongod", [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"])
+        
+        def accepting():
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return True
+            except OSError:
+                return False
+        self.wait_until("mongod", process, accepting)
+        self.mongo_url = f"mongodb://127.0.0.1:{port}"
+        
+    def server_entrypoint(self):
+        # next.config.js builds with output: 'standalone'; one build serves every worker
+        server = os.path.join(self.root, ".next", "standalone", "server.js")
+        if not os.path.exists(server):
+            if not self.build:
+                raise RuntimeError(f"{server} not found: run `next build` or drop --no-build")
+            print("🔨 Building the app (next build)...")
+            subprocess.run(["npx", "next", "build"], cwd=self.root, check=True)
+        return server
+        
+    def start_server(self, index, server):
+        port = self.free_port()
+        database = f"ziklo_test_{self.run_id}_{index}"
+        env = dict(os.environ, MONGO_URL=self.mongo_url, DB_NAME=database, PORT=str(port), HOSTNAME="127.0.0.1")
+        process = self.spawn(f"server-{index}", ["node", server], env=env)
+        self.databases.append(database)
+        
+        base_url = f"http://127.0.0.1:{port}/api"
+        
+        def responding():
+            try:
+                return requests.get(f"{base_url}/users", params={"limit": 1}, timeout=2).status_code == 200
+            except requests.RequestException:
+                return False
+        self.wait_until(f"server-{index}", process, responding)
+        return base_url
+        
+    def run_worker(self, index, base_url, groups):
+        report = os.path.join(self.workdir, f"report-{index}.json")
+        command = [sys.executable, os.path.abspath(__file__), "functional", "--base-url", base_url,
+                   "--groups", ",".join(groups), "--report", report, "--isolated"]
+        completed = subprocess.run(command, cwd=self.root, capture_output=True, text=True)
+        
+        if os.path.exists(report):
+            with open(report) as f:
+                result = json.load(f)
+        else:
+            result = {"groups": groups, "timings": [],
+                      "results": [{"test": f"Worker {index}", "passed": False, "message": completed.stderr[-2000:]}]}
+        result["output"] = completed.stdout
+        return result
+        
+    def drop_databases(self):
+        if self.keep_databases:
+            print(f"💾 Kept databases: {', '.join(self.databases)}")
+            return
+        try:
+            import pymongo
+        except ImportError:
+            print("ℹ️ pymongo not installed: test databases were not dropped")
+            return
+        client = pymongo.MongoClient(self.mongo_url, serverSelectionTimeoutMS=5000)
+        try:
+            for database in self.databases:
+                client.drop_database(database)
+        finally:
+            client.close()
+            
+    def stop(self):
+        for name, process, log in reversed(self.processes):
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                    process.wait(timeout=10)
+                except (ProcessLookupError, subprocess.TimeoutExpired):
+                    process.kill()
+            log.close()
+        self.processes = []
+        
+    def run(self):
+        groups = list(ExportClosureSystemTester.TEST_GROUPS)
+        workers = max(1, min(self.workers, len(groups)))
+        assignments = [groups[index::workers] for index in range(workers)]
+        started = time.perf_counter()
+        
+        try:
+            self.start_mongo()
+            server = self.server_entrypoint()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                base_urls = list(pool.map(lambda index: self.start_server(index, server), range(workers)))
+            print(f"🚀 {workers} server(s) ready in {time.perf_counter() - started:.1f}s")
+            
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                reports = list(pool.map(lambda index: self.run_worker(index, base_urls[index], assignments[index]),
+                                        range(workers)))
+            
+            self.drop_databases()
+        finally:
+            self.stop()
+            
+        wall_time = time.perf_counter() - started
+        failures = [result for report in reports for result in report["results"] if not result["passed"]]
+        timings = sorted((timing for report in reports for timing in report["timings"]),
+                         key=lambda timing: timing["seconds"], reverse=True)
+        
+        for index, report in enumerate(reports):
+            print(f"\n{'=' * 60}\n🧵 Worker {index}: {', '.join(report['groups'])}\n{'=' * 60}")
+            print(report["output"])
+        
+        print("\n⏱️ Per-test timing (slowest first):")
+        for timing in timings:
+            print(f"  {timing['seconds']:>8.3f}s  {timing['group']:<15} {timing['test']}")
+        
+        passed = sum(len(report["results"]) for report in reports) - len(failures)
+        print(f"\n🏁 {passed} passed, {len(failures)} failed in {wall_time:.1f}s with {workers} worker(s)")
+        for failure in failures:
+            print(f"❌ {failure['test']}: {failure['message']}")
+        
+        if not failures:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        else:
+            print(f"📂 Server logs kept in {self.workdir}")
+        return not failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ziklo backend functional and load tests")
+    parser.add_argument("mode", nargs="?", choices=["functional", "load", "hermetic"], default="functional")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL, e.g. http://localhost:3000/api")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Number of requests in the load phase")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--engineers", type=int, default=20)
+    parser.add_argument("--entries", type=int, default=1000, help="Time entries seeded before the load phase")
+    parser.add_argument("--seed-year", type=int, default=2023)
+    parser.add_argument("--output", help="Write load results to this JSON file")
+    parser.add_argument("--baseline", help="Previous load results JSON to compare against")
+    parser.add_argument("--groups", help="Comma-separated test groups to run, each on its own data: "
+                        + ", ".join(ExportClosureSystemTester.TEST_GROUPS))
+    parser.add_argument("--report", help="Write functional results and timings to this JSON file")
+    parser.add_argument("--isolated", action="store_true",
+                        help="The server has its own database: also run tests that archive whole months")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Parallel servers in hermetic mode")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"),
+                        help="MongoDB for hermetic mode (default: boot a local mongod)")
+    parser.add_argument("--no-build", action="store_true", help="Fail instead of running next build when missing")
+    parser.add_argument("--keep-databases", action="store_true", help="Do not drop the per-worker databases")
+    return parser.parse_args(argv)
+
 def main():
     """Main test execution"""
-    tester = ExportClosureSystemTester()
+    global BASE_URL
+    args = parse_args()
+    BASE_URL = args.base_url.rstrip("/")
+    
+    if args.mode == "load":
+        BackendLoadTester(
+            BASE_URL,
+            concurrency=args.concurrency,
+            requests_count=args.requests,
+            projects=args.projects,
+            engineers=args.engineers,
+            entries=args.entries,
+            seed_year=args.seed_year
+        ).run(output=args.output, baseline=args.baseline)
+        sys.exit(0)
+        
+    if args.mode == "hermetic":
+        runner = HermeticTestRunner(
+            workers=args.workers,
+            mongo_url=args.mongo_url,
+            build=not args.no_build,
+            keep_databases=args.keep_databases
+        )
+        sys.exit(0 if runner.run() else 1)
+        
+    if args.groups:
+        groups = [group.strip() for group in args.groups.split(",") if group.strip()]
+        unknown = [group for group in groups if group not in ExportClosureSystemTester.TEST_GROUPS]
+        if unknown:
+            sys.exit(f"Unknown test groups: {', '.join(unknown)}")
+        sys.exit(0 if run_test_groups(groups, args.report, args.isolated) else 1)
+        
+    tester = ExportClosureSystemTester(isolated=args.isolated)
     
     try:
         success = tester.run_all_tests()
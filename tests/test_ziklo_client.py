@@ -0,0 +1,270 @@
+"""Offline tests for the ziklo_client package.
+
+Most tests replace the client's session with a scripted fake, so no server is
+needed. The retry tests go through the real HTTPAdapter against a throwaway
+HTTP server on 127.0.0.1, since urllib3 runs those retries below the session.
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from requests.structures import CaseInsensitiveDict
+
+from ziklo_client import ApiError, ZikloClient
+from ziklo_client.client import MAX_IN_PROGRESS_WAIT
+
+
+class FakeResponse:
+    """The parts of ``requests.Response`` the client uses."""
+
+    def __init__(self, status_code=200, body=None, headers=None, lines=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.lines = lines or []
+        self.reason = "Fake"
+        self.text = json.dumps(body) if body is not None else ""
+        self.closed = False
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("No JSON body")
+        return self.body
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeSession:
+    """Answers requests with scripted responses and records every call."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def request(self, method, url, **kwargs):
+        self.calls.append({"method": method, "url": url, **kwargs})
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def page(data, next_cursor=None):
+    return FakeResponse(body={"success": True, "data": data, "page": {"next_cursor": next_cursor}})
+
+
+class IterPagesTest(unittest.TestCase):
+    def test_follows_cursor_until_exhausted(self):
+        session = FakeSession(page([{"id": "a"}, {"id": "b"}], "cursor-1"), page([{"id": "c"}]))
+        client = ZikloClient("http://api.test/api", session=session)
+
+        records = list(client.iter_pages("projects", {"status": "active", "code": None}, page_size=2))
+
+        self.assertEqual([record["id"] for record in records], ["a", "b", "c"])
+        self.assertEqual([call["params"] for call in session.calls], [
+            {"status": "active", "limit": 2},
+            {"status": "active", "limit": 2, "cursor": "cursor-1"},
+        ])
+
+    def test_page_size_is_capped(self):
+        session = FakeSession(page([]))
+        client = ZikloClient("http://api.test/api", session=session)
+
+        self.assertEqual(list(client.iter_pages("projects", page_size=10000)), [])
+        self.assertEqual(session.calls[0]["params"]["limit"], 500)
+
+    def test_fetches_lazily(self):
+        session = FakeSession(page([{"id": "a"}], "cursor-1"), page([{"id": "b"}]))
+        client = ZikloClient("http://api.test/api", session=session)
+
+        records = client.iter_pages("projects")
+        self.assertEqual(next(records)["id"], "a")
+        self.assertEqual(len(session.calls), 1)
+
+
+class IterNdjsonTest(unittest.TestCase):
+    def test_decodes_lines_and_skips_blank_ones(self):
+        response = FakeResponse(lines=[b'{"id": "a"}', b"", b'{"id": "b", "hours": 1.5}'])
+        session = FakeSession(response)
+        client = ZikloClient("http://api.test/api", session=session)
+
+        records = list(client.stream_time_entries(project_id="p1", engineer_id=None))
+
+        self.assertEqual(records, [{"id": "a"}, {"id": "b", "hours": 1.5}])
+        call = session.calls[0]
+        self.assertEqual(call["url"], "http://api.test/api/time-entries")
+        self.assertEqual(call["headers"], {"Accept": "application/x-ndjson"})
+        self.assertEqual(call["params"], {"project_id": "p1"})
+        self.assertTrue(call["stream"])
+        self.assertTrue(response.closed)
+
+
+class BulkCreateTest(unittest.TestCase):
+    def test_batches_and_offsets_result_indexes(self):
+        def bulk_result(size, rejected_index=None):
+            results = [{"index": index, "success": index != rejected_index} for index in range(size)]
+            rejected = int(rejected_index is not None)
+            return FakeResponse(body={"success": True, "data": {
+                "inserted": size - rejected, "rejected": rejected, "results": results
+            }})
+
+        session = FakeSession(bulk_result(2), bulk_result(2, rejected_index=1), bulk_result(1))
+        client = ZikloClient("http://api.test/api", session=session)
+        entries = ({"date": "2024-01-0%d" % day, "hours": 1} for day in range(1, 6))
+
+        report = client.bulk_create_time_entries(entries, created_by="u1", batch_size=2)
+
+        self.assertEqual([len(call["json"]["entries"]) for call in session.calls], [2, 2, 1])
+        self.assertTrue(all(call["json"]["created_by"] == "u1" for call in session.calls))
+        self.assertEqual((report["inserted"], report["rejected"]), (4, 1))
+        self.assertEqual([row["index"] for row in report["results"]], [0, 1, 2, 3, 4])
+        self.assertFalse(report["results"][3]["success"])
+
+    def test_batch_size_is_capped(self):
+        session = FakeSession(*[FakeResponse(body={"success": True, "data": {
+            "inserted": 0, "rejected": 0, "results": []
+        }}) for _ in range(2)])
+        client = ZikloClient("http://api.test/api", session=session)
+
+        client.bulk_create_time_entries([{"hours": 1}] * 501, batch_size=1000)
+
+        self.assertEqual([len(call["json"]["entries"]) for call in session.calls], [500, 1])
+
+
+class InProgressRetryTest(unittest.TestCase):
+    def in_progress(self, retry_after="1"):
+        return FakeResponse(409, {"success": False, "message": "En curso"}, {"Retry-After": retry_after})
+
+    def test_retries_with_same_key_until_completed(self):
+        session = FakeSession(self.in_progress(), self.in_progress("2"),
+                              FakeResponse(body={"success": True, "data": {"id": "e1"}}))
+        client = ZikloClient("http://api.test/api", session=session, backoff_factor=0.5)
+
+        with mock.patch("ziklo_client.client.time.sleep") as sleep:
+            entry = client.create_time_entry({"hours": 1})
+
+        self.assertEqual(entry, {"id": "e1"})
+        keys = {call["headers"]["Idempotency-Key"] for call in session.calls}
+        self.assertEqual(len(session.calls), 3)
+        self.assertEqual(len(keys), 1)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+
+    def test_waits_at_least_the_backoff_and_at_most_the_cap(self):
+        client = ZikloClient("http://api.test/api", session=FakeSession(), backoff_factor=0.5)
+
+        self.assertEqual(client._in_progress_wait("0", 3), 4)
+        self.assertEqual(client._in_progress_wait("not-a-number", 1), 1)
+        self.assertEqual(client._in_progress_wait("3600", 0), MAX_IN_PROGRESS_WAIT)
+
+    def test_raises_after_last_retry(self):
+        session = FakeSession(*[self.in_progress() for _ in range(3)])
+        client = ZikloClient("http://api.test/api", session=session, retries=2)
+
+        with mock.patch("ziklo_client.client.time.sleep"):
+            with self.assertRaises(ApiError) as raised:
+                client.create_time_entry({"hours": 1})
+
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(len(session.calls), 3)
+
+    def test_conflict_without_retry_after_is_not_retried(self):
+        session = FakeSession(FakeResponse(409, {"success": False, "message": "Cierre activo"}))
+        client = ZikloClient("http://api.test/api", session=session)
+
+        with self.assertRaises(ApiError) as raised:
+            client.create_time_entry({"hours": 1})
+
+        self.assertEqual(raised.exception.message, "Cierre activo")
+        self.assertEqual(len(session.calls), 1)
+
+    def test_unkeyed_requests_are_not_retried(self):
+        session = FakeSession(self.in_progress())
+        client = ZikloClient("http://api.test/api", session=session)
+
+        with self.assertRaises(ApiError):
+            client.delete_time_entry("e1")
+
+        self.assertEqual(len(session.calls), 1)
+
+
+class RetryServer:
+    """Loopback HTTP server answering each method with scripted statuses,
+    recording the Idempotency-Key of every request it gets."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.requests = []
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_method(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                owner.requests.append((self.command, self.headers.get("Idempotency-Key")))
+                status = owner.statuses[self.command].pop(0)
+                body = json.dumps({"success": status == 200, "data": {}, "message": "Error"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = do_DELETE = handle_method
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/api"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AdapterRetryTest(unittest.TestCase):
+    def test_post_retry_reuses_idempotency_key(self):
+        with RetryServer({"POST": [503, 502, 200]}) as server:
+            with ZikloClient(server.base_url, backoff_factor=0) as client:
+                client.create_concept("C-1", "Concepto")
+
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(len({key for _, key in server.requests}), 1)
+        self.assertIsNotNone(server.requests[0][1])
+
+    def test_delete_is_not_retried(self):
+        with RetryServer({"DELETE": [503, 200]}) as server:
+            with ZikloClient(server.base_url, backoff_factor=0) as client:
+                with self.assertRaises(ApiError) as raised:
+                    client.delete_time_entry("e1")
+
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(server.requests, [("DELETE", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
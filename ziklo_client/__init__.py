@@ -0,0 +1,6 @@
+"""Python client for the Ziklo time tracking API."""
+
+from .client import DEFAULT_BASE_URL, ExportDownload, ZikloClient
+from .errors import ApiError
+
+__all__ = ["ApiError", "DEFAULT_BASE_URL", "ExportDownload", "ZikloClient"]
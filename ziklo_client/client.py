@@ -0,0 +1,362 @@
+"""HTTP client for the Ziklo time tracking API.
+
+Every call goes through one ``requests.Session`` so connections are pooled and
+kept alive between requests. Requests are retried with exponential backoff on
+5xx responses and connection errors, except DELETEs: they carry no
+Idempotency-Key, so a retry could repeat their side effects. POSTs and PUTs
+carry an Idempotency-Key, reused by every retry, so the server runs them at
+most once; a retry that arrives while the first attempt is still running gets
+a 409 with Retry-After and is retried again once that attempt had time to
+finish.
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .errors import ApiError
+
+DEFAULT_BASE_URL = os.environ.get("BASE_URL", "http://localhost:3000/api")
+
+# Server limits (MAX_PAGE_SIZE and MAX_BULK_TIME_ENTRIES in route.js)
+MAX_PAGE_SIZE = 500
+MAX_BULK_TIME_ENTRIES = 500
+
+RETRY_STATUSES = (500, 502, 503, 504)
+# DELETE is left out: without an Idempotency-Key the server cannot tell a
+# retry from a second delete
+RETRY_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "OPTIONS"})
+# Maximum wait before retrying a keyed request the server reports in progress
+MAX_IN_PROGRESS_WAIT = 30
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+Record = Dict[str, Any]
+
+
+@dataclass
+class ExportDownload:
+    """An export file written to disk."""
+
+    path: str
+    bytes_written: int
+    closure_id: Optional[str] = None
+    record_count: Optional[int] = None
+    revision: Optional[int] = None
+
+
+class ZikloClient:
+    """Pooled client for the /api routes.
+
+    Use it as a context manager (or call ``close()``) to release the pooled
+    connections::
+
+        with ZikloClient("http://localhost:3000/api") as client:
+            for entry in client.iter_time_entries(project_id=project_id):
+                ...
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, timeout: float = 30,
+                 retries: int = 3, backoff_factor: float = 0.5, pool_maxsize: int = 10,
+                 session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.session = session or requests.Session()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "ZikloClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Low level
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request and raise ApiError on an error status."""
+        kwargs.setdefault("timeout", self.timeout)
+        if method in ("POST", "PUT"):
+            kwargs["headers"] = {"Idempotency-Key": str(uuid.uuid4()), **(kwargs.get("headers") or {})}
+        keyed = "Idempotency-Key" in (kwargs.get("headers") or {})
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        attempt = 0
+        while True:
+            response = self.session.request(method, url, **kwargs)
+            # A keyed retry that raced the still running first attempt (e.g.
+            # after a read timeout): wait for it and ask again with the same key
+            retry_after = response.headers.get("Retry-After") if response.status_code == 409 else None
+            if not (keyed and retry_after is not None and attempt < self.retries):
+                break
+            response.close()
+            time.sleep(self._in_progress_wait(retry_after, attempt))
+            attempt += 1
+
+        if response.status_code >= 400:
+            raise ApiError(response.status_code, _error_message(response), response)
+        return response
+
+    def _in_progress_wait(self, retry_after: str, attempt: int) -> float:
+        """Seconds to wait before retrying an in-progress keyed request: the
+        server's Retry-After or the exponential backoff, whichever is longer."""
+        try:
+            requested = float(retry_after)
+        except ValueError:
+            requested = 0
+        return min(max(requested, self.backoff_factor * (2 ** attempt)), MAX_IN_PROGRESS_WAIT)
+
+    def call(self, method: str, path: str, json: Any = None, params: Optional[Record] = None) -> Record:
+        """Send a JSON request and return the decoded ``{success, ...}`` body."""
+        response = self.request(method, path, json=json, params=_clean(params))
+        result = response.json()
+        if not result.get("success"):
+            raise ApiError(response.status_code, result.get("message", "Error en la operación"), response)
+        return result
+
+    def iter_pages(self, path: str, params: Optional[Record] = None,
+                   page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        """Yield the records of a list endpoint, fetching one page at a time
+        by following its keyset cursor."""
+        params = dict(_clean(params) or {}, limit=min(page_size, MAX_PAGE_SIZE))
+        while True:
+            result = self.call("GET", path, params=params)
+            yield from result["data"]
+            cursor = result.get("page", {}).get("next_cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    def iter_ndjson(self, path: str, params: Optional[Record] = None) -> Iterator[Record]:
+        """Yield the documents of a list endpoint in its NDJSON streaming mode:
+        one request, decoded line by line as the (compressed) body arrives."""
+        response = self.request("GET", path, params=_clean(params), stream=True,
+                                headers={"Accept": "application/x-ndjson"})
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    # Users
+
+    def create_user(self, name: str, email: str, **fields) -> Record:
+        return self.call("POST", "users", json={"name": name, "email": email, **fields})["data"]
+
+    def iter_users(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("users", page_size=page_size)
+
+    # Catalogs
+
+    def create_cost_center(self, code: str, name: str, **fields) -> Record:
+        return self.call("POST", "cost-centers", json={"code": code, "name": name, **fields})["data"]
+
+    def iter_cost_centers(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("cost-centers", page_size=page_size)
+
+    def create_project(self, code: str, name: str, cost_center_id: str,
+                       leader_user_id: Optional[str] = None, **fields) -> Record:
+        project = {"code": code, "name": name, "cost_center_id": cost_center_id,
+                   "leader_user_id": leader_user_id, **fields}
+        return self.call("POST", "projects", json=project)["data"]
+
+    def iter_projects(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("projects", page_size=page_size)
+
+    def create_engineer(self, user_id: str, document_number: str, title: str, **fields) -> Record:
+        engineer = {"user_id": user_id, "document_number": document_number, "title": title, **fields}
+        return self.call("POST", "engineers", json=engineer)["data"]
+
+    def iter_engineers(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("engineers", page_size=page_size)
+
+    def create_concept(self, code: str, name: str, **fields) -> Record:
+        return self.call("POST", "concepts", json={"code": code, "name": name, **fields})["data"]
+
+    def iter_concepts(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("concepts", page_size=page_size)
+
+    # Time entries
+
+    def create_time_entry(self, entry: Record) -> Record:
+        return self.call("POST", "time-entries", json=entry)["data"]
+
+    def update_time_entry(self, entry_id: str, entry: Record) -> Record:
+        return self.call("PUT", f"time-entries/{entry_id}", json=entry)["data"]
+
+    def delete_time_entry(self, entry_id: str) -> None:
+        self.call("DELETE", f"time-entries/{entry_id}")
+
+    def iter_time_entries(self, project_id: Optional[str] = None, engineer_id: Optional[str] = None,
+                          concept_id: Optional[str] = None, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, post_export_status: Optional[str] = None,
+                          order: str = "asc", page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        params = {"project_id": project_id, "engineer_id": engineer_id, "concept_id": concept_id,
+                  "start_date": start_date, "end_date": end_date,
+                  "post_export_status": post_export_status, "order": order}
+        return self.iter_pages("time-entries", params, page_size=page_size)
+
+    def stream_time_entries(self, **filters) -> Iterator[Record]:
+        """Every time entry matching the filters, streamed in a single response."""
+        return self.iter_ndjson("time-entries", filters)
+
+    def time_entry_totals(self, **filters) -> Record:
+        """Entry count and hours of every time entry matching the filters."""
+        params = dict(filters, include_totals=1, limit=1)
+        return self.call("GET", "time-entries", params=params)["totals"]
+
+    def bulk_create_time_entries(self, entries: Iterable[Record], created_by: str = "system",
+                                 batch_size: int = MAX_BULK_TIME_ENTRIES) -> Record:
+        """Create time entries through /time-entries/bulk in batches.
+
+        Returns the combined ``{inserted, rejected, results}`` report, with
+        each result's ``index`` pointing into ``entries``.
+        """
+        batch_size = min(batch_size, MAX_BULK_TIME_ENTRIES)
+        report = {"inserted": 0, "rejected": 0, "results": []}
+        offset = 0
+        for batch in _batches(entries, batch_size):
+            result = self.call("POST", "time-entries/bulk", json={"entries": batch, "created_by": created_by})["data"]
+            report["inserted"] += result["inserted"]
+            report["rejected"] += result["rejected"]
+            report["results"].extend(dict(row, index=row["index"] + offset) for row in result["results"])
+            offset += len(batch)
+        return report
+
+    # Exports
+
+    def download_export(self, destination: str, start_date: str, end_date: str, user_id: str = "system",
+                        project_ids: Optional[List[str]] = None, cost_center_ids: Optional[List[str]] = None,
+                        engineer_ids: Optional[List[str]] = None, format: str = "xlsx",
+                        summary_sheets: Any = False) -> ExportDownload:
+        """Export the filtered entries (creating or reusing their closure) and
+        stream the file to ``destination`` (a file path or a directory)."""
+        body = {"start_date": start_date, "end_date": end_date, "user_id": user_id,
+                "project_ids": project_ids, "cost_center_ids": cost_center_ids,
+                "engineer_ids": engineer_ids, "format": format, "stream": True}
+        if summary_sheets:
+            body["summary_sheets"] = summary_sheets
+        response = self.request("POST", "export-excel", json=_clean(body), stream=True)
+        return self._save(response, destination)
+
+    def create_export_job(self, start_date: str, end_date: str, user_id: str = "system", **filters) -> Record:
+        body = dict(filters, start_date=start_date, end_date=end_date, user_id=user_id)
+        return self.call("POST", "export-jobs", json=_clean(body))["data"]
+
+    def get_export_job(self, job_id: str) -> Record:
+        return self.call("GET", f"export-jobs/{job_id}")["data"]
+
+    def wait_for_export_job(self, job_id: str, poll_interval: float = 1, timeout: float = 300) -> Record:
+        """Poll an export job until it completes; raise ApiError if it fails."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get_export_job(job_id)
+            if job["status"] == "COMPLETADO":
+                return job
+            if job["status"] == "FALLIDO":
+                raise ApiError(500, job.get("error") or "El trabajo de exportación falló")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Export job {job_id} still {job['status']} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def download_export_job(self, job_id: str, destination: str) -> ExportDownload:
+        response = self.request("GET", f"export-jobs/{job_id}/download", stream=True)
+        return self._save(response, destination)
+
+    # Export closures
+
+    def iter_export_closures(self, page_size: int = MAX_PAGE_SIZE) -> Iterator[Record]:
+        return self.iter_pages("export-closures", page_size=page_size)
+
+    def stream_export_closures_detailed(self) -> Iterator[Record]:
+        """Closures with their scope and exceptions, streamed in a single response."""
+        return self.iter_ndjson("export-closures-detailed")
+
+    def reopen_closure(self, closure_id: str, type: str = "total",
+                       partial_filters: Optional[Record] = None, user_id: str = "system") -> Record:
+        body = {"type": type, "partial_filters": partial_filters, "user_id": user_id}
+        return self.call("POST", f"export-closures/{closure_id}/reopen", json=body)["data"]
+
+    def download_delta_export(self, closure_id: str, destination: str, user_id: str = "system",
+                              format: str = "xlsx") -> ExportDownload:
+        """Export the changes made since the closure's last revision."""
+        response = self.request("POST", f"export-closures/{closure_id}/delta-export",
+                                json={"user_id": user_id, "format": format}, stream=True)
+        return self._save(response, destination)
+
+    def _save(self, response: requests.Response, destination: str) -> ExportDownload:
+        """Write a streamed file response to disk chunk by chunk."""
+        path = destination
+        if os.path.isdir(destination):
+            path = os.path.join(destination, _attachment_filename(response) or "export")
+
+        bytes_written = 0
+        with response, open(path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+                bytes_written += len(chunk)
+
+        headers = response.headers
+        return ExportDownload(
+            path=path,
+            bytes_written=bytes_written,
+            closure_id=headers.get("X-Closure-Id"),
+            record_count=_int_header(headers, "X-Record-Count"),
+            revision=_int_header(headers, "X-Revision"),
+        )
+
+
+def _clean(values: Optional[Record]) -> Optional[Record]:
+    """Drop unset (None) parameters."""
+    if values is None:
+        return None
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def _batches(items: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json().get("message") or response.reason
+    except ValueError:
+        return response.text or response.reason
+
+
+def _attachment_filename(response: requests.Response) -> Optional[str]:
+    match = re.search(r'filename="([^"]+)"', response.headers.get("Content-Disposition", ""))
+    return os.path.basename(match.group(1)) if match else None
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    return int(value) if value is not None else None
@@ -0,0 +1,11 @@
+"""Errors raised by the Ziklo API client."""
+
+
+class ApiError(Exception):
+    """A request the API answered with an error status or ``success: false``."""
+
+    def __init__(self, status, message, response=None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.response = response